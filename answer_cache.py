@@ -0,0 +1,128 @@
+"""
+Semantic cache of chat answers.
+
+Answers are keyed by the identity of the index they were generated from and by the
+question. A repeated question is matched first by its normalized text and then by
+embedding similarity, so "any kernel panics?" and "Were there any kernel panics"
+share one generation. Similar questions only share an answer if they name the same
+identifiers and time window: "errors of pid 4242" is never answered with the errors
+of pid 4243, however close their embeddings are. Entries are evicted least-recently-used and are invalidated
+as soon as the index they came from changes.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from config import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_SIMILARITY
+from inverted_index import identifier_terms
+from query_router import time_filters
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(_PUNCTUATION.sub(' ', query.lower()).split())
+
+
+def query_constraints(query: str) -> tuple:
+    """The identifiers & time window a question is about; similar questions must agree on them."""
+    return tuple(sorted(set(identifier_terms(query)))), time_filters(query)
+
+
+@dataclass
+class _CacheEntry:
+    scope: str
+    version: str
+    normalized_query: str
+    constraints: tuple
+    embedding: Optional[np.ndarray]
+    answer: str
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES, similarity: float = ANSWER_CACHE_SIMILARITY):
+        """
+        Args:
+            max_entries: Answers kept before the least recently used ones are evicted
+            similarity: Minimum cosine similarity for two questions to share an answer
+        """
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._entries: "OrderedDict[Tuple[str, str], _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def _invalidate_stale(self, scope: str, version: str) -> None:
+        stale = [key for key, entry in self._entries.items() if entry.scope == scope and entry.version != version]
+        for key in stale:
+            del self._entries[key]
+
+    def get(self, scope: str, version: str, query: str,
+            embed_query: Optional[Callable[[str], List[float]]] = None) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Look up a cached answer.
+
+        Args:
+            scope: Identity of the index (and model) the answer must come from
+            version: Current version of that index; entries of other versions are dropped
+            query: User question
+            embed_query: Embeds the question for similarity matching; exact matches only if None
+
+        Returns:
+            tuple: (cached answer or None, question embedding to pass on to put())
+        """
+        normalized = normalize_query(query)
+        with self._lock:
+            self._invalidate_stale(scope, version)
+            entry = self._entries.get((scope, normalized))
+            if entry is not None:
+                self._entries.move_to_end((scope, normalized))
+                self.hits += 1
+                return entry.answer, entry.embedding
+            constraints = query_constraints(query)
+            candidates = [(key, entry) for key, entry in self._entries.items()
+                          if entry.scope == scope and entry.embedding is not None
+                          and entry.constraints == constraints]
+
+        if embed_query is None:
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        embedding = self._unit(embed_query(query))
+        best_key, best_score = None, self.similarity
+        for key, entry in candidates:
+            score = float(np.dot(entry.embedding, embedding))
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        with self._lock:
+            entry = self._entries.get(best_key) if best_key is not None else None
+            if entry is None:
+                self.misses += 1
+                return None, embedding
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return entry.answer, embedding
+
+    def put(self, scope: str, version: str, query: str, answer: str, embedding: Optional[np.ndarray] = None) -> None:
+        normalized = normalize_query(query)
+        with self._lock:
+            self._invalidate_stale(scope, version)
+            self._entries[(scope, normalized)] = _CacheEntry(scope, version, normalized,
+                                                                query_constraints(query), embedding, answer)
+            self._entries.move_to_end((scope, normalized))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
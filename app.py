@@ -6,7 +6,8 @@ from typing import List
 
 import streamlit as st
 
-from classifier import LogFileClassifier
+from classifier import LogFileClassifier, PredictionResult
+from classifier_server import ClassifierClient, ClassifierUnavailableError, ServerBusyError
 
 
 MODEL_PATH = Path("models/log_classifier.joblib")
@@ -35,14 +36,32 @@ def sample_random_lines(content: str, count: int = MAX_PREVIEW_LINES) -> List[st
     return random.sample(lines, count)
 
 
-def render_prediction(content: str) -> None:
+@st.cache_resource
+def load_local_classifier() -> LogFileClassifier:
     classifier = LogFileClassifier(str(MODEL_PATH))
     if not classifier.load():
-        st.error("Model file not found. Run `python train_model.py` first.")
-        return
+        raise FileNotFoundError("Model file not found. Run `python train_model.py` first.")
+    return classifier
+
 
+def predict_content(content: str) -> PredictionResult:
+    # Prefer the shared classifier server (`python classifier_server.py`) so app
+    # workers don't each hold a model; fall back to an in-process copy when it is
+    # not running or too busy.
     try:
-        prediction = classifier.predict(content)
+        return ClassifierClient().predict(content)
+    except (ClassifierUnavailableError, ServerBusyError):
+        pass
+
+    return load_local_classifier().predict(content)
+
+
+def render_prediction(content: str) -> None:
+    try:
+        prediction = predict_content(content)
+    except FileNotFoundError as exc:
+        st.error(str(exc))
+        return
     except Exception as exc:
         st.error(f"Prediction failed: {exc}")
         return
@@ -0,0 +1,226 @@
+"""
+Content-addressed store for per-upload pipeline artifacts.
+
+Each distinct upload (identified by the SHA-256 of its bytes) gets a directory with
+the parsed CSV, the indexes built over its records (BM25, templates, time index,
+SQLite table and rollup), the classification metadata and the serialized FAISS
+index, so a file that was processed before can be restored without re-parsing,
+re-indexing or re-embedding. A grown copy of a stored log (the same bytes with lines
+appended) is recognized by find_earlier_version(), so only its new lines are indexed.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from langchain_community.vectorstores import FAISS
+
+from config import ARTIFACT_STORE_MAX_ENTRIES, ARTIFACT_STORE_PATH
+from log_query import LogDatabase
+from record_store import RecordStore
+
+METADATA_FILE = "metadata.json"
+PARSED_CSV_FILE = "parsed.csv"
+ROLLUP_FILE = "rollup.json"
+RECORD_INDEXES_FILE = "record_indexes.pkl"
+DATABASE_FILE = "log.sqlite3"
+INDEX_DIR = "faiss_index"
+HEAD_BYTES = 1 << 16  # Hashed first when looking for an earlier version of an upload
+
+
+def hash_file(file_path, chunk_size=1 << 20, limit: Optional[int] = None) -> str:
+    """SHA-256 of a file's bytes (of the first ``limit`` bytes if given), the key of its store entry."""
+    digest = hashlib.sha256()
+    remaining = limit
+    with open(file_path, 'rb') as file:
+        while remaining is None or remaining > 0:
+            chunk = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def _ends_line(file_path, size: int) -> bool:
+    """True if the first ``size`` bytes of a file end with a line break."""
+    with open(file_path, 'rb') as file:
+        file.seek(size - 1)
+        return file.read(1) == b'\n'
+
+
+def hash_bytes(data: bytes) -> str:
+    """SHA-256 of an in-memory upload; equal to hash_file() of the same bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ArtifactStore:
+    def __init__(self, root: str = ARTIFACT_STORE_PATH, max_entries: int = ARTIFACT_STORE_MAX_ENTRIES):
+        self.root = Path(root)
+        self.max_entries = max_entries
+
+    def path_for(self, file_hash: str) -> Path:
+        return self.root / file_hash
+
+    def load_metadata(self, file_hash: str) -> Optional[dict]:
+        """
+        Return the stored metadata for an upload, or None if it was never stored.
+
+        Reading the metadata also marks the entry as recently used.
+        """
+        metadata_path = self.path_for(file_hash) / METADATA_FILE
+        try:
+            with open(metadata_path, 'r') as f:
+                metadata = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        os.utime(metadata_path)
+        return metadata
+
+    def parsed_csv_path(self, file_hash: str) -> Optional[str]:
+        path = self.path_for(file_hash) / PARSED_CSV_FILE
+        return str(path) if path.exists() else None
+
+    def load_rollup(self, file_hash: str) -> Optional[dict]:
+        """The stored LogRollup.to_dict() of an upload, or None."""
+        try:
+            with open(self.path_for(file_hash) / ROLLUP_FILE, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def load_record_indexes(self, file_hash: str) -> Optional[Dict[str, object]]:
+        """The pickled record indexes of an upload, keyed by name, or None if none were stored."""
+        path = self.path_for(file_hash) / RECORD_INDEXES_FILE
+        if not path.exists():
+            return None
+        # Pickled by this store, so trusted like the FAISS index.
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def load_database(self, file_hash: str, records: RecordStore, path: str = ':memory:') -> Optional[LogDatabase]:
+        """A copy of the stored SQLite table of an upload, over its stored RecordStore, kept at ``path``, or None."""
+        stored_path = self.path_for(file_hash) / DATABASE_FILE
+        if not stored_path.exists():
+            return None
+        return LogDatabase.load(str(stored_path), records, path)
+
+    def load_vectors(self, file_hash: str, embeddings) -> Optional[FAISS]:
+        """
+        Load the stored FAISS index for an upload.
+
+        Args:
+            file_hash: SHA-256 of the uploaded file
+            embeddings: Embeddings used for queries against the loaded index
+
+        Returns:
+            FAISS vector store, or None if no index was stored
+        """
+        index_path = self.path_for(file_hash) / INDEX_DIR
+        if not index_path.exists():
+            return None
+        # The index was serialized by this store, so its pickle is trusted.
+        return FAISS.load_local(str(index_path), embeddings, allow_dangerous_deserialization=True)
+
+    def find_earlier_version(self, file_path) -> Optional[str]:
+        """
+        Find the stored parsed log that a file extends: the file starts with all of its bytes
+        and continues after a line break.
+
+        Returns:
+            str: Hash of the largest such entry, or None
+        """
+        if not self.root.exists():
+            return None
+        size = os.path.getsize(file_path)
+        heads: Dict[int, str] = {}
+        found, found_bytes = None, 0
+        for path in self.root.iterdir():
+            try:
+                with open(path / METADATA_FILE, 'r') as f:
+                    metadata = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            stored_bytes = metadata.get('bytes')
+            if metadata.get('not_log') or not stored_bytes or not found_bytes < stored_bytes < size:
+                continue
+            # The head hash rules out unrelated files without reading them whole.
+            head = min(stored_bytes, HEAD_BYTES)
+            if head not in heads:
+                heads[head] = hash_file(file_path, limit=head)
+            if heads[head] != metadata.get('head_sha256') or not _ends_line(file_path, stored_bytes):
+                continue
+            if hash_file(file_path, limit=stored_bytes) == path.name:
+                found, found_bytes = path.name, stored_bytes
+        return found
+
+    def save(self, file_hash: str, metadata: dict, parsed_csv_path: Optional[str] = None,
+             vectors: Optional[FAISS] = None, rollup: Optional[dict] = None,
+             record_indexes: Optional[Dict[str, object]] = None, database: Optional[LogDatabase] = None,
+             source_path: Optional[str] = None) -> Path:
+        """
+        Store the artifacts of one upload, replacing any previous entry atomically.
+
+        Args:
+            file_hash: SHA-256 of the uploaded file
+            metadata: JSON-serializable parse/classification details
+            parsed_csv_path: CSV written by the parser, if the file was parsed
+            vectors: FAISS vector store built for the upload
+            rollup: LogRollup.to_dict() of the parsed records
+            record_indexes: Picklable indexes over the parsed records, keyed by name
+            database: LogDatabase filled with the parsed records
+            source_path: The uploaded file, recorded for find_earlier_version()
+
+        Returns:
+            Path: Directory holding the stored artifacts
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(dir=self.root, prefix=".staging-"))
+        try:
+            if parsed_csv_path and os.path.exists(parsed_csv_path):
+                shutil.copyfile(parsed_csv_path, staging / PARSED_CSV_FILE)
+            if rollup is not None:
+                with open(staging / ROLLUP_FILE, 'w') as f:
+                    json.dump(rollup, f)
+            if record_indexes:
+                with open(staging / RECORD_INDEXES_FILE, 'wb') as f:
+                    pickle.dump(record_indexes, f, protocol=pickle.HIGHEST_PROTOCOL)
+            if database is not None:
+                database.save(str(staging / DATABASE_FILE))
+            if vectors is not None:
+                vectors.save_local(str(staging / INDEX_DIR))
+            metadata = dict(metadata, stored_at=time.time())
+            if source_path is not None:
+                metadata['bytes'] = os.path.getsize(source_path)
+                metadata['head_sha256'] = hash_file(source_path, limit=min(metadata['bytes'], HEAD_BYTES))
+            with open(staging / METADATA_FILE, 'w') as f:
+                json.dump(metadata, f)
+
+            target = self.path_for(file_hash)
+            if target.exists():
+                shutil.rmtree(target)
+            os.replace(staging, target)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        self.prune()
+        return target
+
+    def prune(self) -> None:
+        """Delete the least recently used entries beyond ``max_entries``."""
+        if not self.root.exists():
+            return
+        entries = [path for path in self.root.iterdir() if (path / METADATA_FILE).exists()]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda path: (path / METADATA_FILE).stat().st_mtime)
+        for path in entries[:len(entries) - self.max_entries]:
+            shutil.rmtree(path, ignore_errors=True)
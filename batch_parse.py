@@ -0,0 +1,276 @@
+"""
+Headless batch processing of log files.
+
+Classifies and parses every file given as a path, directory or glob in parallel
+worker processes, without the Streamlit apps. Each file gets its own directory under
+the output directory (parsed CSV, result.json, parser output, rollup.json summary,
+optional indexes), and manifest.json summarizes the whole run:
+
+    python batch_parse.py /var/log/fleet 'archive/**/*.log' --output batch_output --index
+
+Files that were already processed (same content) are skipped on later runs, so an
+interrupted run can simply be restarted.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from artifact_store import hash_file
+from classifier import DEFAULT_MODEL_PATH, load_default_classifier
+from config import BATCH_OUTPUT_DIR, PARSE_POOL_WORKERS
+from llm_classifier import get_log_sample
+from log_query import LogDatabase
+from log_records import format_timestamp
+from parser import classify_log_file, parse_log
+from record_store import RecordStore
+from rollups import LogRollup
+from templates import TemplateIndex
+from time_index import TimeIndex
+
+RESULT_FILE = "result.json"
+ROLLUP_FILE = "rollup.json"
+MANIFEST_FILE = "manifest.json"
+
+PARSED = "parsed"
+NOT_A_LOG = "not_a_log"
+FAILED = "failed"
+# Results that need no rerun; failures are retried on the next run.
+FINAL_STATUSES = (PARSED, NOT_A_LOG)
+
+_classifier = None
+
+
+def find_log_files(inputs: Iterable[str], pattern: str = "*", exclude: Iterable[Path] = ()) -> List[Path]:
+    """
+    Expand files, directories (recursively, filtered by ``pattern``) and globs into unique files.
+
+    Files under ``exclude`` (e.g. the output directory) or under the output directory of an earlier
+    run (a folder holding a manifest.json or result.json) are skipped, so a run never parses its own output.
+    """
+    excluded = [Path(path).resolve() for path in exclude]
+    output_dirs: Dict[Path, bool] = {}
+
+    def is_output(path: Path) -> bool:
+        for parent in path.parents:
+            if parent not in output_dirs:
+                output_dirs[parent] = (parent in excluded or (parent / MANIFEST_FILE).is_file()
+                                       or (parent / RESULT_FILE).is_file())
+            if output_dirs[parent]:
+                return True
+        return False
+
+    files: Dict[str, Path] = {}
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = (path for path in Path(item).rglob(pattern) if path.is_file())
+        elif glob.has_magic(item):
+            matches = (Path(path) for path in glob.glob(item, recursive=True) if os.path.isfile(path))
+        elif os.path.isfile(item):
+            matches = [Path(item)]
+        else:
+            print(f"Skipping {item}: no such file or directory")
+            continue
+        for path in matches:
+            resolved = path.resolve()
+            if not is_output(resolved):
+                files.setdefault(str(resolved), path)
+    return sorted(files.values())
+
+
+def output_dir_for(output_root: Path, file_path: Path, file_hash: str) -> Path:
+    # Readable and unique: two files named syslog.log in different hosts' folders don't collide.
+    name = re.sub(r"[^\w.-]+", "_", file_path.name)
+    return output_root / f"{name}-{file_hash[:12]}"
+
+
+def _init_worker(model_path: str) -> None:
+    global _classifier
+    _classifier = load_default_classifier(model_path)
+
+
+def _template_summary(index: TemplateIndex) -> List[dict]:
+    templates = sorted(enumerate(index.templates), key=lambda item: item[1].count, reverse=True)
+    return [{
+        "process": template.process,
+        "template": template.text,
+        "count": template.count,
+        "first_seen": format_timestamp(template.first_time),
+        "last_seen": format_timestamp(template.last_time),
+        "examples": index.examples(template_id),
+    } for template_id, template in templates]
+
+
+def process_file(file_path: str, file_hash: str, output_dir: str, groq_api_key: Optional[str] = None,
+                 build_indexes: bool = False) -> dict:
+    """
+    Classify and parse one file in a worker process and write its results.
+
+    Args:
+        file_path: Log file to process
+        file_hash: SHA-256 of the file
+        output_dir: Directory for this file's outputs
+        groq_api_key: Enables the LLM tier & parser for formats the regex and ML tiers don't know
+        build_indexes: Also write the SQLite log database and the message templates
+
+    Returns:
+        dict: The result, also written to result.json
+    """
+    started = time.perf_counter()
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    result = {"path": file_path, "sha256": file_hash, "bytes": os.path.getsize(file_path), "status": FAILED,
+              "output_dir": output_dir}
+
+    # Parsers print progress & every skipped line; keep that per file instead of on the console.
+    with open(output / "parse.log", "w") as parse_log_file, contextlib.redirect_stdout(parse_log_file):
+        try:
+            if _classifier is not None:
+                result["prediction"] = asdict(_classifier.predict(get_log_sample(file_path)))
+            decision = classify_log_file(file_path, groq_api_key=groq_api_key, classifier=_classifier)
+            result.update(log_type=decision.log_type, parser=decision.parser, tier=decision.tier,
+                          confidence=round(decision.confidence, 1))
+
+            if decision.log_type is None:
+                result["status"] = NOT_A_LOG
+            else:
+                # The parser's RecordWriter fills the record store first, then the indexes over it.
+                records = RecordStore()
+                time_index = TimeIndex()
+                observers = [records, time_index]
+                template_index = database = None
+                if build_indexes:
+                    template_index = TemplateIndex(records)
+                    database = LogDatabase(records=records)
+                    observers += [template_index, database]
+                rollup = LogRollup(templates=template_index)
+                observers.append(rollup)
+
+                _, msg = parse_log(file_path, str(output / "parsed.csv"), groq_api_key, decision, observers)
+                if msg != "success":
+                    result["error"] = "parsing failed"
+                else:
+                    result["status"] = PARSED
+                    result["rows"] = len(time_index.row_times)
+                    bounds = time_index.bounds()
+                    if bounds is not None:
+                        result["time_range"] = [format_timestamp(bounds[0]), format_timestamp(bounds[1])]
+                    with open(output / ROLLUP_FILE, "w", encoding="utf-8") as f:
+                        json.dump(rollup.to_dict(), f)
+                    if database is not None:
+                        database_path = output / "log.sqlite3"
+                        database_path.unlink(missing_ok=True)
+                        database.export(str(database_path))
+                    if template_index is not None:
+                        result["templates"] = len(template_index)
+                        with open(output / "templates.json", "w", encoding="utf-8") as f:
+                            json.dump(_template_summary(template_index), f, indent=2)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    with open(output / RESULT_FILE, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def _previous_result(output_dir: Path) -> Optional[dict]:
+    try:
+        with open(output_dir / RESULT_FILE, "r", encoding="utf-8") as f:
+            result = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return result if result.get("status") in FINAL_STATUSES else None
+
+
+def write_manifest(output_root: Path, results: List[dict], started_at: float, options: dict) -> Path:
+    totals: Dict[str, int] = {}
+    log_types: Dict[str, int] = {}
+    for result in results:
+        totals[result["status"]] = totals.get(result["status"], 0) + 1
+        if result["status"] == PARSED:
+            log_types[result["log_type"]] = log_types.get(result["log_type"], 0) + 1
+    manifest = {
+        "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started_at)),
+        "seconds": round(time.time() - started_at, 1),
+        "options": options,
+        "files": len(results),
+        "totals": totals,
+        "log_types": log_types,
+        "rows": sum(result.get("rows", 0) for result in results),
+        "results": sorted(results, key=lambda result: result["path"]),
+    }
+    path = output_root / MANIFEST_FILE
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Classify & parse log files in bulk, without the web UI")
+    parser.add_argument("inputs", nargs="+", help="Log files, directories or glob patterns ('logs/**/*.log')")
+    parser.add_argument("--output", default=BATCH_OUTPUT_DIR, help="Results directory")
+    parser.add_argument("--pattern", default="*", help="File name pattern inside directories, e.g. '*.log'")
+    parser.add_argument("--workers", type=int, default=PARSE_POOL_WORKERS, help="Parallel worker processes")
+    parser.add_argument("--index", action="store_true", help="Also build the SQLite log database & templates")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Path to the trained classifier model")
+    parser.add_argument("--force", action="store_true", help="Reprocess files that already have results")
+    args = parser.parse_args()
+
+    # The LLM tier is only used when a key is available.
+    groq_api_key = os.environ.get("GROQ_API_KEY")
+    output_root = Path(args.output)
+    output_root.mkdir(parents=True, exist_ok=True)
+    started_at = time.time()
+
+    files = find_log_files(args.inputs, args.pattern, exclude=[output_root])
+    print(f"Found {len(files)} files")
+    results: List[dict] = []
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init_worker,
+                             initargs=(args.model,)) as executor:
+        futures = {}
+        for path in files:
+            file_hash = hash_file(path)
+            output_dir = output_dir_for(output_root, path, file_hash)
+            previous = None if args.force else _previous_result(output_dir)
+            if previous is not None:
+                results.append(previous)
+                continue
+            future = executor.submit(process_file, str(path), file_hash, str(output_dir), groq_api_key, args.index)
+            futures[future] = path
+
+        skipped = len(results)
+        if skipped:
+            print(f"Skipping {skipped} files processed by an earlier run")
+        for done, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker itself died (e.g. out of memory); the file is retried on the next run.
+                result = {"path": str(path), "status": FAILED, "error": f"{type(e).__name__}: {e}"}
+            results.append(result)
+            detail = result.get("log_type") or result.get("error", "")
+            print(f"[{done}/{len(futures)}] {result['status']:<9} {path} {detail}")
+
+    options = {"inputs": args.inputs, "pattern": args.pattern, "index": args.index, "workers": args.workers,
+               "llm": groq_api_key is not None}
+    manifest_path = write_manifest(output_root, results, started_at, options)
+    failed = sum(1 for result in results if result["status"] == FAILED)
+    print(f"Processed {len(results)} files ({failed} failed); manifest written to {manifest_path}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
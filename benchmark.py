@@ -0,0 +1,190 @@
+"""
+Throughput benchmark of the regex log parsers.
+
+Generates a deterministic log per parser (log_generator.py), parses it in a fresh
+process and reports lines/s, MB/s and peak RSS. Results are compared with stored
+baselines so that a slower or more memory hungry parser fails the run:
+
+    python benchmark.py --save-baseline     # record baselines on this machine
+    python benchmark.py                     # compare against them (exit code 1 on regression)
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import BENCHMARK_BASELINE_PATH, BENCHMARK_LINES, BENCHMARK_TOLERANCE
+from log_generator import DEFAULT_NOISE, DEFAULT_VARIETY, LOG_TYPES, GeneratedLog, write_log
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+
+@dataclass
+class ParserBenchmark:
+    parser: str
+    lines: int
+    bytes: int
+    records: int
+    expected_records: int
+    seconds: float
+    peak_rss_mb: Optional[float]
+    rss_increase_mb: Optional[float]  # Growth of the peak RSS during parsing
+
+    @property
+    def lines_per_second(self) -> float:
+        return self.lines / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / (1 << 20) / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        values = asdict(self)
+        values["lines_per_second"] = round(self.lines_per_second, 1)
+        values["mb_per_second"] = round(self.mb_per_second, 2)
+        return values
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_parser(parser_name: str, log_path: str, csv_path: str) -> Tuple[int, float, Optional[float], Optional[float]]:
+    """Runs in a fresh worker process, so its peak RSS belongs to this parse alone."""
+    from parser import PARSERS
+
+    rss_before = _peak_rss_mb()
+    # Parsers print every skipped line; keep that out of the measurement & the terminal.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        records = PARSERS[parser_name](log_path, csv_path).records
+        seconds = time.perf_counter() - started
+    rss_after = _peak_rss_mb()
+    increase = None if rss_before is None else rss_after - rss_before
+    return records, seconds, rss_after, increase
+
+
+def benchmark_parser(log: GeneratedLog, csv_path: str, repeat: int = 1) -> ParserBenchmark:
+    """Best (fastest) of ``repeat`` runs, each in a new process; peak RSS is the highest seen."""
+    spawn = multiprocessing.get_context("spawn")
+    best_seconds = float("inf")
+    peak_rss = rss_increase = None
+    records = 0
+    for _ in range(max(1, repeat)):
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+            records, seconds, run_peak, run_increase = executor.submit(
+                _run_parser, log.log_type, log.path, csv_path).result()
+        best_seconds = min(best_seconds, seconds)
+        if run_peak is not None:
+            peak_rss = max(peak_rss or 0.0, run_peak)
+            rss_increase = max(rss_increase or 0.0, run_increase)
+    return ParserBenchmark(log.log_type, log.lines, log.bytes, records, log.records, best_seconds,
+                           peak_rss, rss_increase)
+
+
+def load_baselines(path: str) -> Dict[str, dict]:
+    baseline_path = Path(path)
+    if not baseline_path.exists():
+        return {}
+    with baseline_path.open("r", encoding="utf-8") as f:
+        return json.load(f).get("parsers", {})
+
+
+def save_baselines(path: str, results: List[ParserBenchmark]) -> None:
+    baseline_path = Path(path)
+    baseline_path.parent.mkdir(parents=True, exist_ok=True)
+    existing = load_baselines(path)
+    existing.update({result.parser: result.to_dict() for result in results})
+    document = {
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "processor": platform.processor() or platform.machine(), "cpus": os.cpu_count()},
+        "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "parsers": existing,
+    }
+    with baseline_path.open("w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+        f.write("\n")
+
+
+def regressions(result: ParserBenchmark, baseline: Optional[dict], tolerance: float) -> List[str]:
+    """Problems with a result: wrong record count, or slower / bigger than the baseline."""
+    problems = []
+    if result.records != result.expected_records:
+        problems.append(f"wrote {result.records} records, expected {result.expected_records}")
+    if baseline is None:
+        return problems
+    if result.lines_per_second < baseline["lines_per_second"] * (1 - tolerance):
+        problems.append(f"{result.lines_per_second:,.0f} lines/s vs baseline {baseline['lines_per_second']:,.0f}")
+    if (result.peak_rss_mb is not None and baseline.get("peak_rss_mb") is not None
+            and result.peak_rss_mb > baseline["peak_rss_mb"] * (1 + tolerance)):
+        problems.append(f"peak RSS {result.peak_rss_mb:.1f} MB vs baseline {baseline['peak_rss_mb']:.1f} MB")
+    return problems
+
+
+def _format_mb(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:.1f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark parser throughput on synthetic logs")
+    parser.add_argument("--parsers", nargs="+", choices=LOG_TYPES, default=list(LOG_TYPES))
+    parser.add_argument("--lines", type=int, default=BENCHMARK_LINES, help="Lines per generated log")
+    parser.add_argument("--variety", type=int, default=DEFAULT_VARIETY, help="Distinct message templates")
+    parser.add_argument("--noise", type=float, default=DEFAULT_NOISE, help="Share of noise lines")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per parser; the fastest counts")
+    parser.add_argument("--baseline", default=BENCHMARK_BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=BENCHMARK_TOLERANCE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baselines")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    baselines = {} if args.save_baseline else load_baselines(args.baseline)
+    results: List[ParserBenchmark] = []
+    failed = False
+
+    print(f"{'parser':<8} {'lines':>9} {'lines/s':>11} {'MB/s':>7} {'peak RSS MB':>12} {'+RSS MB':>8}  status")
+    with tempfile.TemporaryDirectory(prefix="log_parser_bench_") as workdir:
+        for name in args.parsers:
+            log = write_log(os.path.join(workdir, f"{name.lower()}.log"), name, lines=args.lines,
+                            seed=args.seed, variety=args.variety, noise=args.noise)
+            result = benchmark_parser(log, os.path.join(workdir, f"{name.lower()}.csv"), args.repeat)
+            results.append(result)
+
+            problems = regressions(result, baselines.get(name), args.tolerance)
+            failed = failed or bool(problems)
+            status = "; ".join(problems) if problems else ("ok" if name in baselines else "ok (no baseline)")
+            print(f"{name:<8} {result.lines:>9,} {result.lines_per_second:>11,.0f} {result.mb_per_second:>7.2f} "
+                  f"{_format_mb(result.peak_rss_mb):>12} {_format_mb(result.rss_increase_mb):>8}  {status}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump([result.to_dict() for result in results], f, indent=2)
+    if args.save_baseline and not failed:
+        save_baselines(args.baseline, results)
+        print(f"Saved baselines to {args.baseline}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Tiered log classification cascade.
+
+Cheap regex signatures are tried first, then the local ML classifier, and the LLM
+is consulted only when neither is at least CONFIDENCE_THRESHOLD confident. Every
+decision is recorded with the tier that made it and how long each tier took.
+"""
+
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from classifier import load_default_classifier
+from config import CONFIDENCE_THRESHOLD, DECISION_HISTORY_SIZE
+from llm_classifier import classify_log_type
+
+
+TIER_REGEX = "regex"
+TIER_ML = "ml"
+TIER_LLM = "llm"
+
+# Parser used for logs recognised by the ML tier but not by any regex signature.
+GENERIC_PARSER = "Generic"
+# Parser used for formats only the LLM could describe.
+LLM_PARSER = "LLM"
+
+ML_LOG_TYPE_LABELS = {
+    "sys": "Sys",
+    "kernel": "Kernel",
+    "auth": "Auth",
+    "ovs": "OVS",
+}
+
+
+@dataclass
+class CascadeDecision:
+    log_type: Optional[str]  # None when the file is not (or not confidently) a log
+    confidence: float  # 0-100, same scale as CONFIDENCE_THRESHOLD
+    tier: str  # Tier that made the decision
+    latency_ms: float  # Total time spent in the cascade
+    parser: Optional[str] = None  # Key into parser.PARSERS, or LLM_PARSER
+    tier_latencies_ms: Dict[str, float] = field(default_factory=dict)
+    classification: Optional[dict] = None  # classify_log_type() result for the LLM tier
+
+
+DECISION_HISTORY = deque(maxlen=DECISION_HISTORY_SIZE)
+
+
+def recent_decisions() -> List[CascadeDecision]:
+    """Return the most recent cascade decisions, oldest first."""
+    return list(DECISION_HISTORY)
+
+
+def match_signatures(lines: List[str], signatures: Dict[str, Callable[[str], bool]]):
+    """
+    Score each regex signature by the fraction of sample lines it matches.
+
+    Args:
+        lines: Non-empty, stripped sample lines
+        signatures: Ordered mapping of log type -> line predicate
+
+    Returns:
+        tuple: (best log type or None, confidence 0-100). Ties go to the earlier signature.
+    """
+    best_type, best_hits = None, 0
+    for log_type, matches in signatures.items():
+        hits = sum(1 for line in lines if matches(line))
+        if hits > best_hits:
+            best_type, best_hits = log_type, hits
+    return best_type, 100.0 * best_hits / max(1, len(lines))
+
+
+def classify_log(log_sample: str, signatures: Dict[str, Callable[[str], bool]],
+                 groq_api_key: Optional[str] = None, classifier=None) -> CascadeDecision:
+    """
+    Classify a log sample, escalating to a more expensive tier only when needed.
+
+    Args:
+        log_sample: Sample log lines (first few lines from log file)
+        signatures: Ordered mapping of log type -> line predicate for the regex tier
+        groq_api_key: API key for Groq. The LLM tier is skipped when not given.
+        classifier: Loaded LogFileClassifier (defaults to the trained model on disk)
+
+    Returns:
+        CascadeDecision: The decision, also appended to DECISION_HISTORY
+    """
+    started = time.perf_counter()
+    tier_latencies = {}
+
+    def decide(log_type, confidence, tier, parser=None, classification=None):
+        decision = CascadeDecision(
+            log_type=log_type,
+            confidence=confidence,
+            tier=tier,
+            latency_ms=1000 * (time.perf_counter() - started),
+            parser=parser,
+            tier_latencies_ms=tier_latencies,
+            classification=classification,
+        )
+        DECISION_HISTORY.append(decision)
+        return decision
+
+    # Tier 1: regex signatures of the built-in parsers
+    tier_started = time.perf_counter()
+    lines = [line.strip() for line in log_sample.splitlines() if line.strip()]
+    log_type, confidence = match_signatures(lines, signatures)
+    tier_latencies[TIER_REGEX] = 1000 * (time.perf_counter() - tier_started)
+    if not lines:
+        return decide(None, 0.0, TIER_REGEX)
+    if log_type is not None and confidence >= CONFIDENCE_THRESHOLD:
+        return decide(log_type, confidence, TIER_REGEX, parser=log_type)
+
+    # Tier 2: local ML classifier
+    classifier = classifier or load_default_classifier()
+    if classifier is not None:
+        tier_started = time.perf_counter()
+        try:
+            prediction = classifier.predict(log_sample)
+        except Exception as e:
+            print(f"ML classification error: {e}")
+            prediction = None
+        tier_latencies[TIER_ML] = 1000 * (time.perf_counter() - tier_started)
+
+        if prediction is not None:
+            if not prediction.is_log_file:
+                confidence = 100 * prediction.confidence
+                if confidence >= CONFIDENCE_THRESHOLD:
+                    return decide(None, confidence, TIER_ML)
+            else:
+                confidence = 100 * min(prediction.confidence, prediction.log_type_confidence or 0.0)
+                if confidence >= CONFIDENCE_THRESHOLD:
+                    label = ML_LOG_TYPE_LABELS.get(prediction.log_type, prediction.log_type)
+                    return decide(label, confidence, TIER_ML, parser=GENERIC_PARSER)
+
+    # Tier 3: LLM
+    if groq_api_key:
+        tier_started = time.perf_counter()
+        classification = classify_log_type(log_sample, groq_api_key)
+        tier_latencies[TIER_LLM] = 1000 * (time.perf_counter() - tier_started)
+        if classification['confidence'] >= CONFIDENCE_THRESHOLD:
+            return decide(classification['log_type'], classification['confidence'], TIER_LLM,
+                          parser=LLM_PARSER, classification=classification)
+        return decide(None, classification['confidence'], TIER_LLM)
+
+    # Nothing was confident enough and the LLM is unavailable.
+    return decide(None, confidence, TIER_ML if TIER_ML in tier_latencies else TIER_REGEX)
@@ -0,0 +1,113 @@
+"""
+Log-aware chunking of parsed records.
+
+Instead of cutting the CSV text every N characters with overlap, whole records are
+packed into chunks up to a token budget. Records are grouped by host/process and by
+time window, and each chunk carries its time range and row span as metadata.
+"""
+
+import csv
+import io
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from config import CHARS_PER_TOKEN, CHUNK_TIME_WINDOW_SECONDS, CHUNK_TOKEN_BUDGET
+from log_records import RecordSchema, format_timestamp, read_parsed_csv
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _format_row(row: List[str]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue().rstrip('\r\n')
+
+
+class _OpenChunk:
+    __slots__ = ('lines', 'tokens', 'start_time', 'end_time', 'first_row', 'last_row')
+
+    def __init__(self, header_line: str, row_number: int, timestamp: Optional[float]):
+        self.lines = [header_line]
+        self.tokens = estimate_tokens(header_line)
+        self.start_time = timestamp
+        self.end_time = timestamp
+        self.first_row = row_number
+        self.last_row = row_number
+
+    def add(self, line: str, tokens: int, row_number: int, timestamp: Optional[float]) -> None:
+        self.lines.append(line)
+        self.tokens += tokens
+        self.last_row = row_number
+        if timestamp is not None:
+            self.start_time = timestamp if self.start_time is None else min(self.start_time, timestamp)
+            self.end_time = timestamp if self.end_time is None else max(self.end_time, timestamp)
+
+
+def _to_document(chunk: _OpenChunk, group: Tuple[str, str], source: str) -> Document:
+    host, process = group
+    return Document(
+        page_content='\n'.join(chunk.lines),
+        metadata={
+            'source': source,
+            'host': host,
+            'process': process,
+            'start_time': chunk.start_time,
+            'end_time': chunk.end_time,
+            'start': format_timestamp(chunk.start_time),
+            'end': format_timestamp(chunk.end_time),
+            'first_row': chunk.first_row,
+            'last_row': chunk.last_row,
+            'record_count': len(chunk.lines) - 1,
+        },
+    )
+
+
+def chunk_records(schema: RecordSchema, rows, source: str = '', max_tokens: int = CHUNK_TOKEN_BUDGET,
+                  time_window: float = CHUNK_TIME_WINDOW_SECONDS) -> Iterator[Document]:
+    """
+    Pack whole parsed records into chunks without overlap.
+
+    Args:
+        schema: Schema of the parsed CSV the rows come from
+        rows: Iterable of parsed rows (lists of strings), in file order
+        source: Value for the chunks' ``source`` metadata
+        max_tokens: Token budget per chunk, including the CSV header line
+        time_window: Maximum seconds between the first and last record of a chunk
+
+    Yields:
+        Document: One chunk per (host, process) group and time window. A single record
+        larger than the budget becomes a chunk of its own.
+    """
+    header_line = _format_row(schema.header)
+    open_chunks: Dict[Tuple[str, str], _OpenChunk] = {}
+
+    for row_number, row in enumerate(rows):
+        line = _format_row(row)
+        tokens = estimate_tokens(line)
+        timestamp = schema.timestamp(row)
+        group = schema.group_key(row)
+
+        chunk = open_chunks.get(group)
+        if chunk is not None:
+            over_budget = chunk.tokens + tokens > max_tokens
+            outside_window = (timestamp is not None and chunk.start_time is not None
+                              and timestamp - chunk.start_time > time_window)
+            if over_budget or outside_window:
+                yield _to_document(chunk, group, source)
+                chunk = None
+
+        if chunk is None:
+            chunk = open_chunks[group] = _OpenChunk(header_line, row_number, timestamp)
+        chunk.add(line, tokens, row_number, timestamp)
+
+    for group, chunk in open_chunks.items():
+        yield _to_document(chunk, group, source)
+
+
+def chunk_parsed_csv(csv_path: str, **options) -> Iterator[Document]:
+    """Chunk a CSV written by parser.py; see chunk_records() for the options."""
+    schema, rows = read_parsed_csv(csv_path)
+    return chunk_records(schema, rows, source=csv_path, **options)
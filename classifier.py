@@ -3,8 +3,9 @@ from __future__ import annotations
 import json
 import re
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Sequence, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
 import joblib
 import numpy as np
@@ -13,10 +14,13 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import FeatureUnion, Pipeline
 from sklearn.preprocessing import FunctionTransformer
 
+import metrics
+
 
 LOG_TYPES = ("sys", "kernel", "auth", "ovs")
 PLATFORMS = ("linux", "macos", "windows", "unknown")
 FEATURE_VECTOR_SIZE = 12
+DEFAULT_MODEL_PATH = "models/log_classifier.joblib"
 KEYWORD_CONFIDENCE_THRESHOLD = 0.8
 
 TIMESTAMP_PATTERNS = [
@@ -41,6 +45,50 @@ PLATFORM_KEYWORDS = {
 }
 
 
+class KeywordMatcher:
+    """Counts every keyword of a fixed vocabulary in a single pass over the text.
+
+    The vocabulary is compiled into one lookahead alternation, longest keyword
+    first, so each position in the text is tested once regardless of how many
+    keywords there are. A match also credits every shorter keyword that is a
+    prefix of it (e.g. "service control manager" counts "service" as well), which
+    keeps the counts identical to calling ``str.count`` per keyword.
+    """
+
+    def __init__(self, keywords: Iterable[str]) -> None:
+        self.keywords: Tuple[str, ...] = tuple(sorted(set(keywords), key=lambda kw: (-len(kw), kw)))
+        alternation = "|".join(re.escape(keyword) for keyword in self.keywords)
+        self._pattern = re.compile(f"(?=({alternation}))")
+        self._prefixes: Dict[str, Tuple[str, ...]] = {
+            keyword: tuple(other for other in self.keywords if keyword.startswith(other))
+            for keyword in self.keywords
+        }
+
+    def count(self, lower_text: str) -> Dict[str, int]:
+        counts = dict.fromkeys(self.keywords, 0)
+        last_end: Dict[str, int] = {}
+        for match in self._pattern.finditer(lower_text):
+            start = match.start()
+            for keyword in self._prefixes[match.group(1)]:
+                # str.count never overlaps occurrences of the same keyword.
+                if start >= last_end.get(keyword, 0):
+                    counts[keyword] += 1
+                    last_end[keyword] = start + len(keyword)
+        return counts
+
+    @staticmethod
+    def label_scores(counts: Dict[str, int], keyword_map: Dict[str, List[str]]) -> Dict[str, int]:
+        return {label: sum(counts[keyword] for keyword in keywords) for label, keywords in keyword_map.items()}
+
+
+KEYWORD_MATCHER = KeywordMatcher(
+    keyword
+    for keyword_map in (TYPE_KEYWORDS, PLATFORM_KEYWORDS)
+    for keywords in keyword_map.values()
+    for keyword in keywords
+)
+
+
 @dataclass
 class PredictionResult:
     is_log_file: bool
@@ -55,6 +103,17 @@ def _safe_text(value: str) -> str:
     return value if isinstance(value, str) else ""
 
 
+@lru_cache(maxsize=8)
+def _cached_keyword_counts(content: str) -> Tuple[Tuple[str, int], ...]:
+    return tuple(KEYWORD_MATCHER.count(content.lower()).items())
+
+
+def keyword_counts(text: str) -> Dict[str, int]:
+    # predict() runs three pipelines plus two blending steps over the same text;
+    # the small cache lets all of them share one scan.
+    return dict(_cached_keyword_counts(_safe_text(text)))
+
+
 def extract_features(text: str) -> np.ndarray:
     content = _safe_text(text)
     lines = [line for line in content.splitlines() if line.strip()]
@@ -66,9 +125,9 @@ def extract_features(text: str) -> np.ndarray:
     level_hits = sum(bool(LEVEL_PATTERN.search(line)) for line in lines)
     structured_hits = sum(bool(re.search(r"[:\[\]\-]", line)) for line in lines)
 
-    lower_text = content.lower()
-    type_scores = [sum(lower_text.count(keyword) for keyword in keywords) for keywords in TYPE_KEYWORDS.values()]
-    platform_scores = [sum(lower_text.count(keyword) for keyword in keywords) for keywords in PLATFORM_KEYWORDS.values()]
+    counts = keyword_counts(content)
+    type_scores = list(KeywordMatcher.label_scores(counts, TYPE_KEYWORDS).values())
+    platform_scores = list(KeywordMatcher.label_scores(counts, PLATFORM_KEYWORDS).values())
 
     avg_line_len = sum(len(line) for line in lines) / line_count
     digit_ratio = sum(char.isdigit() for char in content) / max(1, len(content))
@@ -95,11 +154,7 @@ def extract_feature_matrix(texts: Sequence[str]) -> np.ndarray:
 
 
 def _keyword_prediction(text: str, keyword_map: Dict[str, List[str]]) -> Optional[Tuple[str, float]]:
-    lower_text = text.lower()
-    scores: Dict[str, int] = {
-        label: sum(lower_text.count(keyword) for keyword in keywords)
-        for label, keywords in keyword_map.items()
-    }
+    scores = KeywordMatcher.label_scores(keyword_counts(text), keyword_map)
     best_label, best_score = max(scores.items(), key=lambda item: item[1])
     if best_score <= 0:
         return None
@@ -217,7 +272,7 @@ def load_jsonl_dataset(path: Path) -> List[Dict[str, str]]:
 
 
 class LogFileClassifier:
-    def __init__(self, model_path: str = "models/log_classifier.joblib") -> None:
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH) -> None:
         self.model_path = Path(model_path)
         self.models: Optional[Dict[str, Pipeline]] = None
 
@@ -227,48 +282,97 @@ class LogFileClassifier:
         self.models = joblib.load(self.model_path)
         return True
 
-    def predict(self, text: str) -> PredictionResult:
+    def _require_models(self) -> Dict[str, Pipeline]:
         if self.models is None:
             raise RuntimeError("Model is not loaded. Train or load a model before prediction.")
+        return self.models
+
+    def log_probabilities(self, texts: Sequence[str]) -> List[float]:
+        binary_model = self._require_models()["binary"]
+        cleaned_texts = [_safe_text(text) for text in texts]
+        if not cleaned_texts:
+            return []
+
+        with metrics.span("classifier_log_probability"):
+            binary_probs = binary_model.predict_proba(cleaned_texts)
+        binary_classes = [int(cls) for cls in binary_model.classes_]
+        if 1 not in binary_classes:
+            return [0.0] * len(cleaned_texts)
+        positive_column = binary_classes.index(1)
+        return [float(row[positive_column]) for row in binary_probs]
 
-        cleaned_text = _safe_text(text)
-        if not cleaned_text.strip():
-            return PredictionResult(False, 0.0, None, None, None, None)
-
-        binary_model = self.models["binary"]
-        binary_probs = binary_model.predict_proba([cleaned_text])[0]
-        binary_classes = binary_model.classes_
-        class_to_prob = {int(cls): float(prob) for cls, prob in zip(binary_classes, binary_probs)}
-
-        log_probability = class_to_prob.get(1, 0.0)
-        is_log_file = log_probability >= 0.5
-
-        if not is_log_file:
-            return PredictionResult(False, 1.0 - log_probability, None, None, None, None)
-
-        log_type_model = self.models["log_type"]
-        log_type_probs = log_type_model.predict_proba([cleaned_text])[0]
-        log_type_index = int(np.argmax(log_type_probs))
-        log_type = str(log_type_model.classes_[log_type_index])
-        log_type_confidence = float(log_type_probs[log_type_index])
-        log_type, log_type_confidence = _blend_with_keywords(
-            log_type, log_type_confidence, cleaned_text, TYPE_KEYWORDS
-        )
+    def predict(self, text: str) -> PredictionResult:
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts: Sequence[str]) -> List[PredictionResult]:
+        metrics.inc("classifier_texts_total", len(texts))
+        with metrics.span("classifier_predict"):
+            return self._predict_batch(texts)
+
+    def _predict_batch(self, texts: Sequence[str]) -> List[PredictionResult]:
+        models = self._require_models()
+        cleaned_texts = [_safe_text(text) for text in texts]
+        results: List[PredictionResult] = [
+            PredictionResult(False, 0.0, None, None, None, None) for _ in cleaned_texts
+        ]
 
-        platform_model = self.models["platform"]
-        platform_probs = platform_model.predict_proba([cleaned_text])[0]
-        platform_index = int(np.argmax(platform_probs))
-        platform = str(platform_model.classes_[platform_index])
-        platform_confidence = float(platform_probs[platform_index])
-        platform, platform_confidence = _blend_with_keywords(
-            platform, platform_confidence, cleaned_text, PLATFORM_KEYWORDS
-        )
+        candidates = [index for index, text in enumerate(cleaned_texts) if text.strip()]
+        if not candidates:
+            return results
 
-        return PredictionResult(
-            is_log_file=True,
-            confidence=log_probability,
-            log_type=log_type,
-            log_type_confidence=log_type_confidence,
-            platform=platform,
-            platform_confidence=platform_confidence,
+        log_probabilities = dict(
+            zip(candidates, self.log_probabilities([cleaned_texts[index] for index in candidates]))
         )
+        log_indices = []
+        for index, log_probability in log_probabilities.items():
+            if log_probability >= 0.5:
+                log_indices.append(index)
+            else:
+                results[index] = PredictionResult(False, 1.0 - log_probability, None, None, None, None)
+
+        if not log_indices:
+            return results
+
+        log_texts = [cleaned_texts[index] for index in log_indices]
+        log_types = _predict_labels(models["log_type"], log_texts, TYPE_KEYWORDS)
+        platforms = _predict_labels(models["platform"], log_texts, PLATFORM_KEYWORDS)
+
+        for index, (log_type, log_type_confidence), (platform, platform_confidence) in zip(
+            log_indices, log_types, platforms
+        ):
+            results[index] = PredictionResult(
+                is_log_file=True,
+                confidence=log_probabilities[index],
+                log_type=log_type,
+                log_type_confidence=log_type_confidence,
+                platform=platform,
+                platform_confidence=platform_confidence,
+            )
+        return results
+
+
+def _predict_labels(
+    model: Pipeline,
+    texts: Sequence[str],
+    keyword_map: Dict[str, List[str]],
+) -> List[Tuple[str, float]]:
+    labels: List[Tuple[str, float]] = []
+    for text, probs in zip(texts, model.predict_proba(list(texts))):
+        best_index = int(np.argmax(probs))
+        label = str(model.classes_[best_index])
+        labels.append(_blend_with_keywords(label, float(probs[best_index]), text, keyword_map))
+    return labels
+
+
+_LOADED_CLASSIFIERS: Dict[str, LogFileClassifier] = {}
+
+
+def load_default_classifier(model_path: str = DEFAULT_MODEL_PATH) -> Optional[LogFileClassifier]:
+    # A missing model is not cached, so training one takes effect without a restart.
+    classifier = _LOADED_CLASSIFIERS.get(model_path)
+    if classifier is None:
+        classifier = LogFileClassifier(model_path)
+        if not classifier.load():
+            return None
+        _LOADED_CLASSIFIERS[model_path] = classifier
+    return classifier
@@ -0,0 +1,320 @@
+"""
+Local HTTP server sharing one warm log classifier between app workers.
+
+Every Streamlit process loading its own copy of the model costs memory and a cold
+start. classifier_server.py loads it once and serves POST /predict on localhost;
+concurrent requests are coalesced by a MicroBatcher into batches of up to
+``max_batch_size`` texts, flushed when full or after ``max_wait_ms``. When the queue
+is full a request gets HTTP 503 (ServerBusyError in ClassifierClient), and callers
+fall back to a local model. GET /metrics reports the queue depth, batch sizes,
+batch latency and rejections:
+
+    python classifier_server.py --max-batch-size 32 --max-wait-ms 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence
+
+import metrics
+from classifier import DEFAULT_MODEL_PATH, LogFileClassifier, PredictionResult
+from config import (
+    CLASSIFIER_MAX_BATCH_SIZE,
+    CLASSIFIER_MAX_QUEUE_SIZE,
+    CLASSIFIER_MAX_WAIT_MS,
+    CLASSIFIER_REQUEST_TIMEOUT,
+    CLASSIFIER_SERVER_HOST,
+    CLASSIFIER_SERVER_PORT,
+)
+
+
+class ServerBusyError(RuntimeError):
+    pass
+
+
+class ClassifierUnavailableError(RuntimeError):
+    pass
+
+
+@dataclass
+class _PendingRequest:
+    text: str
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Optional[PredictionResult] = None
+    error: Optional[BaseException] = None
+
+
+@dataclass
+class BatcherMetrics:
+    requests_total: int = 0
+    rejected_total: int = 0
+    batches_total: int = 0
+    batched_items_total: int = 0
+    largest_batch: int = 0
+    predict_seconds_total: float = 0.0
+
+    def snapshot(self, queue_depth: int, max_queue_size: int) -> Dict[str, float]:
+        batches = max(1, self.batches_total)
+        return {
+            "queue_depth": queue_depth,
+            "max_queue_size": max_queue_size,
+            "requests_total": self.requests_total,
+            "rejected_total": self.rejected_total,
+            "batches_total": self.batches_total,
+            "avg_batch_size": self.batched_items_total / batches,
+            "largest_batch": self.largest_batch,
+            "avg_batch_latency_ms": 1000.0 * self.predict_seconds_total / batches,
+        }
+
+
+class MicroBatcher:
+    """Coalesces concurrent prediction requests into batches for a single model.
+
+    A batch is flushed as soon as it holds ``max_batch_size`` items or the oldest
+    item has waited ``max_wait`` seconds. The queue is bounded: a request that would
+    take the queued work beyond ``max_queue_size`` items is rejected with
+    ``ServerBusyError`` instead of piling up, but a request finding the queue empty is
+    always admitted, however large. ``max_queue_size`` <= 0 means unbounded.
+    """
+
+    def __init__(
+        self,
+        predict_batch: Callable[[Sequence[str]], List[PredictionResult]],
+        max_batch_size: int = CLASSIFIER_MAX_BATCH_SIZE,
+        max_wait: float = CLASSIFIER_MAX_WAIT_MS / 1000.0,
+        max_queue_size: int = CLASSIFIER_MAX_QUEUE_SIZE,
+    ) -> None:
+        self._predict_batch = predict_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self.max_queue_size = max_queue_size
+        # Admission is decided in submit(); the queue itself never blocks or refuses.
+        self._queue: "queue.Queue[_PendingRequest]" = queue.Queue()
+        self._metrics = BatcherMetrics()
+        self._metrics_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="classifier-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, texts: Sequence[str], timeout: float = CLASSIFIER_REQUEST_TIMEOUT) -> List[PredictionResult]:
+        pending = [_PendingRequest(text) for text in texts]
+        with self._metrics_lock:
+            self._metrics.requests_total += 1
+            # Admit the whole request or none of it, so a rejected request never
+            # leaves orphaned items in the queue.
+            queued = self._queue.qsize()
+            if 0 < self.max_queue_size < queued + len(pending) and queued:
+                self._metrics.rejected_total += 1
+                raise ServerBusyError("Classifier queue is full.")
+            for item in pending:
+                self._queue.put_nowait(item)
+
+        deadline = time.monotonic() + timeout
+        for item in pending:
+            if not item.done.wait(max(0.0, deadline - time.monotonic())):
+                raise TimeoutError("Timed out waiting for a prediction.")
+            if item.error is not None:
+                raise item.error
+        return [item.result for item in pending]
+
+    def metrics(self) -> Dict[str, float]:
+        with self._metrics_lock:
+            return self._metrics.snapshot(self._queue.qsize(), self.max_queue_size)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._worker.join()
+
+    def _next_batch(self) -> List[_PendingRequest]:
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                results = self._predict_batch([item.text for item in batch])
+                for item, result in zip(batch, results):
+                    item.result = result
+            except Exception as exc:
+                for item in batch:
+                    item.error = exc
+            elapsed = time.perf_counter() - started
+
+            with self._metrics_lock:
+                self._metrics.batches_total += 1
+                self._metrics.batched_items_total += len(batch)
+                self._metrics.largest_batch = max(self._metrics.largest_batch, len(batch))
+                self._metrics.predict_seconds_total += elapsed
+
+            for item in batch:
+                item.done.set()
+
+
+def _make_handler(batcher: MicroBatcher) -> type:
+    class ClassifierRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: object) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            if self.path == "/healthz":
+                self._send_json(200, {"status": "ok"})
+            elif self.path == "/metrics":
+                self._send_json(200, batcher.metrics())
+            elif self.path == "/metrics/prometheus":
+                for name, value in batcher.metrics().items():
+                    metrics.set_gauge(f"classifier_server_{name}", value)
+                body = metrics.REGISTRY.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            if self.path != "/predict":
+                self._send_json(404, {"error": "not found"})
+                return
+
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                texts = payload["texts"] if "texts" in payload else [payload["text"]]
+            except (ValueError, KeyError, TypeError):
+                self._send_json(400, {"error": "expected JSON with 'text' or 'texts'"})
+                return
+
+            try:
+                results = batcher.submit([str(text) for text in texts])
+            except ServerBusyError as exc:
+                self._send_json(503, {"error": str(exc)})
+                return
+            except TimeoutError as exc:
+                self._send_json(504, {"error": str(exc)})
+                return
+            except Exception as exc:
+                self._send_json(500, {"error": str(exc)})
+                return
+
+            self._send_json(200, {"results": [asdict(result) for result in results]})
+
+        def log_message(self, format: str, *args: object) -> None:
+            # Per-request access logs would dominate output under load.
+            pass
+
+    return ClassifierRequestHandler
+
+
+def create_server(
+    classifier: LogFileClassifier,
+    host: str = CLASSIFIER_SERVER_HOST,
+    port: int = CLASSIFIER_SERVER_PORT,
+    **batcher_options: float,
+) -> ThreadingHTTPServer:
+    batcher = MicroBatcher(classifier.predict_batch, **batcher_options)
+    server = ThreadingHTTPServer((host, port), _make_handler(batcher))
+    server.batcher = batcher
+    return server
+
+
+class ClassifierClient:
+    def __init__(
+        self,
+        host: str = CLASSIFIER_SERVER_HOST,
+        port: int = CLASSIFIER_SERVER_PORT,
+        timeout: float = CLASSIFIER_REQUEST_TIMEOUT,
+    ) -> None:
+        self.base_url = f"http://{host}:{port}"
+        self.timeout = timeout
+
+    def predict(self, text: str) -> PredictionResult:
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts: Sequence[str]) -> List[PredictionResult]:
+        request = urllib.request.Request(
+            f"{self.base_url}/predict",
+            data=json.dumps({"texts": list(texts)}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = json.loads(response.read())
+        except urllib.error.HTTPError as exc:
+            if exc.code == 503:
+                raise ServerBusyError("Classifier server is overloaded.") from exc
+            raise ClassifierUnavailableError(f"Classifier server error: {exc.code}") from exc
+        except (urllib.error.URLError, OSError) as exc:
+            raise ClassifierUnavailableError(f"Classifier server unreachable: {exc}") from exc
+        return [PredictionResult(**result) for result in payload["results"]]
+
+    def metrics(self) -> Dict[str, float]:
+        with urllib.request.urlopen(f"{self.base_url}/metrics", timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the log classifier over localhost HTTP")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Path to the trained model")
+    parser.add_argument("--host", default=CLASSIFIER_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=CLASSIFIER_SERVER_PORT)
+    parser.add_argument("--max-batch-size", type=int, default=CLASSIFIER_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=CLASSIFIER_MAX_WAIT_MS)
+    parser.add_argument("--max-queue-size", type=int, default=CLASSIFIER_MAX_QUEUE_SIZE)
+    args = parser.parse_args()
+
+    classifier = LogFileClassifier(args.model)
+    if not classifier.load():
+        raise SystemExit(f"Model file not found: {args.model}. Run `python train_model.py` first.")
+
+    server = create_server(
+        classifier,
+        host=args.host,
+        port=args.port,
+        max_batch_size=args.max_batch_size,
+        max_wait=args.max_wait_ms / 1000.0,
+        max_queue_size=args.max_queue_size,
+    )
+    print(f"Serving log classifier on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.stop()
+
+
+if __name__ == "__main__":
+    main()
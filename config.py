@@ -5,15 +5,112 @@ LLM_CLASSIFIER_MODEL = "llama-3.3-70b-versatile"  # Best for classification
 LLM_PARSER_MODEL = "llama-3.1-8b-instant"  # Faster for parsing
 LLM_TEMPERATURE = 0.1  # Low temperature for consistent parsing
 LLM_MAX_TOKENS = 2048
+LLM_MAX_RETRIES = 2  # Per call, with exponential backoff; counted in llm_retries_total
 
 # Parsing Configuration
 BATCH_SIZE = 50  # Process logs in batches for efficiency
 MAX_SAMPLE_LINES = 10  # Lines to sample for classification
-CSV_OUTPUT_PATH = "./parsed_log_data.csv"
+CSV_OUTPUT_PATH = "./parsed_log_data.csv"  # Default for standalone use; the app writes into per-session workspaces
+
+# Per-session workspaces & the shared parse worker pool (workspace.py)
+WORKSPACE_ROOT = "./.cache/workspaces"
+WORKSPACE_MAX_AGE_SECONDS = 24 * 3600  # Workspaces of sessions that never cleaned up are removed after this
+PARSE_POOL_WORKERS = 4  # Parse processes shared by all sessions
+
+# Background ingest (ingest_jobs.py)
+INGEST_PIPE_SIZE = 2000  # Documents buffered between indexing & embedding
+INGEST_PROGRESS_EVERY = 1000  # Rows between index progress updates
+INGEST_POLL_SECONDS = 0.5  # How often the UI refreshes the ingest progress
+RAW_TEXT_BLOCK_CHARS = 1 << 20  # Unparsed uploads are read & split this many characters at a time
 
 # Classification threshold - confidence score below this triggers fallback
 CONFIDENCE_THRESHOLD = 30
 
+# Chunking of parsed records for embedding (chunking.py)
+CHUNK_TOKEN_BUDGET = 512  # Whole records are packed into chunks up to this many tokens
+CHUNK_TIME_WINDOW_SECONDS = 300  # A chunk never spans more than this much log time
+CHARS_PER_TOKEN = 4  # Rough token estimate used for budgeting
+
+# Template-deduplicated embedding (templates.py)
+EMBEDDING_GRANULARITY = "templates"  # 'templates': one vector per message template, 'chunks': chunking.py
+TEMPLATE_EXAMPLES = 3  # Example lines kept per template
+TEMPLATE_EXPANSION_LINES = 20  # Concrete lines shown per retrieved template
+
+# Embeddings
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+EMBEDDING_CACHE_PATH = "./.cache/embeddings.sqlite3"  # Content-addressed, shared by all sessions
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000  # Least recently used vectors are evicted beyond this
+EMBEDDING_BATCH_SIZE = 100  # Chunks per embedding request
+EMBEDDING_MAX_CONCURRENCY = 4  # Embedding requests in flight at once
+EMBEDDING_REQUESTS_PER_MINUTE = 100  # Provider rate limit (0 = unlimited)
+EMBEDDING_MAX_RETRIES = 3  # Per batch, with exponential backoff
+INDEX_RETENTION_SECONDS = 7 * 24 * 3600  # Log history kept by IncrementalLogIndex.expire()
+
+# Vector index compression for very large logs (indexing.compress_vector_index)
+VECTOR_INDEX_TYPE = "ivfpq"  # 'flat', 'sq8' (4x smaller), 'ivfsq8' or 'ivfpq' (~100x smaller)
+VECTOR_INDEX_COMPRESS_MIN_CHUNKS = 20_000  # Smaller indexes stay flat (exact)
+VECTOR_INDEX_NLIST = 1024  # Max IVF lists; capped at chunks / 39
+VECTOR_INDEX_PQ_M = 64  # Max PQ sub-quantizers = bytes per vector
+VECTOR_INDEX_NPROBE = 16  # IVF lists scanned per query: higher = better recall, slower
+VECTOR_INDEX_TRAIN_SIZE = 50_000  # Vectors sampled for training
+VECTOR_INDEX_EVAL_K = 10  # Recall@k measured against the flat index
+VECTOR_INDEX_EVAL_QUERIES = 100
+
+# Per-upload artifacts (parse result, classification, FAISS index) keyed by file hash
+ARTIFACT_STORE_PATH = "./.cache/artifacts"
+ARTIFACT_STORE_MAX_ENTRIES = 50  # Least recently used uploads are deleted beyond this
+
+# Retrieval (retrieval.py / inverted_index.py)
+VECTOR_RETRIEVAL_K = 4  # Chunks fetched by similarity search
+HYBRID_RETRIEVAL_K = 8  # Documents returned after fusing BM25 & vector rankings
+EXACT_MATCH_LIMIT = 20  # Rows returned for exact identifier lookups (PIDs, error codes, ...)
+TIME_WINDOW_OVERSAMPLE = 5  # Vector results fetched per kept result when filtering by a time window
+RRF_K = 60  # Reciprocal rank fusion damping constant
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Retrieved context compression (context_compression.py), between the retriever & the LLM
+CONTEXT_TOKEN_BUDGET = 1500  # Estimated prompt tokens of all retrieved documents after compression
+CONTEXT_DISTINCT_VALUES = 3  # Differing values of a collapsed column listed in full; more become a first..last range
+
+# Parse-time rollups (rollups.py), summarized instead of retrieved chunks for overview questions
+ROLLUP_BUCKET_SECONDS = 60  # Per-minute counts
+ROLLUP_TOP_VALUES = 8  # Values listed per column (severity, module, process, host) in the summary
+ROLLUP_TOP_TEMPLATES = 15  # Most frequent message templates kept & listed
+ROLLUP_OVERVIEW_DOCUMENTS = 1  # Retrieved documents passed along with the summary
+
+# Structured (SQL) answers for aggregate & filter questions (log_query.py / query_router.py)
+STRUCTURED_QUERY_ROW_LIMIT = 50  # Rows / groups shown in an answer
+SQL_INSERT_BATCH_SIZE = 5000
+
+# Chat answer cache (answer_cache.py)
+ANSWER_CACHE_MAX_ENTRIES = 512  # Least recently used answers are evicted beyond this
+ANSWER_CACHE_SIMILARITY = 0.95  # Cosine similarity for two questions to share an answer
+
+# Upload validation (validate_log_file): the local model's log probability decides on its own
+# outside this band; only probabilities inside it are forwarded to the LLM.
+VALIDATION_UNCERTAIN_BAND = (0.2, 0.8)
+VALIDATION_CACHE_SIZE = 256  # Validation results memoized per file hash
+
+# Number of recent cascade decisions (tier + latency) kept in memory for inspection
+DECISION_HISTORY_SIZE = 100
+
+# Pipeline instrumentation (metrics.py): spans & counters, exported as JSON / Prometheus text
+METRICS_ENABLED = True
+
+# Parser benchmarks (benchmark.py, synthetic logs from log_generator.py)
+BENCHMARK_LINES = 200_000  # Lines per generated log
+BENCHMARK_BASELINE_PATH = "./data/parser_baselines.json"
+BENCHMARK_TOLERANCE = 0.2  # Slower lines/s or higher peak RSS than the baseline by more than this fails
+
+# Local stand-in for the Groq (OpenAI-compatible) API, used by llm_benchmark.py (fake_llm_server.py)
+FAKE_LLM_SERVER_HOST = "127.0.0.1"
+FAKE_LLM_SERVER_PORT = 8766
+FAKE_LLM_EMBEDDING_DIM = 768
+
+# Headless batch processing (batch_parse.py); workers default to PARSE_POOL_WORKERS
+BATCH_OUTPUT_DIR = "./batch_output"
+
 # Keywords to skip when parsing CSV response (explanatory text from LLM)
 CSV_SKIP_KEYWORDS = ('here', 'the ', 'csv', 'output', 'parsed')
 
@@ -30,3 +127,11 @@ KNOWN_LOG_TYPES = [
     "Docker",
     "Custom"
 ]
+
+# Classification server (classifier_server.py) - one warm model shared by all app workers
+CLASSIFIER_SERVER_HOST = "127.0.0.1"
+CLASSIFIER_SERVER_PORT = 8765
+CLASSIFIER_MAX_BATCH_SIZE = 32  # Requests coalesced into a single predict call
+CLASSIFIER_MAX_WAIT_MS = 10  # How long the first request in a batch waits for company
+CLASSIFIER_MAX_QUEUE_SIZE = 256  # Requests that would queue more texts than this are rejected (HTTP 503); 0 = unbounded
+CLASSIFIER_REQUEST_TIMEOUT = 10.0  # Seconds
@@ -0,0 +1,212 @@
+"""
+Compression of retrieved context before it is stuffed into the prompt.
+
+Retrieved documents repeat a lot: every chunk starts with the CSV header, columns
+such as the hostname hold the same value in every row, fused rankings return the
+same row twice, and a burst of near-identical lines ("link is down" a hundred times)
+costs a hundred lines of prompt. ContextCompressor runs between the retriever and
+the stuff-documents chain. It drops duplicate rows and repeated headers, drops
+columns that are constant or empty across the retrieved rows (naming the constants
+once), collapses rows that match the same message template into one counted line
+that still names the values (PIDs, addresses, ...) that differ between them, and
+cuts the result to a token budget. Retrieval can then return more documents
+without a bigger prompt.
+"""
+
+import csv
+import io
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+import metrics
+from chunking import estimate_tokens
+from config import CHARS_PER_TOKEN, CONTEXT_DISTINCT_VALUES, CONTEXT_TOKEN_BUDGET
+from log_records import COLUMN_ROLES
+from templates import message_template
+
+# Columns that differ between otherwise identical rows; not part of the collapse key.
+TIME_COLUMNS = frozenset(COLUMN_ROLES['time'] + COLUMN_ROLES['date'] + COLUMN_ROLES['clock'])
+
+
+def _format_row(row: Sequence[str]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue().rstrip('\r\n')
+
+
+def _distinct(values: List[str]) -> str:
+    """One cell for the differing values of a collapsed column, e.g. ``101..105 (5 distinct)``."""
+    distinct = list(dict.fromkeys(values))
+    if len(distinct) == 1:
+        return distinct[0]
+    words = [value.split() for value in distinct]
+    if len(words[0]) > 1 and all(len(split) == len(words[0]) for split in words):
+        # Messages of one template: only the words that differ are listed, in place.
+        return " ".join(position[0] if len(set(position)) == 1 else f"[{_distinct(list(position))}]"
+                        for position in zip(*words))
+    if len(distinct) <= CONTEXT_DISTINCT_VALUES:
+        return " | ".join(distinct)
+    return f"{distinct[0]}..{distinct[-1]} ({len(distinct)} distinct)"
+
+
+def _line_tokens(line: str) -> int:
+    # Rounded up & counting the line break, so the lines of a document never add up to less than the document.
+    return -(-(len(line) + 1) // CHARS_PER_TOKEN)
+
+
+class _Section:
+    """One retrieved document, split into its text lines and its CSV rows."""
+
+    __slots__ = ('document', 'text', 'rows')
+
+    def __init__(self, document: Document):
+        self.document = document
+        self.text: List[str] = []
+        self.rows: List[List[str]] = []
+
+
+class ContextCompressor:
+    """
+    Args:
+        header: CSV header of the parsed log; lines equal to it mark where rows start.
+            None for unparsed uploads, whose chunks are plain text.
+        token_budget: Estimated tokens of all compressed documents together
+    """
+
+    def __init__(self, header: Optional[List[str]] = None, token_budget: int = CONTEXT_TOKEN_BUDGET):
+        self.header = list(header) if header else None
+        self.header_line = _format_row(self.header) if self.header else None
+        self.token_budget = token_budget
+
+    def __call__(self, documents: List[Document]) -> List[Document]:
+        return self.compress(documents)
+
+    def compress(self, documents: List[Document]) -> List[Document]:
+        with metrics.span('context_compression'):
+            compressed = self._compress(documents)
+        if metrics.enabled():
+            metrics.inc('context_tokens_total', sum(estimate_tokens(doc.page_content) for doc in documents),
+                        stage='retrieved')
+            metrics.inc('context_tokens_total', sum(estimate_tokens(doc.page_content) for doc in compressed),
+                        stage='compressed')
+        return compressed
+
+    def _split(self, document: Document) -> _Section:
+        section = _Section(document)
+        in_table = False
+        for line in document.page_content.splitlines():
+            if self.header_line is not None and line == self.header_line:
+                in_table = True
+            elif in_table and line:
+                section.rows.append(next(csv.reader([line]), []))
+            elif line.strip():
+                section.text.append(line)
+        return section
+
+    def _column_plan(self, sections: List[_Section]) -> Tuple[List[int], Dict[str, str]]:
+        """Indexes of the columns worth showing, and the constant values of the others."""
+        rows = [row for section in sections for row in section.rows if len(row) == len(self.header)]
+        if len(rows) < 2:
+            return list(range(len(self.header))), {}
+        keep, constants = [], {}
+        for index, name in enumerate(self.header):
+            values = {row[index] for row in rows}
+            if len(values) > 1:
+                keep.append(index)
+            elif values != {''}:
+                constants[name] = values.pop()
+        return keep, constants
+
+    def _collapse_rows(self, rows: List[List[str]], keep: List[int]) -> List[str]:
+        groups: Dict[tuple, List[List[str]]] = {}
+        for row in rows:
+            if len(row) != len(self.header):
+                # Irregular row: kept as it is, never merged.
+                groups[(id(row),)] = [row]
+                continue
+            key = tuple(message_template(row[index]) for index in keep if self.header[index] not in TIME_COLUMNS)
+            groups.setdefault(key, []).append(row)
+
+        time_columns = [index for index in keep if self.header[index] in TIME_COLUMNS]
+        lines = []
+        for group in groups.values():
+            first = group[0]
+            if len(first) != len(self.header):
+                lines.append(_format_row(first))
+                continue
+            # Padding (e.g. of dmesg timestamps) is dropped with the rest of the redundancy. The template masks
+            # identifiers, so the rows of a group can differ outside the time columns; those values are kept.
+            line = _format_row([first[index].strip() if self.header[index] in TIME_COLUMNS
+                                else _distinct([row[index].strip() for row in group]) for index in keep])
+            if len(group) > 1:
+                last = " ".join(group[-1][index].strip() for index in time_columns)
+                line += f"  (x{len(group)}{f', last at {last}' if last else ''})"
+            lines.append(line)
+        return lines
+
+    @staticmethod
+    def _collapse_text(lines: List[str]) -> List[str]:
+        groups: Dict[str, List[str]] = {}
+        for line in lines:
+            groups.setdefault(message_template(line), []).append(line)
+        return [group[0] + (f"  (x{len(group)})" if len(group) > 1 else "")
+                for group in groups.values()]
+
+    def _compress(self, documents: List[Document]) -> List[Document]:
+        sections = [self._split(document) for document in documents]
+
+        # The same row is often retrieved twice (e.g. by BM25 and inside an expanded template).
+        seen = set()
+        for section in sections:
+            unique = []
+            for row in section.rows:
+                key = tuple(row)
+                if key not in seen:
+                    seen.add(key)
+                    unique.append(row)
+            section.rows = unique
+
+        keep, constants = self._column_plan(sections) if self.header else ([], {})
+        table_intro = []
+        if any(section.rows for section in sections):
+            if constants:
+                table_intro.append("Every row below has " + ", ".join(f"{name}={value}"
+                                                                      for name, value in constants.items()) + ".")
+            table_intro.append(_format_row([self.header[index] for index in keep]))
+
+        compressed = []
+        budget = self.token_budget
+        for section in sections:
+            if section.document.metadata.get('retrieval') == 'rollup':
+                lines = section.text  # Already a compact summary
+            else:
+                lines = self._collapse_text(section.text)
+            if section.rows:
+                lines = lines + table_intro + self._collapse_rows(section.rows, keep)
+                table_intro = []  # The header & constants are stated once, before the first rows
+            if not lines:
+                continue
+
+            kept, used = [], 0
+            for line in lines:
+                tokens = _line_tokens(line)
+                if used + tokens > budget:
+                    break
+                kept.append(line)
+                used += tokens
+            truncated = len(kept) < len(lines)
+            if truncated:
+                # Make room for the note within the budget.
+                while kept and used + _line_tokens(f"... {len(lines) - len(kept)} more lines omitted") > budget:
+                    used -= _line_tokens(kept.pop())
+            if kept:
+                if truncated:
+                    kept.append(f"... {len(lines) - len(kept)} more lines omitted")
+                compressed.append(Document(page_content="\n".join(kept),
+                                           metadata={**section.document.metadata, 'compressed': True}))
+            budget -= used
+            if truncated:
+                # The budget is spent; later documents rank lower anyway.
+                break
+        return compressed
@@ -0,0 +1,129 @@
+"""
+Content-addressed on-disk cache for embeddings.
+
+Vectors are stored in SQLite keyed by a hash of the embedding model name and the
+chunk text, so re-uploading a log (or a log that shares most of its lines with an
+earlier one) only sends the unseen chunks to the embedding provider.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+import metrics
+from config import EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_PATH
+
+# SQLite limits the number of bound parameters per statement.
+_SQL_BATCH = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrap any LangChain embeddings object with a size-bounded on-disk cache.
+
+    Only cache misses are forwarded to the wrapped provider; the least recently used
+    entries are evicted once the cache holds more than ``max_entries`` vectors. For
+    tests, wrap ``langchain_core.embeddings.DeterministicFakeEmbedding``.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache_path: str = EMBEDDING_CACHE_PATH,
+                 model_name: Optional[str] = None, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            embeddings: The embeddings object to wrap
+            cache_path: SQLite file holding the cache (":memory:" for a throwaway cache)
+            model_name: Part of the cache key; defaults to the wrapped object's ``model``
+            max_entries: Maximum number of cached vectors before LRU eviction
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(embeddings, 'model', None) or type(embeddings).__name__
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        if cache_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def _key(self, kind: str, text: str) -> str:
+        # Query and document embeddings differ for some providers (task types), so keep them apart.
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode('utf-8')).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array('f')
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+                self._conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})", [now, *batch]
+                )
+            self._conn.commit()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array('f', vector).tobytes(), now) for key, vector in items.items()],
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def _embed(self, kind: str, texts: List[str], embed_fn) -> List[List[float]]:
+        keys = [self._key(kind, text) for text in texts]
+        vectors = self._lookup(list(dict.fromkeys(keys)))
+
+        # Embed each distinct missing text once, even if it repeats within the batch.
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        hits = len(texts) - sum(1 for key in keys if key in missing)
+        self.hits += hits
+        self.misses += len(missing)
+        metrics.inc('embedding_cache_hits_total', hits, kind=kind)
+        metrics.inc('embedding_cache_misses_total', len(missing), kind=kind)
+
+        if missing:
+            with metrics.span('embedding_provider', kind=kind):
+                new_vectors = dict(zip(missing.keys(), embed_fn(list(missing.values()))))
+            self._store(new_vectors)
+            vectors.update(new_vectors)
+
+        return [list(vectors[key]) for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed('document', texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed('query', [text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
@@ -0,0 +1,504 @@
+"""
+Local stand-in for the Groq (OpenAI-compatible) chat & embedding API.
+
+Serves /openai/v1/chat/completions (also as a token stream), /openai/v1/embeddings and
+the same paths without the /openai prefix, with configurable latency distributions,
+a request rate limit (HTTP 429 with Retry-After, like the real API) and injected
+server errors. Replies come from recorded responses when a replay file is given and
+are synthesized otherwise, in the shape the app's prompts ask for (classification
+JSON, schema arrays, CSV rows, Yes/No, answers).
+
+Point the app or llm_benchmark.py at it with GROQ_API_BASE=http://127.0.0.1:8766.
+With --record and --upstream, requests are forwarded to a real provider and the
+responses saved for later replay.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence
+
+from config import CHARS_PER_TOKEN, FAKE_LLM_EMBEDDING_DIM, FAKE_LLM_SERVER_HOST, FAKE_LLM_SERVER_PORT
+
+CHAT_PATHS = ("/openai/v1/chat/completions", "/v1/chat/completions")
+EMBEDDING_PATHS = ("/openai/v1/embeddings", "/v1/embeddings")
+
+
+class LatencyModel:
+    """
+    Response delay drawn from a distribution, given as 'kind:params' in milliseconds.
+
+    fixed:200, uniform:100,400, normal:300,50, lognormal:300,0.6 (median, sigma),
+    exponential:250 (mean). Lognormal gives the long tail real providers have.
+    """
+
+    KINDS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, _, params = spec.partition(":")
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution {kind!r}, expected one of {', '.join(self.KINDS)}")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",") if value.strip()] or [0.0]
+
+    def sample(self, rng: random.Random) -> float:
+        """Delay in seconds."""
+        params = self.params
+        if self.kind == "fixed":
+            millis = params[0]
+        elif self.kind == "uniform":
+            millis = rng.uniform(params[0], params[1] if len(params) > 1 else params[0])
+        elif self.kind == "normal":
+            millis = rng.gauss(params[0], params[1] if len(params) > 1 else 0.0)
+        elif self.kind == "lognormal":
+            millis = params[0] * math.exp(rng.gauss(0.0, params[1] if len(params) > 1 else 0.5))
+        else:
+            millis = rng.expovariate(1.0 / params[0]) if params[0] > 0 else 0.0
+        return max(0.0, millis) / 1000.0
+
+
+class RequestRateLimit:
+    """Token bucket of ``requests_per_minute`` (0 = unlimited) with a burst of ``burst`` requests."""
+
+    def __init__(self, requests_per_minute: float = 0, burst: Optional[int] = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst if burst is not None else max(1, int(requests_per_minute // 60)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> Optional[float]:
+        """None if the request may proceed, else the seconds until it would."""
+        if self.rate <= 0:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            return (1 - self._tokens) / self.rate
+
+
+def request_key(model: str, messages: Sequence[dict]) -> str:
+    """Replay key of a chat request: the model and the exact messages."""
+    canonical = json.dumps({"model": model, "messages": list(messages)}, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseLog:
+    """Recorded chat responses (JSON lines of key, model, messages, content)."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._responses: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if path:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._responses[entry["key"]] = entry["content"]
+            except FileNotFoundError:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._responses.get(key)
+
+    def record(self, key: str, model: str, messages: Sequence[dict], content: str) -> None:
+        with self._lock:
+            self._responses[key] = content
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "model": model, "messages": list(messages),
+                                        "content": content}) + "\n")
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):  # Content parts
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def _split_log_line(line: str, fields: int) -> List[str]:
+    # One word per field, the rest of the line in the last one.
+    values = line.split(None, max(0, fields - 1))
+    return values + [""] * (fields - len(values))
+
+
+def synthetic_reply(messages: Sequence[dict]) -> str:
+    """A plausible reply in the format the app's prompt asks for."""
+    system = " ".join(_message_text(message) for message in messages if message.get("role") == "system")
+    user = " ".join(_message_text(message) for message in messages if message.get("role") != "system")
+
+    if "classification expert" in system:
+        return json.dumps({"log_type": "Custom", "confidence": 85,
+                           "detected_fields": ["timestamp", "host", "process", "message"],
+                           "format_description": "Timestamp, host and process followed by a free-text message"})
+    if "extract the column schema" in system:
+        return json.dumps(["timestamp", "host", "process", "message"])
+    if "structured CSV format" in system:
+        fields_match = re.search(r"Expected fields \(CSV columns\): (.*)", system)
+        fields = len(fields_match.group(1).split(",")) if fields_match else 2
+        lines = user.split("\n\n", 1)[-1].splitlines()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        for line in lines:
+            if line.strip():
+                writer.writerow(_split_log_line(line.strip(), fields))
+        return buffer.getvalue()
+    if "Yes" in system and "No" in system:
+        return "Yes"
+    return ("**The retrieved log entries show no critical errors.**\n\n"
+            "- Most entries are routine informational messages.\n"
+            "- Next step: filter the log by severity to look for warnings around the time in question.")
+
+
+@dataclass
+class FakeServerConfig:
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    stream_chunk_delay: LatencyModel = field(default_factory=LatencyModel)  # Between streamed chunks
+    requests_per_minute: float = 0  # 0 = unlimited
+    burst: Optional[int] = None
+    error_rate: float = 0.0  # Share of requests answered with error_status
+    error_status: int = 500
+    embedding_dim: int = FAKE_LLM_EMBEDDING_DIM
+    replay: Optional[ResponseLog] = None
+    strict_replay: bool = False  # Unrecorded requests fail instead of getting a synthetic reply
+    upstream: Optional[str] = None  # Forward & record instead of replaying/synthesizing
+    upstream_key: Optional[str] = None
+    seed: int = 0
+
+
+@dataclass
+class FakeServerStats:
+    requests: int = 0
+    chat_requests: int = 0
+    embedding_requests: int = 0
+    throttled: int = 0
+    injected_errors: int = 0
+    replayed: int = 0
+    synthesized: int = 0
+    recorded: int = 0
+    unrecorded: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+class FakeLLMService:
+    """Request handling shared by all server threads."""
+
+    def __init__(self, config: FakeServerConfig):
+        self.config = config
+        self.rate_limit = RequestRateLimit(config.requests_per_minute, config.burst)
+        self.stats = FakeServerStats()
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def count(self, **increments: int) -> None:
+        with self._lock:
+            for name, value in increments.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    def draw(self, model: LatencyModel) -> float:
+        with self._lock:
+            return model.sample(self._rng)
+
+    def inject_error(self) -> bool:
+        if self.config.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < self.config.error_rate
+
+    def completion_id(self) -> str:
+        with self._lock:
+            self._next_id += 1
+            return f"chatcmpl-fake-{self._next_id}"
+
+    def chat_content(self, payload: dict) -> Optional[str]:
+        """The reply text, or None if strict replay has no recording for the request."""
+        model, messages = payload.get("model", ""), payload.get("messages", [])
+        key = request_key(model, messages)
+        replay = self.config.replay
+        if self.config.upstream:
+            content = self._forward(payload)
+            if replay is not None:
+                replay.record(key, model, messages, content)
+            self.count(recorded=1)
+            return content
+        if replay is not None:
+            content = replay.get(key)
+            if content is not None:
+                self.count(replayed=1)
+                return content
+            if self.config.strict_replay:
+                self.count(unrecorded=1)
+                return None
+        self.count(synthesized=1)
+        return synthetic_reply(messages)
+
+    def _forward(self, payload: dict) -> str:
+        body = dict(payload, stream=False)
+        request = urllib.request.Request(
+            f"{self.config.upstream.rstrip('/')}/chat/completions",
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {self.config.upstream_key}"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=120) as response:
+            return json.loads(response.read())["choices"][0]["message"]["content"]
+
+    def embedding(self, text: str) -> List[float]:
+        # Deterministic per text, so equal texts are equally close in every run.
+        rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+        vector = [rng.gauss(0.0, 1.0) for _ in range(self.config.embedding_dim)]
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+
+def _make_handler(service: FakeLLMService) -> type:
+    class FakeLLMRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: object, headers: Optional[Dict[str, str]] = None) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_error(self, status: int, message: str, error_type: str,
+                        headers: Optional[Dict[str, str]] = None) -> None:
+            self._send_json(status, {"error": {"message": message, "type": error_type, "code": error_type}}, headers)
+
+        def do_GET(self) -> None:
+            if self.path == "/healthz":
+                self._send_json(200, {"status": "ok"})
+            elif self.path == "/stats":
+                self._send_json(200, service.stats.snapshot())
+            else:
+                self._send_error(404, "not found", "not_found")
+
+        def do_POST(self) -> None:
+            if self.path not in CHAT_PATHS + EMBEDDING_PATHS:
+                self._send_error(404, "not found", "not_found")
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_error(400, "invalid JSON body", "invalid_request_error")
+                return
+
+            service.count(requests=1)
+            retry_after = service.rate_limit.try_acquire()
+            if retry_after is not None:
+                service.count(throttled=1)
+                self._send_error(429, "Rate limit reached for requests", "rate_limit_exceeded",
+                                 {"retry-after": f"{retry_after:.3f}"})
+                return
+            time.sleep(service.draw(service.config.latency))
+            if service.inject_error():
+                service.count(injected_errors=1)
+                self._send_error(service.config.error_status, "Injected failure", "internal_server_error")
+                return
+
+            if self.path in EMBEDDING_PATHS:
+                self._embeddings(payload)
+            else:
+                self._chat(payload)
+
+        def _embeddings(self, payload: dict) -> None:
+            service.count(embedding_requests=1)
+            texts = payload.get("input", [])
+            texts = [texts] if isinstance(texts, str) else list(texts)
+            tokens = sum(_estimate_tokens(str(text)) for text in texts)
+            service.count(prompt_tokens=tokens)
+            self._send_json(200, {
+                "object": "list",
+                "model": payload.get("model", "fake-embedding"),
+                "data": [{"object": "embedding", "index": index, "embedding": service.embedding(str(text))}
+                         for index, text in enumerate(texts)],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+
+        def _chat(self, payload: dict) -> None:
+            service.count(chat_requests=1)
+            try:
+                content = service.chat_content(payload)
+            except (urllib.error.URLError, OSError, KeyError, ValueError) as exc:
+                self._send_error(502, f"Upstream request failed: {exc}", "upstream_error")
+                return
+            if content is None:
+                self._send_error(400, "No recorded response for this request", "unrecorded_request")
+                return
+
+            prompt_tokens = sum(_estimate_tokens(_message_text(message)) for message in payload.get("messages", []))
+            completion_tokens = _estimate_tokens(content)
+            service.count(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens}
+            base = {"id": service.completion_id(), "created": int(time.time()), "model": payload.get("model", "")}
+
+            if not payload.get("stream"):
+                self._send_json(200, dict(base, object="chat.completion", usage=usage, choices=[
+                    {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}]))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            # Word-sized chunks, like a token stream.
+            pieces = re.findall(r"\S+\s*|\s+", content) or [""]
+            try:
+                for index, piece in enumerate(pieces):
+                    if index:
+                        time.sleep(service.draw(service.config.stream_chunk_delay))
+                    delta = {"role": "assistant", "content": piece} if index == 0 else {"content": piece}
+                    self._send_event(dict(base, object="chat.completion.chunk",
+                                          choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+                self._send_event(dict(base, object="chat.completion.chunk", x_groq={"usage": usage},
+                                      choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def _send_event(self, payload: dict) -> None:
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        def log_message(self, format: str, *args: object) -> None:
+            # Per-request access logs would dominate output under load.
+            pass
+
+    return FakeLLMRequestHandler
+
+
+def create_server(config: FakeServerConfig, host: str = FAKE_LLM_SERVER_HOST,
+                  port: int = FAKE_LLM_SERVER_PORT) -> ThreadingHTTPServer:
+    """Server for ``config``; port 0 picks a free port (see ``server.server_address``)."""
+    service = FakeLLMService(config)
+    server = ThreadingHTTPServer((host, port), _make_handler(service))
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+class ServerEmbeddings:
+    """LangChain-style embeddings client for an OpenAI-compatible /embeddings endpoint."""
+
+    def __init__(self, base_url: str, model: str = "fake-embedding", timeout: float = 60.0):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        request = urllib.request.Request(
+            f"{self.base_url}/v1/embeddings",
+            data=json.dumps({"model": self.model, "input": list(texts)}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        # HTTP errors (429, 5xx) propagate, so the caller's retries & backoff are exercised.
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            payload = json.loads(response.read())
+        return [item["embedding"] for item in sorted(payload["data"], key=lambda item: item["index"])]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    """Fault & latency options shared with llm_benchmark.py."""
+    parser.add_argument("--latency", default="lognormal:300,0.5",
+                        help="Response delay distribution in ms, e.g. fixed:200, uniform:100,400, lognormal:300,0.5")
+    parser.add_argument("--stream-delay", default="fixed:15", help="Delay between streamed chunks (ms distribution)")
+    parser.add_argument("--rpm", type=float, default=0, help="Requests per minute before HTTP 429 (0 = unlimited)")
+    parser.add_argument("--burst", type=int, help="Requests allowed at once before the rate limit applies")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with --error-status")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--replay", help="JSONL of recorded responses to serve (and to append to with --record)")
+    parser.add_argument("--strict", action="store_true", help="Fail requests that have no recorded response")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def config_from_args(args: argparse.Namespace, requests_per_minute: Optional[float] = None) -> FakeServerConfig:
+    return FakeServerConfig(
+        latency=LatencyModel(args.latency),
+        stream_chunk_delay=LatencyModel(args.stream_delay),
+        requests_per_minute=args.rpm if requests_per_minute is None else requests_per_minute,
+        burst=args.burst,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        replay=ResponseLog(args.replay) if args.replay else None,
+        strict_replay=args.strict,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a local fake of the Groq (OpenAI-compatible) API")
+    parser.add_argument("--host", default=FAKE_LLM_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=FAKE_LLM_SERVER_PORT)
+    add_server_arguments(parser)
+    parser.add_argument("--record", action="store_true",
+                        help="Forward chat requests to --upstream and append the responses to --replay")
+    parser.add_argument("--upstream", default="https://api.groq.com/openai/v1", help="Provider base URL to record from")
+    parser.add_argument("--upstream-key", help="API key for --upstream (defaults to $GROQ_API_KEY)")
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    if args.record:
+        if not args.replay:
+            raise SystemExit("--record needs --replay FILE to write the responses to.")
+        config.upstream = args.upstream
+        config.upstream_key = args.upstream_key or os.environ.get("GROQ_API_KEY")
+        # Real provider latency is recorded as is.
+        config.latency = LatencyModel()
+
+    server = create_server(config, args.host, args.port)
+    replayed = f", {len(config.replay)} recorded responses" if config.replay is not None else ""
+    print(f"Serving fake LLM API on http://{args.host}:{args.port}{replayed}")
+    print(f"Use it with: GROQ_API_BASE=http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
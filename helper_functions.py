@@ -1,25 +1,60 @@
 # ------------------------------------- IMPORT STATEMENTS --------------------------------------------------------------
 
 import os
-import time
 import datetime
+import threading
+from dataclasses import asdict
+from collections import OrderedDict
 import streamlit as st
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.document_loaders import CSVLoader
-from langchain_community.document_loaders import TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_classic.chains import create_retrieval_chain
-from langchain_classic.chains.combine_documents import create_stuff_documents_chain
-from parser import parse_log
+from parser import classify_log_file, parse_log
+from llm_classifier import invoke_llm
 from langchain_groq import ChatGroq
+from classifier import load_default_classifier
+from config import (EMBEDDING_GRANULARITY, EMBEDDING_MODEL, INGEST_PIPE_SIZE, INGEST_PROGRESS_EVERY,
+                    RAW_TEXT_BLOCK_CHARS, VALIDATION_CACHE_SIZE, VALIDATION_UNCERTAIN_BAND,
+                    VECTOR_INDEX_COMPRESS_MIN_CHUNKS)
+from embedding_cache import CachedEmbeddings
+from artifact_store import ArtifactStore, hash_bytes, hash_file
+from ingest_jobs import IngestJob, Pipe
+from indexing import (IncrementalLogIndex, IndexingError, add_documents_in_batches, compress_vector_index,
+                      set_nprobe)
+from chunking import chunk_records
+from inverted_index import BM25Index
+from log_query import LogDatabase
+from log_records import RecordSchema, follow_parsed_csv, format_timestamp
+from record_store import RecordStore
+from rollups import LogRollup
+from templates import TemplateIndex
+from time_index import TimeIndex
+from workspace import FairWorkerPool, Workspace
+from query_router import format_result, route_query
+from rag_chain import build_retrieval_chain, stream_answer
+from answer_cache import AnswerCache
+import metrics
 
 # ------------------------------------ Loading environment variables ---------------------------------------------------------------
 
 groq_api_key = st.secrets['GROQ_API_KEY']
 os.environ["GOOGLE_API_KEY"] = st.secrets["GOOGLE_API_KEY"]
 
+# Parse results & FAISS indexes of previously processed uploads, keyed by file hash.
+artifact_store = ArtifactStore()
+
+# Chat answers shared by every session of this process, keyed by index identity & question.
+answer_cache = AnswerCache()
+
+# Parse jobs of all sessions share these worker processes, scheduled fairly per session.
+parse_pool = FairWorkerPool()
+
+INGEST_STAGES = ("validate", "classify", "parse", "index", "embed", "store")
+
+# Record indexes stored as pickles (in one, so they keep sharing the record store); the SQLite table &
+# the rollup have their own formats.
+PICKLED_RECORD_INDEXES = ("records", "bm25_index", "template_index", "time_index")
+
 
 def greet_user():
     current_time = datetime.datetime.now() + datetime.timedelta(hours=5, minutes=30)
@@ -36,24 +71,26 @@ def greet_user():
     return greeting
 
 
-# Function to generate the dynamic header
-def dynamic_header(header_text, place="app", delay=0.1):
-    # Create a placeholder for the header
-    if place == "sidebar":
-        header_placeholder = st.sidebar.empty()
-    else:
-        header_placeholder = st.empty()
+# Validation results per file hash, shared by every session of this process.
+_validation_cache = OrderedDict()
+_validation_lock = threading.Lock()
+
 
-    # Display each letter of the header text one by one
-    for i in range(len(header_text) + 1):
-        time.sleep(delay)
-        header_placeholder.markdown(f'<h1>{header_text[:i]}</h1>', unsafe_allow_html=True)
+def _validate_with_llm(first_five_lines):
+    # Retried & counted by invoke_llm(), not by the client.
+    loaded_llm = ChatGroq(groq_api_key=groq_api_key, model_name="llama-3.1-8b-instant", max_retries=0)
+    check_prompt = validation_template.invoke({"context": first_five_lines})
+    response = invoke_llm(loaded_llm, check_prompt, purpose="validate", model="llama-3.1-8b-instant")
+    return response.content.lower() == "yes"
 
-    # Ensure the full header text remains visible
-    header_placeholder.markdown(f'<h1>{header_text}</h1>', unsafe_allow_html=True)
 
+def validate_log_file(users_file, file_hash=None):
+    file_hash = file_hash or hash_file(users_file)
+    with _validation_lock:
+        if file_hash in _validation_cache:
+            _validation_cache.move_to_end(file_hash)
+            return _validation_cache[file_hash]
 
-def validate_log_file(users_file):
     first_five_lines = []
     with open(users_file, 'r') as file:
         for _ in range(5):
@@ -61,146 +98,553 @@ def validate_log_file(users_file):
             if not line:
                 break
             first_five_lines.append(line.strip())
-    loaded_llm = ChatGroq(groq_api_key=groq_api_key, model_name="llama-3.1-8b-instant")
-    check_prompt = validation_template.invoke({"context": first_five_lines})
-    response = loaded_llm.invoke(check_prompt)
-    if response.content.lower() == "yes":
-        return True
-    return False
+
+    # Fast path: the trained binary head decides unless it is in the uncertain band.
+    log_probability = None
+    classifier = load_default_classifier()
+    if classifier is not None:
+        log_probability = classifier.log_probabilities(["\n".join(first_five_lines)])[0]
+
+    low, high = VALIDATION_UNCERTAIN_BAND
+    if log_probability is not None and log_probability >= high:
+        is_log_file = True
+    elif log_probability is not None and log_probability <= low:
+        is_log_file = False
+    else:
+        try:
+            is_log_file = _validate_with_llm(first_five_lines)
+        except Exception:
+            # Offline or rate limited: the local model's best guess beats failing the upload.
+            if log_probability is None:
+                raise
+            is_log_file = log_probability >= 0.5
+
+    with _validation_lock:
+        _validation_cache[file_hash] = is_log_file
+        while len(_validation_cache) > VALIDATION_CACHE_SIZE:
+            _validation_cache.popitem(last=False)
+    return is_log_file
+
+
+def get_workspace(session):
+    """This session's private directory for uploads & parse output."""
+    if "workspace" not in session:
+        session.workspace = Workspace.create()
+    else:
+        session.workspace.touch()
+    return session.workspace
+
+
+def new_record_indexes(database_path=":memory:"):
+    """Fresh indexes over the parsed records, keyed by their session state name (observers in this order)."""
+    # The rows themselves, stored once; first, so the indexes after it can refer to its rows & codes.
+    records = RecordStore()
+    template_index = TemplateIndex(records)
+    return {
+        "records": records,
+        "bm25_index": BM25Index(records),
+        "log_database": LogDatabase(database_path, records),
+        "template_index": template_index,
+        "time_index": TimeIndex(),
+        # Reads its top messages from the template index rather than templating every line again.
+        "log_rollup": LogRollup(templates=template_index),
+    }
+
+
+def log_time_range(session):
+    """Human-readable time span of the parsed log, or None."""
+    time_index = session.get("time_index")
+    bounds = time_index.bounds() if time_index is not None else None
+    if bounds is None:
+        return None
+    return f"{format_timestamp(bounds[0])} → {format_timestamp(bounds[1])}"
+
+
+def _indexed_documents(job, rows, record_indexes, source):
+    """Feed parsed rows to the record indexes & yield documents to embed as soon as they are complete."""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    observers = list(record_indexes.values())
+    for observer in observers:
+        observer.begin(header)
+
+    def indexed_rows():
+        count = 0
+        for row in rows:
+            for observer in observers:
+                observer.add(row)
+            count += 1
+            if count % INGEST_PROGRESS_EVERY == 0:
+                job.update("index", done=count)
+            yield row
+        for observer in observers:
+            observer.end()
+        job.update("index", done=count, total=count)
+
+    if EMBEDDING_GRANULARITY == "templates":
+        # One document per message template, emitted when the template is first seen.
+        template_index = record_indexes["template_index"]
+        emitted = 0
+        for _ in indexed_rows():
+            while emitted < len(template_index):
+                yield template_index.document(emitted, source)
+                emitted += 1
+    else:
+        # Whole parsed records packed into chunks per host/process & time window, without overlap.
+        yield from chunk_records(RecordSchema(header), indexed_rows(), source=source)
 
 
-def file_parser(uploaded_file, file_path, display_messages, session):
-    """
-    Parse log file using LLM-based classification with regex fallback.
-    
-    Args:
-        uploaded_file: Streamlit uploaded file object
-        file_path: Path to the temporary file
-        display_messages: List to append status messages
-        session: Streamlit session state
-    """
-    if uploaded_file is not None:
-        with st.spinner(text="Parsing the Log File..."):
-            type_of_log, msg = parse_log(file_path)
+def _embed_documents(job, documents, embeddings):
+    """Embed documents as they arrive, a few batches at a time, into one FAISS index."""
+    documents = iter(documents)
+    indexed = 0
 
-        if type_of_log is not None and msg == "success":
-            display_messages.append(st.success(f"✅ Detected {type_of_log} Logs."))
-            time.sleep(1)
-            display_messages.append(st.success("Parsing Completed Successfully!"))
+    def progress(done, _):
+        nonlocal indexed
+        indexed = done
+        job.update("embed", done=done)
 
+    try:
+        vectors = add_documents_in_batches(documents, embeddings, progress_callback=progress)
+    except IndexingError as e:
+        # Keep the producing stage moving, then keep what was embedded.
+        total = e.total + sum(1 for _ in documents)
+        if e.vectors is not None:
+            job.results["vectors"] = e.vectors
+            job.results["partial_index"] = True
+            job.warnings.append(f"Only {e.indexed} of {total} chunks could be embedded. "
+                                f"Answers may be incomplete.")
         else:
-            display_messages.append(st.warning("File didn't match predefined logs."))
-            time.sleep(1)
-            display_messages.append(st.warning("Not Parsing."))
-            session.not_log = True
+            job.warnings.append("Please Check your embedding model & Refresh the page.")
+        return
+    except Exception:
+        for _ in documents:
+            pass
+        job.warnings.append("Please Check your embedding model & Refresh the page.")
+        return
+
+    job.update("embed", done=indexed, total=indexed)
+    if vectors is not None and indexed >= VECTOR_INDEX_COMPRESS_MIN_CHUNKS:
+        # Very large logs: swap the exact flat index for a quantized one.
+        job.update("embed", detail="compressing the vector index")
+        vectors, job.results["index_report"] = compress_vector_index(vectors)
+        if job.results["index_report"] is not None:
+            print(f"Vector index compressed: {job.results['index_report'].summary()}")
+    if vectors is not None:
+        job.results["vectors"] = vectors
+
+
+def _parse_index_and_embed(job, file_path, workspace, decision, embeddings):
+    """
+    Parse in the shared worker pool while indexing & embedding its output as it is written.
 
+    Returns:
+        bool: True if the log was parsed
+    """
+    csv_path = workspace.parsed_csv_path
+    for path in (csv_path, workspace.database_path):
+        if os.path.exists(path):
+            os.remove(path)
+    record_indexes = new_record_indexes(workspace.database_path)
+    documents = Pipe(INGEST_PIPE_SIZE)
+    # metrics.collect ships the worker's parse metrics back to this process.
+    parse_job = parse_pool.submit(workspace.owner, metrics.collect, parse_log, file_path, csv_path, groq_api_key,
+                                  decision)
+    parse_result = {}
+
+    def parse():
+        with job.stage("parse"):
+            (parse_result["type_of_log"], parse_result["msg"]), worker_metrics = parse_job.result()
+            if worker_metrics:
+                metrics.REGISTRY.merge(worker_metrics)
+
+    def index():
+        with job.stage("index"):
+            documents.feed(_indexed_documents(job, follow_parsed_csv(csv_path, parse_job.done), record_indexes,
+                                              source=csv_path))
+
+    def embed():
+        with job.stage("embed"):
+            _embed_documents(job, documents, embeddings)
+
+    job.run_concurrently(parse, index, embed)
+
+    if parse_result["type_of_log"] is None or parse_result["msg"] != "success" or not len(record_indexes["bm25_index"]):
+        job.results.pop("vectors", None)
+        job.results.pop("partial_index", None)
+        return False
+    job.results.update(record_indexes)
+    job.results["type_of_log"] = parse_result["type_of_log"]
+    job.results["parsed_csv_path"] = csv_path
+    return True
+
+
+def _append_to_stored(job, file_path, workspace, decision, embeddings, base_hash):
+    """
+    Bring the stored indexes of an earlier version of a growing log up to date: parse the
+    upload, index & embed only its new records and expire those past the retention window.
 
-def create_vector_embeddings(session, file_path):
-    if "vectors" not in session:
+    Returns:
+        bool: True if the log was parsed & the indexes updated
+    """
+    metadata = artifact_store.load_metadata(base_hash)
+    if metadata is None or metadata.get("type_of_log") != decision.log_type:
+        return False
+    record_indexes = _load_record_indexes(base_hash, workspace)
+    if record_indexes is None:
+        return False
+    try:
+        vectors = artifact_store.load_vectors(base_hash, embeddings)
+    except Exception as e:
+        print(f"Could not load stored index: {e}")
+        return False
+    if vectors is None:
+        return False
+    set_nprobe(vectors)
+
+    csv_path = workspace.parsed_csv_path
+    if os.path.exists(csv_path):
+        os.remove(csv_path)
+    with job.stage("parse"):
+        parse_job = parse_pool.submit(workspace.owner, metrics.collect, parse_log, file_path, csv_path,
+                                      groq_api_key, decision)
+        (type_of_log, msg), worker_metrics = parse_job.result()
+        if worker_metrics:
+            metrics.REGISTRY.merge(worker_metrics)
+    if type_of_log is None or msg != "success":
+        return False
+
+    index = IncrementalLogIndex(embeddings, record_indexes, vectors, source=csv_path)
+    stored_rows = index.next_row
+    with job.stage("index"), job.stage("embed"):
+        try:
+            # New documents are embedded before their records are indexed; see append_records().
+            added = index.update_from_csv(csv_path,
+                                          progress_callback=lambda done, _: job.update("embed", done=done))
+        except (IndexingError, ValueError) as e:
+            print(f"Could not index the new records: {e}")
+            return False
+        expired = index.expire()
+        job.update("index", done=len(index.records), total=len(index.records),
+                   detail=f"{added} new records after {stored_rows}, {expired} expired")
+
+    job.results.update(record_indexes)
+    job.results["vectors"] = index.vectors
+    job.results["type_of_log"] = type_of_log
+    job.results["parsed_csv_path"] = csv_path
+    return True
+
+
+def _raw_text_documents(file_path, text_splitter, block_chars=RAW_TEXT_BLOCK_CHARS):
+    """Split a text file into documents block by block, without reading it into memory at once."""
+    block, size = [], 0
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+        for line in file:
+            block.append(line)
+            size += len(line)
+            if size >= block_chars:
+                # Blocks end at line boundaries, so no log line is cut between two blocks.
+                yield from text_splitter.create_documents([''.join(block)], [{'source': file_path}])
+                block, size = [], 0
+    if block:
+        yield from text_splitter.create_documents([''.join(block)], [{'source': file_path}])
+
+
+def _embed_raw_text(job, file_path, embeddings):
+    # No parsing was possible: split the raw upload by characters.
+    job.skip("index", detail="not parsed")
+    with job.stage("embed"):
+        chunk_size, chunk_overlap = 1024, 60
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                                       length_function=len)
+        # Estimated until the last chunk is embedded.
+        job.update("embed", total=os.path.getsize(file_path) // (chunk_size - chunk_overlap) + 1)
+        _embed_documents(job, _raw_text_documents(file_path, text_splitter), embeddings)
+
+
+def _run_ingest(job, file_path, file_hash, workspace):
+    try:
+        with job.stage("validate"):
+            is_log_file = validate_log_file(file_path, file_hash=file_hash)
+        if not is_log_file:
+            job.results["rejected"] = True
+            for stage in INGEST_STAGES[1:]:
+                job.skip(stage)
+            return
+
+        with job.stage("classify"):
+            # Regex -> local model -> LLM; the LLM is only called when the cheaper tiers are unsure.
+            decision = classify_log_file(file_path, groq_api_key=groq_api_key)
+            job.update("classify", detail=f"{decision.log_type or 'unknown'} ({decision.tier} tier)")
+        job.results["log_decision"] = decision
 
-        # If no parsing is needed
-        if "not_log" in session:
-            session.loader = TextLoader(file_path=file_path)
-        else:
-            session.loader = CSVLoader(file_path=file_path)
+        try:
+            # Chunks embedded before (by any upload) come from the local cache.
+            embeddings = CachedEmbeddings(GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL))
+        except Exception:
+            job.warnings.append("Please Check your embedding model & Refresh the page.")
+            return
+        job.results["embeddings"] = embeddings
+
+        parsed = False
+        if decision.log_type is not None:
+            # A grown copy of a stored log: only its new lines are indexed.
+            base_hash = artifact_store.find_earlier_version(file_path)
+            if base_hash is not None:
+                parsed = _append_to_stored(job, file_path, workspace, decision, embeddings, base_hash)
+            parsed = parsed or _parse_index_and_embed(job, file_path, workspace, decision, embeddings)
+        if not parsed:
+            job.results["not_log"] = True
+            job.warnings.append("File didn't match predefined logs. Not Parsing.")
+            if decision.log_type is None:
+                job.skip("parse", detail="not a known log type")
+            _embed_raw_text(job, file_path, embeddings)
+
+        with job.stage("store"):
+            # Persist everything needed to skip parsing & embedding the next time this file is uploaded.
+            if "vectors" in job.results and not job.results.get("partial_index"):
+                try:
+                    rollup = job.results.get("log_rollup")
+                    record_indexes = {name: job.results[name] for name in PICKLED_RECORD_INDEXES
+                                      if name in job.results}
+                    artifact_store.save(file_hash, _artifact_metadata(job.results),
+                                        parsed_csv_path=job.results.get("parsed_csv_path"),
+                                        vectors=job.results["vectors"],
+                                        rollup=rollup.to_dict() if rollup is not None else None,
+                                        record_indexes=record_indexes or None,
+                                        database=job.results.get("log_database"),
+                                        source_path=file_path)
+                except Exception as e:
+                    print(f"Could not store artifacts: {e}")
+    finally:
+        # Unlink the temporary file after use.
+        if os.path.exists(file_path):
+            os.unlink(file_path)
 
-        session.log_file = session.loader.load()
 
-        # Create a text splitter
-        session.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1024, chunk_overlap=60,
-                                                               length_function=len)
+def _artifact_metadata(values):
+    decision = values.get("log_decision")
+    index_report = values.get("index_report")
+    return {
+        "type_of_log": values.get("type_of_log"),
+        "not_log": bool(values.get("not_log")),
+        "decision": asdict(decision) if decision is not None else None,
+        "index_report": asdict(index_report) if index_report is not None else None,
+    }
 
-        # Splitting into smaller chunks.
-        split_logs = session.text_splitter.split_documents(session.log_file)
 
-        # Unlink the temporary file after use.
-        os.unlink(file_path)
+def start_ingest(file_path, file_hash, workspace):
+    """
+    Validate, classify, parse, index, embed & store an upload on a background thread.
 
-        try:
-            # Converting into embeddings.
-            session.embeddings = GoogleGenerativeAIEmbeddings(model="models/gemini-embedding-001")
+    Returns:
+        IngestJob: Poll ``progress()`` / ``done``, then apply it with finish_ingest()
+    """
+    return IngestJob(list(INGEST_STAGES)).start(_run_ingest, file_path, file_hash, workspace)
 
-            # Initializing the FAISS DB & storing the embeddings in it
-            session.vectors = FAISS.from_documents(documents=split_logs,
-                                                   embedding=session.embeddings)
-        except Exception:
-            st.warning("Please Check your embedding model & Refresh the page.")
+
+def render_ingest_progress(job):
+    for stage in job.progress():
+        label = f"{stage.name.title()}: {stage.state}"
+        if stage.state == "running" and stage.done:
+            label += f" ({stage.done}/{stage.total})" if stage.total else f" ({stage.done})"
+        if stage.detail:
+            label += f" - {stage.detail}"
+        if stage.state in ("done", "failed"):
+            label += f" in {stage.elapsed:.1f} sec."
+        st.progress(stage.fraction or 0.0, text=label)
 
 
-def create_dynamic_loader(csv_path: str, detected_fields: list = None):
+def finish_ingest(session):
     """
-    Create appropriate document loader based on detected log structure.
-    
-    Args:
-        csv_path: Path to the CSV file
-        detected_fields: List of detected field names (optional)
-        
+    Apply a finished ingest job to the session & build the chains.
+
     Returns:
-        CSVLoader configured for the detected schema
-    """
-    # Use detected fields as source columns if available
-    if detected_fields and len(detected_fields) > 0:
-        # Include all fields in the content
-        return CSVLoader(
-            file_path=csv_path,
-            csv_args={'delimiter': ','},
-            source_column=detected_fields[0] if detected_fields else None
-        )
-    return CSVLoader(file_path=csv_path)
+        bool: True if the session now has an index to answer questions from
+    """
+    # Done with the job whatever its outcome; the session keeps the upload's file_hash.
+    job = session.pop("ingest_job")
+    for warning in job.warnings:
+        st.warning(warning)
+    if job.error is not None:
+        st.warning("There was an error processing your Log file. Please Refresh the page.")
+        return False
+    if job.results.get("rejected"):
+        st.warning("I am a Log Parsing Tool. Please upload only Log files.")
+        return False
+    if "vectors" not in job.results:
+        return False
+
+    session.update(job.results)
+    create_chains(session)
+    if session.get("type_of_log"):
+        st.toast(f"✅ Detected {session.type_of_log} Logs ({session.log_decision.tier} tier). "
+                 f"Ready in {job.elapsed:.1f} sec.")
+    return True
+
+
+def _load_record_indexes(file_hash, workspace):
+    """The stored indexes over an upload's parsed records, or None if any of them is missing."""
+    try:
+        record_indexes = artifact_store.load_record_indexes(file_hash)
+        rollup = artifact_store.load_rollup(file_hash)
+        if record_indexes is None or set(record_indexes) != set(PICKLED_RECORD_INDEXES) or rollup is None:
+            return None
+        database = artifact_store.load_database(file_hash, record_indexes["records"], workspace.database_path)
+    except Exception as e:
+        print(f"Could not load stored record indexes: {e}")
+        return None
+    if database is None:
+        return None
+    # Keyed by the codes of the restored store again, so it can be fed further records.
+    rollup = LogRollup.from_dict(rollup, templates=record_indexes["template_index"])
+    return {**record_indexes, "log_database": database, "log_rollup": rollup}
+
+
+def load_stored_artifacts(session, file_hash):
+    """
+    Restore a previously processed upload from the artifact store.
+
+    Returns:
+        bool: True if the parse result, record indexes & FAISS index were restored into the session
+    """
+    metadata = artifact_store.load_metadata(file_hash)
+    if metadata is None:
+        return False
+
+    parsed_csv_path, record_indexes = None, {}
+    if not metadata.get("not_log"):
+        parsed_csv_path = artifact_store.parsed_csv_path(file_hash)
+        if parsed_csv_path:
+            record_indexes = _load_record_indexes(file_hash, get_workspace(session))
+            if record_indexes is None:
+                # Stored without its record indexes: ingest it again in the background, which stores them
+                # (the chunks' embeddings come from the cache).
+                return False
+
+    embeddings = CachedEmbeddings(GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL))
+    try:
+        vectors = artifact_store.load_vectors(file_hash, embeddings)
+    except Exception as e:
+        print(f"Could not load stored index: {e}")
+        return False
+    if vectors is None:
+        return False
+    set_nprobe(vectors)
+
+    session.embeddings = embeddings
+    session.vectors = vectors
+    session.file_hash = file_hash
+    if metadata.get("not_log"):
+        session.not_log = True
+    else:
+        session.type_of_log = metadata.get("type_of_log")
+        session.parsed_csv_path = parsed_csv_path
+        session.update(record_indexes)
+    return True
 
 
 def load_llm(session):
     try:
-        session.llm = ChatGroq(groq_api_key=groq_api_key, model_name=LLM_OPTIONS[session.selected_llm])
+        # Answers are retried & counted by rag_chain.stream_answer(), not by the client.
+        session.llm = ChatGroq(groq_api_key=groq_api_key, model_name=LLM_OPTIONS[session.selected_llm],
+                               max_retries=0)
     except Exception:
         st.warning("Please Check your Groq API key.")
 
 
 def create_chains(session):
-    # Create a chain for LLM & Prompt Template to inject to LLM for inferencing
-    document_chain = create_stuff_documents_chain(llm=session.llm, prompt=prompt_template)
+    session.retrieval_chain = build_retrieval_chain(session.llm, session.vectors,
+                                                    bm25_index=session.get("bm25_index"),
+                                                    template_index=session.get("template_index"),
+                                                    time_index=session.get("time_index"),
+                                                    log_rollup=session.get("log_rollup"))
 
-    # Creating a retriever to fetch top 2 chunks related to User_Prompt by making similarity search.
-    retriever = session.vectors.as_retriever(search_kwargs={'k': 2})
 
-    # Create a retrieval chain which links the retriever & document chain
-    session.retrieval_chain = create_retrieval_chain(retriever, document_chain)
+def answer_structured_query(session, question):
+    """
+    Answer aggregate & filter questions exactly from the local SQL table.
+
+    Returns:
+        str: Markdown answer, or None if the question should go through RAG
+    """
+    if "log_database" not in session:
+        return None
+    query = route_query(question, session.log_database)
+    if query is None:
+        return None
+    try:
+        columns, rows = session.log_database.execute(query)
+    except Exception as e:
+        print(f"Structured query failed, falling back to RAG: {e}")
+        return None
+    return format_result(query, columns, rows)
+
+
+def _answer_cache_key(session):
+    # Answers depend on the index (the upload & its current size) and on the chosen LLM.
+    if not session.get("file_hash"):
+        return None
+    scope = f"{session.file_hash}|{session.get('selected_llm')}"
+    version = str(session.vectors.index.ntotal)
+    return scope, version
+
+
+def get_cached_answer(session, question):
+    """
+    Look up a previous answer to the same (or a very similar) question on the same index.
+
+    Returns:
+        tuple: (cached answer or None, question embedding to pass on to cache_answer())
+    """
+    key = _answer_cache_key(session)
+    if key is None:
+        return None, None
+    scope, version = key
+    try:
+        return answer_cache.get(scope, version, question, embed_query=session.embeddings.embed_query)
+    except Exception as e:
+        print(f"Answer cache lookup failed: {e}")
+        return None, None
+
+
+def cache_answer(session, question, answer, embedding=None):
+    key = _answer_cache_key(session)
+    if key is not None and isinstance(answer, str) and answer:
+        answer_cache.put(*key, question, answer, embedding)
+
+
+def _release_workspace(session):
+    # Only this session's queued jobs & files are removed; other sessions are untouched.
+    workspace = session.pop("workspace", None)
+    if workspace is not None:
+        parse_pool.cancel(workspace.owner)
+        # A parse that is already running still writes into the workspace; it is deleted once that finishes.
+        parse_pool.when_idle(workspace.owner, workspace.cleanup)
+        print("Workspace deleted successfully")
+
+
+def reset_upload(session):
+    """
+    Forget the current upload when another file replaces it: its index, record indexes, chains and
+    any ingest still running for it (whose results are then ignored). The chosen LLM is kept.
+    """
+    _release_workspace(session)
+    for key in [key for key in session.keys() if key not in ("selected_llm", "llm")]:
+        session.pop(key)
 
 
 def clear_cache(session):
+    _release_workspace(session)
     keys = list(session.keys())
     for key in keys:
         session.pop(key)
-    try:
-        os.remove("parsed_log_data.csv")
-        print("File deleted successfully")
-    except FileNotFoundError:
-        print("File not found")
 
 
 # ------------------------------------- DEFINE PROMPT TEMPLATE ---------------------------------------------------------
-prompt_template = ChatPromptTemplate.from_messages(
-    [
-        ("system", """You are an advanced AI assistant integrated with a RAG (Retrieval-Augmented Generation) system, 
-        "specialized in log analysis. Suggest next steps or further investigations when appropriate. If you don't 
-        know the answer just say that you don't know.Don't try to make up an answer based on your assumptions. 
-        
-        "Response Format: Structure your responses clearly, using sections or bullet points for complex analyses. 
-        Include the log entry which supports your answer. Include relevant log messages when explaining your 
-        findings. Clearly distinguish between information from logs, retrieved knowledge, and your own analysis. 
-        Provide the final answer to the question first in bold. Clarification and Precision: If log formats or 
-        contents are unclear, ask for clarification. If the user greets you,just greet them back & introduce yourself 
-        in short.Don't analyze data at that time. If the user asks you some questions that are not based on Logs.Then 
-        simply don't answer them.In that case tell them you are a Log analyzing agent & at that time don't analyze 
-        any data.
-        Don't answer any questions irrelevant to logs.In that case you just introduce yourself & don't analyze the log data at that time.
-        """
-         ),
-        ("user", "The Log Data is as follows : {context}. User Question : {input}")
-    ]
-)
-
-
+# The answer prompt lives in rag_chain.py with the rest of the retrieval chain.
 validation_template = ChatPromptTemplate.from_messages(
     [
         (
@@ -0,0 +1,425 @@
+"""
+Vector index construction.
+
+Chunks are embedded in fixed-size batches by a bounded pool of workers, subject to
+a request rate limit, and each finished batch is added to the FAISS index right
+away, so progress is visible and a provider failure late in the run does not throw
+away the batches that already succeeded. Documents may come from a lazy iterator;
+only the batches in flight are held in memory. compress_vector_index() swaps the flat
+index of a large log for a quantized one. IncrementalLogIndex builds on this to keep
+the index of a growing log, and the record indexes next to it, current by embedding
+only the new records and dropping those older than a retention window.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+import metrics
+from chunking import chunk_records
+from config import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_GRANULARITY,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_REQUESTS_PER_MINUTE,
+    INDEX_RETENTION_SECONDS,
+    VECTOR_INDEX_EVAL_K,
+    VECTOR_INDEX_EVAL_QUERIES,
+    VECTOR_INDEX_NLIST,
+    VECTOR_INDEX_NPROBE,
+    VECTOR_INDEX_PQ_M,
+    VECTOR_INDEX_TRAIN_SIZE,
+    VECTOR_INDEX_TYPE,
+)
+from log_records import RecordObserver, RecordSchema, read_parsed_csv
+
+
+class IndexingError(RuntimeError):
+    """
+    Embedding failed part-way; ``vectors`` holds whatever was indexed before the failure.
+
+    ``total`` is the number of documents, or for an iterator the number read from it so far.
+    """
+
+    def __init__(self, message: str, vectors: Optional[FAISS], indexed: int, total: int):
+        super().__init__(message)
+        self.vectors = vectors
+        self.indexed = indexed
+        self.total = total
+
+
+class RateLimiter:
+    """Spaces calls evenly so that at most ``requests_per_minute`` start per minute (0 = unlimited)."""
+
+    def __init__(self, requests_per_minute: float = EMBEDDING_REQUESTS_PER_MINUTE):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def acquire(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _embed_with_retries(embeddings, texts: List[str], limiter: RateLimiter, max_retries: int):
+    metrics.inc('embedding_texts_total', len(texts))
+    with metrics.span('embedding_batch'):
+        for attempt in range(max_retries + 1):
+            limiter.acquire()
+            try:
+                return embeddings.embed_documents(texts)
+            except Exception:
+                if attempt == max_retries:
+                    raise
+                metrics.inc('embedding_retries_total')
+                # Exponential backoff, typically for provider rate limits.
+                time.sleep(2 ** attempt)
+
+
+def add_documents_in_batches(documents: Iterable[Document], embeddings, vectors: Optional[FAISS] = None,
+                             batch_size: int = EMBEDDING_BATCH_SIZE,
+                             max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+                             requests_per_minute: float = EMBEDDING_REQUESTS_PER_MINUTE,
+                             max_retries: int = EMBEDDING_MAX_RETRIES,
+                             progress_callback: Optional[Callable[[int, int], None]] = None) -> Optional[FAISS]:
+    """
+    Embed documents in concurrent batches and add them to a FAISS index as they finish.
+
+    Args:
+        documents: Chunks to embed; an iterator is consumed lazily, batch by batch
+        embeddings: LangChain embeddings object (also used for queries on the index)
+        vectors: Existing index to extend; a new one is created from the first batch if None
+        batch_size: Chunks per embedding request
+        max_concurrency: Maximum embedding requests in flight
+        requests_per_minute: Rate limit on embedding requests (0 = unlimited)
+        max_retries: Retries per batch before giving up
+        progress_callback: Called as ``progress_callback(indexed, total)`` after every batch;
+            total is None when ``documents`` has no length
+
+    Returns:
+        FAISS: The index (None only if there were no documents and no existing index)
+
+    Raises:
+        IndexingError: A batch kept failing; carries the partially built index
+    """
+    total = len(documents) if hasattr(documents, '__len__') else None
+    documents = iter(documents)
+    max_concurrency = max(1, max_concurrency)
+    limiter = RateLimiter(requests_per_minute)
+    indexed = read = 0
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        pending = {}
+
+        def submit_batches():
+            # Keep at most max_concurrency batches in flight; the rest stays in the input.
+            nonlocal read
+            while len(pending) < max_concurrency:
+                batch = list(islice(documents, batch_size))
+                if not batch:
+                    return
+                read += len(batch)
+                texts = [doc.page_content for doc in batch]
+                pending[pool.submit(_embed_with_retries, embeddings, texts, limiter, max_retries)] = batch
+
+        submit_batches()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = pending.pop(future)
+                try:
+                    batch_vectors = future.result()
+                except Exception as e:
+                    for other in pending:
+                        other.cancel()
+                    seen = total if total is not None else read
+                    raise IndexingError(f"Embedding failed after {indexed}/{seen} chunks: {e}",
+                                        vectors, indexed, seen) from e
+
+                # The index is only touched from this thread; workers just embed.
+                text_embeddings = list(zip([doc.page_content for doc in batch], batch_vectors))
+                metadatas = [doc.metadata for doc in batch]
+                # Documents that carry their own id (see IncrementalLogIndex) keep it in the docstore.
+                ids = [doc.metadata.get('chunk_id') for doc in batch]
+                ids = ids if all(ids) else None
+                if vectors is None:
+                    vectors = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+                else:
+                    vectors.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+
+                indexed += len(batch)
+                if progress_callback is not None:
+                    progress_callback(indexed, total)
+            submit_batches()
+
+    return vectors
+
+
+class IncrementalLogIndex:
+    """
+    The FAISS index of a growing log and the record indexes over it, updated with new records only.
+
+    New records are embedded on their own (one document per new template, or in chunks)
+    and then fed to the record indexes, so keeping the indexes of a live system current
+    costs time proportional to the new data. expire() drops the records older than a
+    retention window from every index, and their documents from the FAISS index.
+    The indexes are persisted by the caller (the app's ArtifactStore).
+    """
+
+    def __init__(self, embeddings, record_indexes: Dict[str, RecordObserver], vectors: Optional[FAISS] = None,
+                 granularity: str = EMBEDDING_GRANULARITY, source: str = ''):
+        """
+        Args:
+            embeddings: Embeddings used for new documents & for queries
+            record_indexes: As made by helper_functions.new_record_indexes(), the RecordStore
+                'records' first; restored or empty
+            vectors: FAISS index of the records indexed so far
+            granularity: 'templates' or 'chunks', as the existing index was built
+            source: Source recorded in the metadata of new documents
+        """
+        self.embeddings = embeddings
+        self.record_indexes = record_indexes
+        self.records = record_indexes['records']
+        self.vectors = vectors
+        self.granularity = granularity
+        self.source = source
+
+    @property
+    def next_row(self) -> int:
+        """Row id of the next record; the number of records indexed so far, expired ones included."""
+        return self.records.end_row
+
+    def _new_documents(self, rows: List[List[str]]) -> List[Document]:
+        if self.granularity == 'templates':
+            documents = self.record_indexes['template_index'].new_documents(rows, self.source)
+        else:
+            documents = list(chunk_records(RecordSchema(self.records.header), rows, source=self.source))
+            for document in documents:
+                document.metadata['first_row'] += self.next_row
+                document.metadata['last_row'] += self.next_row
+        for document in documents:
+            document.metadata['chunk_id'] = uuid.uuid4().hex
+        return documents
+
+    def append_records(self, header: List[str], rows: Iterable[List[str]], **batch_options) -> int:
+        """
+        Embed & index new parsed records.
+
+        The new documents are embedded first; if that fails, the ones already added are
+        deleted again and the record indexes are left untouched, so the same records can
+        be retried.
+
+        Args:
+            header: CSV header of the parser that produced the rows
+            rows: New records only, in file order
+            batch_options: Passed on to add_documents_in_batches()
+
+        Returns:
+            int: Number of records added
+        """
+        if self.records.header and list(header) != self.records.header:
+            raise ValueError("New records have a different schema than the indexed ones.")
+        rows = list(rows)
+        if not rows:
+            return 0
+        if not self.records.header:
+            for index in self.record_indexes.values():
+                index.begin(header)
+
+        documents = self._new_documents(rows)
+        try:
+            self.vectors = add_documents_in_batches(documents, self.embeddings, vectors=self.vectors,
+                                                    **batch_options)
+        except IndexingError as e:
+            if e.vectors is not None:
+                indexed_ids = set(e.vectors.index_to_docstore_id.values())
+                added = [doc.metadata['chunk_id'] for doc in documents if doc.metadata['chunk_id'] in indexed_ids]
+                if added:
+                    e.vectors.delete(added)
+            raise
+
+        for row in rows:
+            for index in self.record_indexes.values():
+                index.add(row)
+        for index in self.record_indexes.values():
+            index.end()
+        return len(rows)
+
+    def update_from_csv(self, csv_path: str, **batch_options) -> int:
+        """
+        Index the records of a re-parsed, appended-to log that are not indexed yet.
+
+        Returns:
+            int: Number of records added
+        """
+        schema, rows = read_parsed_csv(csv_path)
+        new_rows = (row for row_number, row in enumerate(rows) if row_number >= self.next_row)
+        return self.append_records(schema.header, new_rows, **batch_options)
+
+    def expire(self, retention_seconds: float = INDEX_RETENTION_SECONDS, now: Optional[float] = None) -> int:
+        """
+        Drop the records before the first one inside the retention window.
+
+        Args:
+            retention_seconds: How much log history to keep
+            now: Reference time (epoch seconds); defaults to the newest record
+
+        Returns:
+            int: Number of records removed
+        """
+        bounds = self.record_indexes['time_index'].bounds()
+        if bounds is None:
+            return 0
+        cutoff = (now if now is not None else bounds[1]) - retention_seconds
+        kept = self.record_indexes['time_index'].slice(cutoff)
+        first_kept = min(kept) if len(kept) else self.next_row
+        removed = first_kept - self.records.first_row
+        if removed <= 0:
+            return 0
+
+        # The RecordStore goes last: the others read the expiring records from it.
+        for index in reversed(list(self.record_indexes.values())):
+            index.drop_before(first_kept)
+
+        if self.vectors is not None:
+            templates = self.record_indexes.get('template_index')
+            expired = []
+            for doc_id in self.vectors.index_to_docstore_id.values():
+                metadata = self.vectors.docstore.search(doc_id).metadata
+                template_id = metadata.get('template_id')
+                if template_id is not None:
+                    if templates is not None and not templates.templates[template_id].count:
+                        expired.append(doc_id)
+                elif metadata.get('last_row') is not None and metadata['last_row'] < first_kept:
+                    expired.append(doc_id)
+            if expired:
+                self.vectors.delete(expired)
+        return removed
+
+
+# IVF needs ~39 training points per list, 8-bit PQ at least 256 per sub-quantizer;
+# below this many vectors only scalar quantization is trained reliably.
+MIN_VECTORS_FOR_PQ = 1000
+
+
+@dataclass
+class CompressionReport:
+    index_type: str  # FAISS index factory string
+    vector_count: int
+    flat_bytes: int
+    compressed_bytes: int
+    recall_at_k: float  # Fraction of the flat index's top-k neighbours also found
+    k: int
+    flat_latency_ms: float  # Per query
+    compressed_latency_ms: float  # Per query
+    nprobe: Optional[int]
+
+    def summary(self) -> str:
+        return (f"{self.index_type}: {self.vector_count} vectors, "
+                f"{self.flat_bytes / 2**20:.1f} MiB -> {self.compressed_bytes / 2**20:.1f} MiB, "
+                f"recall@{self.k} {self.recall_at_k:.3f}, "
+                f"{self.flat_latency_ms:.2f} -> {self.compressed_latency_ms:.2f} ms/query")
+
+
+def _factory_string(index_type: str, count: int, dim: int, nlist: int, pq_m: int) -> str:
+    lists = max(1, min(nlist, count // 39))
+    if index_type == 'sq8':
+        return "SQ8"
+    if index_type == 'ivfsq8':
+        return f"IVF{lists},SQ8"
+    if index_type == 'ivfpq':
+        if count < MIN_VECTORS_FOR_PQ:
+            return "SQ8"
+        # PQ needs the dimension to split evenly into sub-quantizers.
+        m = max(divisor for divisor in range(1, min(pq_m, dim) + 1) if dim % divisor == 0)
+        return f"IVF{lists},PQ{m}"
+    raise ValueError(f"Unknown vector index type: {index_type}")
+
+
+def set_nprobe(vectors: FAISS, nprobe: int = VECTOR_INDEX_NPROBE) -> None:
+    """Set how many inverted lists an IVF index scans per query (no-op for other indexes)."""
+    try:
+        faiss.extract_index_ivf(vectors.index).nprobe = nprobe
+    except RuntimeError:
+        pass
+
+
+def compress_vector_index(vectors: FAISS, index_type: str = VECTOR_INDEX_TYPE, nlist: int = VECTOR_INDEX_NLIST,
+                          pq_m: int = VECTOR_INDEX_PQ_M, nprobe: int = VECTOR_INDEX_NPROBE,
+                          train_size: int = VECTOR_INDEX_TRAIN_SIZE, k: int = VECTOR_INDEX_EVAL_K,
+                          eval_queries: int = VECTOR_INDEX_EVAL_QUERIES) -> Tuple[FAISS, Optional[CompressionReport]]:
+    """
+    Replace the flat index of a vector store with a quantized one, in place.
+
+    The quantizer is trained on a random sample of the stored vectors, and recall and
+    latency are measured against the flat index using stored vectors as queries.
+
+    Args:
+        vectors: FAISS vector store with a flat index
+        index_type: 'flat' (no-op), 'sq8', 'ivfsq8' or 'ivfpq'
+        nlist: Maximum number of IVF lists (capped by the amount of training data)
+        pq_m: Maximum number of PQ sub-quantizers (bytes per vector)
+        nprobe: IVF lists scanned per query
+        train_size: Vectors sampled for training
+        k: Neighbours compared for the recall measurement
+        eval_queries: Number of sample queries for the recall & latency measurement
+
+    Returns:
+        tuple: (the vector store, CompressionReport or None if nothing was changed)
+    """
+    flat = vectors.index
+    count, dim = flat.ntotal, flat.d
+    if index_type == 'flat' or count == 0:
+        return vectors, None
+
+    data = flat.reconstruct_n(0, count)
+    rng = np.random.default_rng(0)
+    factory = _factory_string(index_type, count, dim, nlist, pq_m)
+    index = faiss.index_factory(dim, factory, flat.metric_type)
+    index.train(data[rng.choice(count, size=min(count, train_size), replace=False)])
+    # Same insertion order as the flat index, so vectors.index_to_docstore_id stays valid.
+    index.add(data)
+    is_ivf = 'IVF' in factory
+    if is_ivf:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+
+    queries = data[rng.choice(count, size=min(count, eval_queries), replace=False)]
+    k = min(k, count)
+    started = time.perf_counter()
+    _, expected = flat.search(queries, k)
+    flat_latency = 1000 * (time.perf_counter() - started) / len(queries)
+    started = time.perf_counter()
+    _, found = index.search(queries, k)
+    compressed_latency = 1000 * (time.perf_counter() - started) / len(queries)
+    recall = float(np.mean([len(set(e) & set(f)) / k for e, f in zip(expected, found)]))
+
+    report = CompressionReport(
+        index_type=factory,
+        vector_count=count,
+        flat_bytes=count * dim * 4,
+        compressed_bytes=int(faiss.serialize_index(index).size),
+        recall_at_k=recall,
+        k=k,
+        flat_latency_ms=flat_latency,
+        compressed_latency_ms=compressed_latency,
+        nprobe=nprobe if is_ivf else None,
+    )
+    vectors.index = index
+    return vectors, report
+
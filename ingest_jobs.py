@@ -0,0 +1,179 @@
+"""
+Background ingest jobs.
+
+An upload is validated, classified, parsed, indexed, embedded and stored by an
+IngestJob running off the UI thread. Each stage reports its progress to the job,
+which the UI polls instead of blocking on the whole pipeline. Stages that consume
+each other's output (indexing parsed rows while the parser still writes them,
+embedding chunks while later rows are still being indexed) run concurrently and
+are connected by bounded queues.
+"""
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import metrics
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+_END = object()
+
+
+@dataclass
+class StageProgress:
+    name: str
+    state: str = PENDING
+    done: int = 0
+    total: Optional[int] = None  # None while the amount of work is not known yet
+    detail: str = ""
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def fraction(self) -> Optional[float]:
+        if self.state in (DONE, SKIPPED):
+            return 1.0
+        if not self.total:
+            return None
+        return min(1.0, self.done / self.total)
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+
+class IngestJob:
+    """
+    Progress & results of one background ingest.
+
+    The pipeline function runs on a daemon thread and records its results in
+    ``self.results`` (applied to the session by the UI once ``done``), warnings for
+    the user in ``self.warnings`` and a fatal error in ``self.error``.
+    """
+
+    def __init__(self, stages: List[str]):
+        self._stages: Dict[str, StageProgress] = {name: StageProgress(name) for name in stages}
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self.results: Dict[str, Any] = {}
+        self.warnings: List[str] = []
+        self.error: Optional[BaseException] = None
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+
+    def start(self, pipeline: Callable[..., None], *args) -> "IngestJob":
+        """Run ``pipeline(job, *args)`` on a background thread."""
+        def run():
+            try:
+                pipeline(self, *args)
+            except BaseException as e:
+                self.error = e
+                print(f"Ingest failed: {e}")
+            finally:
+                self.finished_at = time.perf_counter()
+                self._finished.set()
+
+        threading.Thread(target=run, name="ingest-job", daemon=True).start()
+        return self
+
+    @property
+    def done(self) -> bool:
+        return self._finished.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def progress(self) -> List[StageProgress]:
+        """Snapshot of every stage, safe to render while the job runs."""
+        with self._lock:
+            return [replace(stage) for stage in self._stages.values()]
+
+    def update(self, name: str, done: Optional[int] = None, total: Optional[int] = None,
+               detail: Optional[str] = None) -> None:
+        with self._lock:
+            stage = self._stages[name]
+            if done is not None:
+                stage.done = done
+            if total is not None:
+                stage.total = total
+            if detail is not None:
+                stage.detail = detail
+
+    def _set_state(self, name: str, state: str) -> None:
+        with self._lock:
+            stage = self._stages[name]
+            stage.state = state
+            if state == RUNNING:
+                stage.started_at = time.perf_counter()
+            elif stage.started_at is not None:
+                stage.finished_at = time.perf_counter()
+
+    def skip(self, name: str, detail: str = "") -> None:
+        self._set_state(name, SKIPPED)
+        self.update(name, detail=detail)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Mark a stage running for the duration of the block, then done (or failed on error)."""
+        self._set_state(name, RUNNING)
+        with metrics.span("ingest_stage", stage=name):
+            try:
+                yield
+            except BaseException:
+                self._set_state(name, FAILED)
+                raise
+        self._set_state(name, DONE)
+
+    def run_concurrently(self, *tasks: Callable[[], None]) -> None:
+        """Run tasks on their own threads and wait for all of them; re-raise the first error."""
+        errors: List[BaseException] = []
+
+        def run(task):
+            try:
+                task()
+            except BaseException as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(task,), daemon=True) for task in tasks]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+
+class Pipe:
+    """Bounded hand-off between a producing and a consuming stage."""
+
+    def __init__(self, max_items: int):
+        self._queue = queue.Queue(maxsize=max_items)
+
+    def feed(self, items: Iterable[Any]) -> None:
+        """Put every item, then the end marker (also when ``items`` fails)."""
+        try:
+            for item in items:
+                self._queue.put(item)
+        finally:
+            self._queue.put(_END)
+
+    def __iter__(self) -> Iterator[Any]:
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            yield item
@@ -0,0 +1,184 @@
+"""
+Local BM25 inverted index over parsed log rows.
+
+The index is a RecordObserver, fed the parsed rows as they are written (the app's
+ingest job follows the CSV that parse_log() writes in a worker process). It answers
+exact-token lookups (PIDs, error codes, interface names, ...) without any embedding
+call, and provides BM25 rankings for hybrid retrieval. The rows themselves are read
+from the RecordStore shared with the other indexes for rendering search results.
+"""
+
+import bisect
+import csv
+import io
+import heapq
+import math
+import re
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from config import BM25_B, BM25_K1
+from log_records import RecordObserver, replay_csv
+from query_router import BETWEEN_PATTERN, LAST_PATTERN
+from record_store import RecordStore
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_](?:[a-z0-9_.:/\-]*[a-z0-9_])?")
+QUOTED_PATTERN = re.compile(r'"([^"]+)"|\'([^\']+)\'')
+# Bare numbers shorter than this ("top 5", "3 errors") are counts, not identifiers like PIDs or error codes.
+MIN_NUMBER_LENGTH = 3
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def is_identifier(token: str) -> bool:
+    # An inner separator (ovs-vswitchd, 10.0.0.1, /var/log), letters mixed with digits (eth0, 0x1f)
+    # or a number of at least MIN_NUMBER_LENGTH digits (pid 4242, error 404).
+    if any(char in '_.:/-' for char in token):
+        return True
+    if token.isdigit():
+        return len(token) >= MIN_NUMBER_LENGTH
+    return any(char.isdigit() for char in token)
+
+
+def identifier_terms(query: str) -> List[str]:
+    """Return the query terms specific enough to be looked up verbatim (identifiers & quoted phrases)."""
+    # Time windows ("last 5 minutes", "between 10:02 and 10:05") are filters, not text to look up.
+    query = BETWEEN_PATTERN.sub(' ', LAST_PATTERN.sub(' ', query.lower()))
+    terms = []
+    for match in QUOTED_PATTERN.finditer(query):
+        terms.extend(tokenize(match.group(1) or match.group(2)))
+    terms.extend(token for token in tokenize(QUOTED_PATTERN.sub(' ', query)) if is_identifier(token))
+    return list(dict.fromkeys(terms))
+
+
+class BM25Index(RecordObserver):
+    """
+    Args:
+        records: The RecordStore fed the same rows before this index (e.g. the app's);
+            without one the index keeps its own.
+    """
+
+    def __init__(self, records: Optional[RecordStore] = None, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.header: List[str] = []
+        self._own_records = records is None
+        self.records = RecordStore() if records is None else records  # The rows themselves, compactly encoded
+        self.doc_lengths = array('I')  # Per row id from first_row on
+        self.first_row = 0  # Raised by drop_before()
+        self.postings: Dict[str, Tuple[array, array]] = {}  # token -> (row ids, term frequencies)
+        self._total_length = 0
+
+    @classmethod
+    def from_csv(cls, csv_path: str) -> "BM25Index":
+        index = cls()
+        replay_csv(csv_path, [index])
+        return index
+
+    def begin(self, header: List[str]) -> None:
+        self.header = list(header)
+        if self._own_records:
+            self.records.begin(header)
+
+    def add(self, row: List[str]) -> None:
+        row_id = self.first_row + len(self.doc_lengths)
+        if self._own_records:
+            self.records.add(row)
+
+        tokens = tokenize(' '.join(row))
+        self.doc_lengths.append(len(tokens))
+        self._total_length += len(tokens)
+        for token, frequency in Counter(tokens).items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = (array('I'), array('I'))
+            posting[0].append(row_id)
+            posting[1].append(frequency)
+
+    def drop_before(self, row_id: int) -> None:
+        """Forget the rows before ``row_id`` (see indexing.IncrementalLogIndex.expire)."""
+        count = min(row_id - self.first_row, len(self.doc_lengths))
+        if count > 0:
+            self._total_length -= sum(self.doc_lengths[:count])
+            del self.doc_lengths[:count]
+            self.first_row += count
+            for token, (row_ids, frequencies) in list(self.postings.items()):
+                cut = bisect.bisect_left(row_ids, self.first_row)
+                if cut == len(row_ids):
+                    del self.postings[token]
+                elif cut:
+                    del row_ids[:cut]
+                    del frequencies[:cut]
+        if self._own_records:
+            self.records.drop_before(row_id)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def _idf(self, token: str) -> float:
+        document_frequency = len(self.postings[token][0])
+        return math.log(1 + (len(self) - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def _scores(self, tokens: List[str], candidates=None) -> Dict[int, float]:
+        average_length = self._total_length / max(1, len(self))
+        scores: Dict[int, float] = {}
+        for token in set(tokens):
+            if token not in self.postings:
+                continue
+            idf = self._idf(token)
+            row_ids, frequencies = self.postings[token]
+            for row_id, frequency in zip(row_ids, frequencies):
+                if candidates is not None and row_id not in candidates:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[row_id - self.first_row] / max(1.0, average_length))
+                scores[row_id] = scores.get(row_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+    def search(self, query: str, k: int, candidates=None) -> List[Tuple[int, float]]:
+        """
+        Return the ``k`` best (row id, BM25 score) pairs for a free-text query.
+
+        Args:
+            candidates: Optional container of the row ids allowed in the result (e.g. a time window)
+        """
+        scores = self._scores(tokenize(query), candidates)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def exact_lookup(self, query: str, k: int) -> Optional[List[int]]:
+        """
+        Answer a query from the index alone if it names specific identifiers.
+
+        Args:
+            query: User question
+            k: Maximum number of rows to return
+
+        Returns:
+            Ids (in file order) of the best BM25-scored rows containing every identifier
+            in the query; None if it has no identifiers or they never occur together.
+        """
+        terms = identifier_terms(query)
+        if not terms or any(term not in self.postings for term in terms):
+            return None
+
+        # Intersect from the rarest term up.
+        terms.sort(key=lambda term: len(self.postings[term][0]))
+        candidates = set(self.postings[terms[0]][0])
+        for term in terms[1:]:
+            candidates.intersection_update(self.postings[term][0])
+            if not candidates:
+                return None
+
+        scores = self._scores(tokenize(query), candidates)
+        for row_id in candidates:
+            scores.setdefault(row_id, 0.0)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return sorted(row_id for row_id, _ in best)
+
+    def render_rows(self, row_ids: List[int]) -> str:
+        """Format rows as CSV text with the header, like a chunk."""
+        header = io.StringIO()
+        csv.writer(header).writerow(self.header)
+        return '\n'.join([header.getvalue().rstrip('\r\n'), *self.records.render_rows(row_ids)])
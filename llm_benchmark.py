@@ -0,0 +1,299 @@
+"""
+End-to-end benchmark of the LLM code paths against the local fake API.
+
+Starts fake_llm_server.py in-process (or uses a running one via --base-url), points
+the Groq client at it and drives the real classification, schema extraction, LLM
+parsing, streamed answer and embedding code with concurrent callers. Answers go
+through the app's retrieval chain (rag_chain.py) over a FAISS index of the
+generated log embedded by the fake server, so retrieval, context compression and
+the prompt are part of the measured latency. Reports
+throughput, tail latency (p50/p95/p99), time to first token and how calls fare
+under the server's rate limit and injected errors:
+
+    python llm_benchmark.py --latency lognormal:300,0.6 --concurrency 8 --rpm-sweep 0 120 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_groq import ChatGroq
+
+import metrics
+from chunking import chunk_records
+from config import (BATCH_SIZE, EMBEDDING_BATCH_SIZE, EMBEDDING_GRANULARITY, EMBEDDING_MAX_CONCURRENCY,
+                    EMBEDDING_MAX_RETRIES, LLM_CLASSIFIER_MODEL, LLM_MAX_TOKENS, LLM_TEMPERATURE)
+from fake_llm_server import ServerEmbeddings, add_server_arguments, config_from_args, create_server
+from indexing import IndexingError, add_documents_in_batches
+from inverted_index import BM25Index
+from llm_classifier import classify_log_type, extract_log_schema, get_log_sample, llm_based_parser
+from log_generator import LOG_TYPES, write_log
+from log_records import read_parsed_csv
+from parser import PARSERS
+from rag_chain import build_retrieval_chain, stream_answer
+from record_store import RecordStore
+from rollups import LogRollup
+from templates import TemplateIndex
+from time_index import TimeIndex
+
+SCENARIOS = ("classify", "schema", "parse", "answer", "embed")
+DEFAULT_SCHEMA = ['timestamp', 'message']  # What extract_log_schema() falls back to
+ANSWER_QUESTION = "Are there any critical errors, and what should I check next?"
+
+# An operation returns whether it succeeded and, for streamed calls, the time to the first chunk.
+Operation = Callable[[], Tuple[bool, Optional[float]]]
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    requests_per_minute: float
+    concurrency: int
+    calls: int
+    ok: int
+    seconds: float
+    latencies: List[float] = field(default_factory=list, repr=False)
+    first_token: List[float] = field(default_factory=list, repr=False)
+    server: Dict[str, int] = field(default_factory=dict)  # Server counters during the scenario
+    retries: int = 0  # Client-side LLM & embedding retries
+
+    @property
+    def calls_per_second(self) -> float:
+        return self.calls / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        values = {
+            "scenario": self.scenario, "rpm": self.requests_per_minute, "concurrency": self.concurrency,
+            "calls": self.calls, "ok": self.ok, "errors": self.calls - self.ok, "seconds": round(self.seconds, 3),
+            "calls_per_second": round(self.calls_per_second, 2), "server": self.server, "retries": self.retries,
+        }
+        for name, samples in (("latency", self.latencies), ("first_token", self.first_token)):
+            if samples:
+                values[f"{name}_ms"] = {f"p{q}": round(percentile(samples, q) * 1000, 1) for q in (50, 95, 99)}
+                values[f"{name}_ms"]["max"] = round(max(samples) * 1000, 1)
+        return values
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100)."""
+    ordered = sorted(samples)
+    rank = max(1, min(len(ordered), int(round(q / 100 * len(ordered) + 0.5))))
+    return ordered[rank - 1]
+
+
+def _server_stats(base_url: str) -> Dict[str, int]:
+    with urllib.request.urlopen(f"{base_url}/stats", timeout=10) as response:
+        return json.loads(response.read())
+
+
+def _retry_count() -> int:
+    counters = metrics.REGISTRY.snapshot()["counters"]
+    return int(sum(item["value"] for item in counters
+                   if item["name"] in ("llm_retries_total", "embedding_retries_total")))
+
+
+def run_scenario(name: str, operation: Operation, calls: int, concurrency: int, base_url: str,
+                 requests_per_minute: float) -> ScenarioResult:
+    latencies: List[float] = []
+    first_token: List[float] = []
+    ok = 0
+    lock = threading.Lock()
+
+    def timed_call() -> None:
+        nonlocal ok
+        started = time.perf_counter()
+        try:
+            succeeded, ttft = operation()
+        except Exception:
+            succeeded, ttft = False, None
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            ok += succeeded
+            if ttft is not None:
+                first_token.append(ttft)
+
+    stats_before = _server_stats(base_url)
+    retries_before = _retry_count()
+    started = time.perf_counter()
+    # The code under test prints its failures; keep them out of the report.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for future in [pool.submit(timed_call) for _ in range(calls)]:
+                future.result()
+    seconds = time.perf_counter() - started
+    stats_after = _server_stats(base_url)
+    server = {key: stats_after[key] - stats_before.get(key, 0)
+              for key in ("requests", "throttled", "injected_errors")}
+    return ScenarioResult(name, requests_per_minute, concurrency, calls, ok, seconds, latencies, first_token,
+                          server, _retry_count() - retries_before)
+
+
+def build_answer_chain(log_path: str, log_type: str, csv_path: str, llm, embeddings):
+    """
+    The app's retrieval chain over a generated log, indexed the way the ingest job indexes an upload.
+
+    Returns:
+        The chain, or None if no chunk could be embedded
+    """
+    records = RecordStore()
+    template_index = TemplateIndex(records)
+    record_indexes = {"bm25_index": BM25Index(records), "template_index": template_index, "time_index": TimeIndex(),
+                      "log_rollup": LogRollup(templates=template_index)}
+    # The parser's RecordWriter fills the shared record store before the indexes over it.
+    PARSERS[log_type](log_path, csv_path, [records, *record_indexes.values()])
+    if EMBEDDING_GRANULARITY == "templates":
+        documents = template_index.documents(source=csv_path)
+    else:
+        schema, rows = read_parsed_csv(csv_path)
+        documents = chunk_records(schema, rows, source=csv_path)
+    try:
+        vectors = add_documents_in_batches(documents, embeddings, batch_size=EMBEDDING_BATCH_SIZE,
+                                           max_concurrency=EMBEDDING_MAX_CONCURRENCY, requests_per_minute=0,
+                                           max_retries=EMBEDDING_MAX_RETRIES)
+    except IndexingError as e:
+        # Throttled or failing server: answer from what was embedded, like the app with a partial index.
+        vectors = e.vectors
+    if vectors is None:
+        return None
+    return build_retrieval_chain(llm, vectors, **record_indexes)
+
+
+def build_operations(workdir: str, base_url: str, args: argparse.Namespace) -> Dict[str, Operation]:
+    """One call of each LLM code path, on a generated log of ``args.log_type``."""
+    api_key = "fake-key"
+    log = write_log(os.path.join(workdir, "sample.log"), args.log_type, lines=args.parse_lines, seed=args.seed)
+    sample = get_log_sample(log.path)
+    classification = classify_log_type(sample, api_key)
+    counter = iter(range(1 << 62))
+    counter_lock = threading.Lock()
+
+    def classify():
+        return classify_log_type(sample, api_key)['confidence'] > 0, None
+
+    def schema():
+        return extract_log_schema(sample, api_key) != DEFAULT_SCHEMA, None
+
+    def parse():
+        with counter_lock:
+            csv_path = os.path.join(workdir, f"parsed_{next(counter)}.csv")
+        try:
+            return llm_based_parser(log.path, classification, api_key, csv_path), None
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(csv_path)
+
+    embeddings = ServerEmbeddings(base_url)
+    answer_llm = ChatGroq(groq_api_key=api_key, model_name=args.model, temperature=LLM_TEMPERATURE,
+                          max_tokens=LLM_MAX_TOKENS, max_retries=0)
+    answer_chain = build_answer_chain(log.path, args.log_type, os.path.join(workdir, "answer_index.csv"),
+                                      answer_llm, embeddings)
+
+    def answer():
+        # Time to first token includes retrieval & context compression, as in the app.
+        if answer_chain is None:
+            return False, None
+        started = time.perf_counter()
+        ttft = None
+        text = ""
+        for chunk in stream_answer(answer_chain, ANSWER_QUESTION, model=args.model):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            text += chunk
+        return bool(text), ttft
+
+    documents = [Document(page_content=line) for line in sample.splitlines() if line.strip()]
+    documents = (documents * (args.embed_documents // max(1, len(documents)) + 1))[:args.embed_documents]
+
+    def embed():
+        # The server's rate limit applies, not a client-side one: throttling is what is measured.
+        try:
+            add_documents_in_batches(documents, embeddings, batch_size=EMBEDDING_BATCH_SIZE,
+                                     max_concurrency=EMBEDDING_MAX_CONCURRENCY, requests_per_minute=0,
+                                     max_retries=EMBEDDING_MAX_RETRIES)
+        except IndexingError:
+            return False, None
+        return True, None
+
+    return {"classify": classify, "schema": schema, "parse": parse, "answer": answer, "embed": embed}
+
+
+def _format_ms(samples: List[float]) -> str:
+    if not samples:
+        return f"{'-':>8} {'-':>8} {'-':>8}"
+    return " ".join(f"{percentile(samples, q) * 1000:>8.0f}" for q in (50, 95, 99))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the LLM code paths against a local fake API")
+    add_server_arguments(parser)
+    parser.set_defaults(rpm=None)
+    parser.add_argument("--rpm-sweep", dest="rpm_values", nargs="+", type=float, default=[0],
+                        help="Server rate limits to run every scenario under (0 = unlimited)")
+    parser.add_argument("--base-url", help="Use a running fake_llm_server.py instead of starting one "
+                                           "(its own options then apply)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--calls", type=int, default=50, help="Calls per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent callers")
+    parser.add_argument("--model", default=LLM_CLASSIFIER_MODEL, help="Model name sent for answers")
+    parser.add_argument("--log-type", choices=LOG_TYPES, default="Sys", help="Generated log used as input")
+    parser.add_argument("--parse-lines", type=int, default=2 * BATCH_SIZE,
+                        help="Lines per LLM-parsed file (one request per BATCH_SIZE lines)")
+    parser.add_argument("--embed-documents", type=int, default=4 * EMBEDDING_BATCH_SIZE,
+                        help="Documents per embedding run")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+    if args.rpm is not None:
+        args.rpm_values = [args.rpm]
+
+    results: List[ScenarioResult] = []
+    print(f"{'scenario':<9} {'rpm':>6} {'calls':>6} {'ok':>5} {'calls/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'ttft p50':>9} {'429s':>6} {'5xx':>5} {'retries':>7}")
+    with tempfile.TemporaryDirectory(prefix="log_parser_llm_bench_") as workdir:
+        for requests_per_minute in args.rpm_values:
+            server = None
+            if args.base_url:
+                base_url = args.base_url.rstrip("/")
+            else:
+                server = create_server(config_from_args(args, requests_per_minute), port=0)
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                host, port = server.server_address[:2]
+                base_url = f"http://{host}:{port}"
+            # ChatGroq reads the endpoint from the environment when a client is created.
+            os.environ["GROQ_API_BASE"] = base_url
+            try:
+                operations = build_operations(workdir, base_url, args)
+                for name in args.scenarios:
+                    result = run_scenario(name, operations[name], args.calls, args.concurrency, base_url,
+                                          requests_per_minute)
+                    results.append(result)
+                    ttft = f"{percentile(result.first_token, 50) * 1000:>9.0f}" if result.first_token else f"{'-':>9}"
+                    print(f"{name:<9} {requests_per_minute:>6g} {result.calls:>6} {result.ok:>5} "
+                          f"{result.calls_per_second:>8.2f} {_format_ms(result.latencies)} {ttft} "
+                          f"{result.server['throttled']:>6} {result.server['injected_errors']:>5} "
+                          f"{result.retries:>7}")
+            finally:
+                if server is not None:
+                    server.shutdown()
+                    server.server_close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump([result.to_dict() for result in results], f, indent=2)
+    if any(result.ok < result.calls for result in results):
+        print("Some calls failed (see the ok column); expected when throttling or injecting errors.")
+
+
+if __name__ == "__main__":
+    main()
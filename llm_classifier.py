@@ -9,6 +9,8 @@ import json
 import csv
 import io
 import re
+import time
+import metrics
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from config import (
@@ -16,6 +18,7 @@ from config import (
     LLM_PARSER_MODEL,
     LLM_TEMPERATURE,
     LLM_MAX_TOKENS,
+    LLM_MAX_RETRIES,
     BATCH_SIZE,
     MAX_SAMPLE_LINES,
     CSV_OUTPUT_PATH,
@@ -68,6 +71,29 @@ Do not include any explanation, just the CSV rows."""),
 ])
 
 
+def invoke_llm(llm, prompt, purpose: str, model: str, max_retries: int = LLM_MAX_RETRIES):
+    """
+    Call a chat model, retrying failed calls with exponential backoff.
+
+    Each retry is counted in ``llm_retries_total`` and the token usage of the call
+    that succeeds in the LLM token counters. Create the model with ``max_retries=0``,
+    so the client does not retry on its own where it cannot be counted.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            with metrics.span('llm_call', purpose=purpose, model=model):
+                response = llm.invoke(prompt)
+            break
+        except Exception:
+            if attempt == max_retries:
+                raise
+            metrics.inc('llm_retries_total', purpose=purpose, model=model)
+            # Exponential backoff, typically for provider rate limits.
+            time.sleep(2 ** attempt)
+    metrics.record_llm_usage(response, purpose=purpose, model=model)
+    return response
+
+
 def classify_log_type(log_sample: str, groq_api_key: str) -> dict:
     """
     Classify log type using LLM.
@@ -89,14 +115,15 @@ def classify_log_type(log_sample: str, groq_api_key: str) -> dict:
             groq_api_key=groq_api_key,
             model_name=LLM_CLASSIFIER_MODEL,
             temperature=LLM_TEMPERATURE,
-            max_tokens=LLM_MAX_TOKENS
+            max_tokens=LLM_MAX_TOKENS,
+            max_retries=0  # Retried & counted by invoke_llm()
         )
         
         # Format the prompt
         prompt = CLASSIFICATION_PROMPT.format_messages(log_samples=log_sample)
         
         # Get response from LLM
-        response = llm.invoke(prompt)
+        response = invoke_llm(llm, prompt, purpose='classify', model=LLM_CLASSIFIER_MODEL)
         
         # Parse JSON response
         response_text = response.content.strip()
@@ -140,11 +167,12 @@ def extract_log_schema(log_sample: str, groq_api_key: str) -> list:
             groq_api_key=groq_api_key,
             model_name=LLM_CLASSIFIER_MODEL,
             temperature=LLM_TEMPERATURE,
-            max_tokens=LLM_MAX_TOKENS
+            max_tokens=LLM_MAX_TOKENS,
+            max_retries=0  # Retried & counted by invoke_llm()
         )
         
         prompt = SCHEMA_PROMPT.format_messages(log_samples=log_sample)
-        response = llm.invoke(prompt)
+        response = invoke_llm(llm, prompt, purpose='schema', model=LLM_CLASSIFIER_MODEL)
         
         response_text = response.content.strip()
         
@@ -180,7 +208,8 @@ def llm_based_parser(log_file_path: str, classification_result: dict,
             groq_api_key=groq_api_key,
             model_name=LLM_PARSER_MODEL,
             temperature=LLM_TEMPERATURE,
-            max_tokens=LLM_MAX_TOKENS
+            max_tokens=LLM_MAX_TOKENS,
+            max_retries=0  # Retried & counted by invoke_llm()
         )
         
         fields = classification_result.get('detected_fields', ['message'])
@@ -210,7 +239,7 @@ def llm_based_parser(log_file_path: str, classification_result: dict,
                     log_lines=batch_text
                 )
                 
-                response = llm.invoke(prompt)
+                response = invoke_llm(llm, prompt, purpose='parse', model=LLM_PARSER_MODEL)
                 parsed_rows = _parse_csv_response(response.content, len(fields))
                 
                 for row in parsed_rows:
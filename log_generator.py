@@ -0,0 +1,292 @@
+"""
+Deterministic synthetic logs for the parser benchmarks.
+
+Generates kernel, dmesg, OVS and syslog files in exactly the formats the regex
+parsers in parser.py expect (kernel_log_pattern, dmesg_log_pattern, ovs_parser,
+parse_syslogs), with a configurable number of distinct message templates, hosts and
+processes, and a share of noise lines the parsers are expected to skip. The same
+seed always produces the same file.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+from config import BENCHMARK_LINES
+
+# Keys of parser.PARSERS
+LOG_TYPES = ("Kernel", "DMESG", "OVS", "Sys")
+
+DEFAULT_VARIETY = 200  # Distinct message templates per file
+DEFAULT_NOISE = 0.02  # Share of lines the parser should skip
+START_TIME = datetime(2024, 3, 10, 8, 0, 0)
+
+KERNEL_SUBSYSTEMS = ("usb", "eth0", "EXT4-fs", "nvme", "ata1", "ACPI", "audit", "TCP", "cgroup", "i915")
+SYSLOG_PROCESSES = ("sshd", "systemd", "cron", "NetworkManager", "dhclient", "sudo", "nginx", "dockerd")
+DMESG_FACILITIES = ("kern", "user", "daemon", "syslog")
+DMESG_LEVELS = ("emerg", "alert", "crit", "err", "warn", "notice", "info", "debug")
+OVS_MODULES = ("bridge", "ofproto_dpif", "connmgr", "netdev_linux", "vswitchd", "rconn", "dpif_netlink")
+OVS_LEVELS = ("DBG", "INFO", "WARN", "ERR", "EMER")
+
+# Message templates seen in real logs; {placeholders} are filled per line.
+MESSAGE_TEMPLATES = (
+    "new high-speed USB device number {n} using xhci_hcd",
+    "link is up at {speed}Mbps, full duplex",
+    "link is down",
+    "mounted filesystem {uuid} with ordered data mode",
+    "I/O error, dev sd{letter}, sector {big} op 0x{hex}:(READ) flags 0x0",
+    "Out of memory: Killed process {pid} ({proc}) total-vm:{big}kB",
+    "Accepted publickey for {user} from {ip} port {port} ssh2",
+    "Failed password for invalid user {user} from {ip} port {port} ssh2",
+    "Started Session {n} of user {user}.",
+    "session opened for user {user} by (uid={uid})",
+    "connection from {ip}:{port} timed out after {ms}ms",
+    "DHCPACK of {ip} from {ip}",
+    "temperature above threshold, cpu clock throttled (total events = {n})",
+    "segfault at {hex} ip {hex} sp {hex} error {digit} in {proc}",
+    "request {uuid} completed in {ms}ms with status {status}",
+    "port {n}: added to bridge br{digit}",
+    "flow_mod: table {digit} priority {n} cookie 0x{hex}",
+    "{ip}: connection dropped after {n} retries",
+    "queue {n} full, dropped {n} packets",
+    "reconnect in {digit} seconds",
+)
+
+_WORDS = ("cache", "worker", "queue", "socket", "buffer", "device", "table", "lease", "route", "thread")
+_VERBS = ("allocated", "released", "flushed", "resized", "reset", "timed out", "registered", "removed")
+
+
+@dataclass
+class GeneratedLog:
+    path: str
+    log_type: str
+    lines: int
+    bytes: int
+    records: int  # Lines the parser should turn into a row
+
+    @property
+    def noise_lines(self) -> int:
+        return self.lines - self.records
+
+
+class _MessageFactory:
+    """Messages from a fixed set of templates with random variable parts."""
+
+    def __init__(self, rng: random.Random, variety: int, hosts: int):
+        self.rng = rng
+        templates = list(MESSAGE_TEMPLATES)
+        # Beyond the catalog, synthesise templates so the template count is as requested.
+        for n in range(max(0, variety - len(templates))):
+            templates.append(f"{_WORDS[n % len(_WORDS)]}{n} {_VERBS[n % len(_VERBS)]}: "
+                             f"{{n}} entries, {{ms}}ms")
+        self.templates = templates[:max(1, variety)]
+        self.hosts = [f"node{n:03d}" for n in range(max(1, hosts))]
+        self.users = ["root", "admin", "deploy", "alice", "bob", "backup", "postgres"]
+
+    def host(self) -> str:
+        return self.rng.choice(self.hosts)
+
+    def message(self) -> str:
+        rng = self.rng
+        # Few templates make up most of a log; skew the choice towards the first ones.
+        index = min(int(rng.paretovariate(1.2)) - 1, len(self.templates) - 1)
+        template = self.templates[index if rng.random() < 0.8 else rng.randrange(len(self.templates))]
+        return template.format_map(_Values(rng, self.users))
+
+
+class _Values(dict):
+    def __init__(self, rng: random.Random, users: List[str]):
+        super().__init__()
+        self.rng = rng
+        self.users = users
+
+    def __missing__(self, key: str) -> str:
+        rng = self.rng
+        if key == "n":
+            return str(rng.randint(1, 9999))
+        if key == "digit":
+            return str(rng.randint(0, 9))
+        if key == "big":
+            return str(rng.randint(10 ** 5, 10 ** 9))
+        if key == "hex":
+            return f"{rng.getrandbits(48):012x}"
+        if key == "uuid":
+            value = f"{rng.getrandbits(128):032x}"
+            return f"{value[:8]}-{value[8:12]}-{value[12:16]}-{value[16:20]}-{value[20:]}"
+        if key == "ip":
+            return f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        if key == "port":
+            return str(rng.randint(1024, 65535))
+        if key == "pid":
+            return str(rng.randint(100, 65535))
+        if key == "uid":
+            return str(rng.choice((0, 1000, 1001, 33)))
+        if key == "ms":
+            return str(rng.randint(1, 30000))
+        if key == "speed":
+            return str(rng.choice((100, 1000, 10000)))
+        if key == "status":
+            return str(rng.choice((200, 200, 200, 404, 500, 503)))
+        if key == "letter":
+            return rng.choice("abcd")
+        if key == "user":
+            return rng.choice(self.users)
+        if key == "proc":
+            return rng.choice(SYSLOG_PROCESSES)
+        raise KeyError(key)
+
+
+def _clock(rng: random.Random, start: datetime = START_TIME) -> Iterator[datetime]:
+    now = start
+    while True:
+        # Bursty: mostly sub-second gaps, now and then a pause of minutes.
+        now += timedelta(seconds=rng.expovariate(4.0) if rng.random() < 0.99 else rng.uniform(30, 600))
+        yield now
+
+
+def _syslog_time(when: datetime) -> str:
+    return f"{when:%b} {when.day:2d} {when:%H:%M:%S}"
+
+
+def _kernel_lines(rng: random.Random, messages: _MessageFactory, noise: float) -> Iterator[Tuple[str, bool]]:
+    boot = 0.0
+    for when in _clock(rng):
+        boot += rng.uniform(0.0, 0.5)
+        if rng.random() < noise:
+            yield rng.choice((
+                "  Call Trace:",
+                f"  ? {rng.choice(_WORDS)}_handler+0x{rng.getrandbits(12):x}/0x{rng.getrandbits(12):x}",
+                f"{_syslog_time(when)} bad-host.example kernel: [{boot:12.6f}] hostname with dashes",
+                f"{_syslog_time(when)} {messages.host()} kernel: message without uptime",
+                "",
+            )), False
+            continue
+        subsystem = rng.choice(KERNEL_SUBSYSTEMS)
+        yield (f"{_syslog_time(when)} {messages.host()} kernel: [{boot:12.6f}] "
+               f"{subsystem}: {messages.message()}"), True
+
+
+def _dmesg_lines(rng: random.Random, messages: _MessageFactory, noise: float) -> Iterator[Tuple[str, bool]]:
+    boot = 0.0
+    while True:
+        boot += rng.uniform(0.0, 0.5)
+        if rng.random() < noise:
+            yield rng.choice((
+                "------------[ cut here ]------------",
+                f"[{boot:12.6f}] line without facility and level",
+                "---[ end trace 0000000000000000 ]---",
+                "",
+            )), False
+            continue
+        facility = rng.choice(DMESG_FACILITIES)
+        level = rng.choice(DMESG_LEVELS)
+        yield f"{facility:<6}:{level:<6}: [{boot:12.6f}] {rng.choice(KERNEL_SUBSYSTEMS)}: {messages.message()}", True
+
+
+def _ovs_lines(rng: random.Random, messages: _MessageFactory, noise: float) -> Iterator[Tuple[str, bool]]:
+    # ovs_parser fails on a line without timestamp & fields, so OVS noise is lines that
+    # only look odd: extra '|' in the message (rejoined by the parser) or empty messages.
+    sequence = 0
+    for when in _clock(rng):
+        sequence += 1
+        timestamp = f"{when:%Y-%m-%dT%H:%M:%S}.{when.microsecond // 1000:03d}Z"
+        module = rng.choice(OVS_MODULES)
+        level = rng.choice(OVS_LEVELS)
+        if rng.random() < noise:
+            message = rng.choice((f"in_port={rng.randint(1, 64)}|actions=drop", ""))
+        else:
+            message = messages.message()
+        yield f"{timestamp}|{sequence:05d}|{module}|{level}|{message}", True
+
+
+def _syslog_lines(rng: random.Random, messages: _MessageFactory, noise: float) -> Iterator[Tuple[str, bool]]:
+    # parse_syslogs needs a process[pid] field on every line with six or more words;
+    # noise is therefore limited to lines it skips for being too short.
+    for when in _clock(rng):
+        if rng.random() < noise:
+            yield rng.choice(("", "-- MARK --", f"{_syslog_time(when)} {messages.host()}")), False
+            continue
+        process = rng.choice(SYSLOG_PROCESSES)
+        yield f"{_syslog_time(when)} {messages.host()} {process}[{rng.randint(100, 65535)}]: {messages.message()}", True
+
+
+_GENERATORS = {
+    "Kernel": _kernel_lines,
+    "DMESG": _dmesg_lines,
+    "OVS": _ovs_lines,
+    "Sys": _syslog_lines,
+}
+
+
+def generate_lines(log_type: str, seed: int = 0, variety: int = DEFAULT_VARIETY, noise: float = DEFAULT_NOISE,
+                   hosts: int = 8) -> Iterator[Tuple[str, bool]]:
+    """
+    Endless stream of (line, is_record) for one log type.
+
+    Args:
+        log_type: One of LOG_TYPES
+        seed: Same seed, same lines
+        variety: Number of distinct message templates
+        noise: Share of noise lines, e.g. stack trace continuations and blank lines
+        hosts: Number of distinct host names
+
+    Returns:
+        Iterator of (line without newline, True if the parser should write a row for it)
+    """
+    if log_type not in _GENERATORS:
+        raise ValueError(f"Unknown log type {log_type!r}, expected one of {', '.join(LOG_TYPES)}")
+    rng = random.Random(f"{log_type}:{seed}")
+    return _GENERATORS[log_type](rng, _MessageFactory(rng, variety, hosts), noise)
+
+
+def write_log(path: str, log_type: str, lines: Optional[int] = None, size_bytes: Optional[int] = None,
+              seed: int = 0, variety: int = DEFAULT_VARIETY, noise: float = DEFAULT_NOISE,
+              hosts: int = 8) -> GeneratedLog:
+    """Write a synthetic log of ``lines`` lines or about ``size_bytes`` bytes (whichever comes first)."""
+    if lines is None and size_bytes is None:
+        lines = BENCHMARK_LINES
+    written = size = records = 0
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        for line, is_record in generate_lines(log_type, seed, variety, noise, hosts):
+            if (lines is not None and written >= lines) or (size_bytes is not None and size >= size_bytes):
+                break
+            f.write(line + "\n")
+            written += 1
+            size += len(line.encode("utf-8")) + 1
+            records += is_record
+    return GeneratedLog(path, log_type, written, size, records)
+
+
+def _parse_size(text: str) -> int:
+    units = {"k": 1 << 10, "m": 1 << 20, "g": 1 << 30}
+    text = text.strip().lower().rstrip("b")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic log file")
+    parser.add_argument("output", help="Path of the log file to write")
+    parser.add_argument("--type", dest="log_type", choices=LOG_TYPES, default="Kernel")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--lines", type=int, help=f"Number of lines (default {BENCHMARK_LINES})")
+    size.add_argument("--size", type=_parse_size, help="Approximate file size, e.g. 500M or 2G")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--variety", type=int, default=DEFAULT_VARIETY, help="Distinct message templates")
+    parser.add_argument("--noise", type=float, default=DEFAULT_NOISE, help="Share of noise lines")
+    parser.add_argument("--hosts", type=int, default=8, help="Distinct host names")
+    args = parser.parse_args()
+
+    log = write_log(args.output, args.log_type, lines=args.lines, size_bytes=args.size, seed=args.seed,
+                    variety=args.variety, noise=args.noise, hosts=args.hosts)
+    print(f"Wrote {log.lines} {log.log_type} lines ({log.bytes / (1 << 20):.1f} MiB, "
+          f"{log.noise_lines} noise) to {log.path}")
+
+
+if __name__ == "__main__":
+    main()
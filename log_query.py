@@ -0,0 +1,279 @@
+"""
+Embedded SQL engine over parsed log records.
+
+LogDatabase is a RecordObserver that loads the rows written by parse_log() into an
+SQLite table with the common column roles (timestamp, host, process, severity, ...)
+and indexes on the usual filter columns. StructuredQuery describes an aggregate or
+filter question and is compiled to SQL, so such questions get exact answers locally.
+
+The table keeps no strings of its own: host, process, severity and module are the
+codes of the RecordStore shared with the other indexes, and message filters read
+the messages from the store through an SQL function. Results are decoded back to
+text. export() writes a copy with everything spelled out, for use outside the app.
+"""
+
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from config import SQL_INSERT_BATCH_SIZE, STRUCTURED_QUERY_ROW_LIMIT
+from log_records import RecordObserver, RecordSchema, format_timestamp, replay_csv
+from record_store import CODED_ROLES, RecordStore
+
+COLUMNS = ('ts', 'host', 'process', 'pid', 'severity', 'module', 'message')
+# Stored as RecordStore codes; 'message' is not stored at all but read from the store.
+CODED_COLUMNS = CODED_ROLES
+INDEXED_COLUMNS = ('ts', 'severity', 'host', 'process')
+TABLE_COLUMNS = "row_id INTEGER PRIMARY KEY, ts REAL, host {0}, process {0}, pid INTEGER, severity {0}, module {0}"
+
+# SQL expressions for group-by keys that are not plain columns.
+GROUP_EXPRESSIONS = {
+    'minute': "strftime('%Y-%m-%d %H:%M', ts, 'unixepoch')",
+    'hour': "strftime('%Y-%m-%d %H:00', ts, 'unixepoch')",
+}
+
+
+@dataclass
+class StructuredQuery:
+    aggregate: str = 'count'  # 'count' or 'list'
+    group_by: Optional[str] = None  # A column in COLUMNS or a key of GROUP_EXPRESSIONS
+    equals: Dict[str, List[str]] = field(default_factory=dict)  # column -> accepted values (case-insensitive)
+    message_contains: List[str] = field(default_factory=list)
+    last_seconds: Optional[float] = None  # Relative to the newest record in the log
+    time_of_day: Optional[Tuple[str, str]] = None  # ('HH:MM:SS', 'HH:MM:SS'), inclusive
+    limit: int = STRUCTURED_QUERY_ROW_LIMIT
+
+
+class LogDatabase(RecordObserver):
+    """
+    Args:
+        path: SQLite database file (in memory by default)
+        records: The RecordStore fed the same rows before this table (e.g. the app's);
+            without one the table keeps its own.
+    """
+
+    def __init__(self, path: str = ':memory:', records: Optional[RecordStore] = None):
+        self._lock = threading.Lock()
+        self._own_records = records is None
+        self.records = RecordStore() if records is None else records
+        # Streamlit reruns the script on different threads; access is serialized by the lock.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS logs ({TABLE_COLUMNS.format('INTEGER')})")
+        self._conn.create_function('message', 1, self._message, deterministic=True)
+        self.schema: Optional[RecordSchema] = None
+        self._pending = []
+        self._row_count = 0
+
+    @classmethod
+    def from_csv(cls, csv_path: str, path: str = ':memory:') -> "LogDatabase":
+        database = cls(path)
+        replay_csv(csv_path, [database])
+        return database
+
+    @classmethod
+    def load(cls, db_path: str, records: RecordStore, path: str = ':memory:') -> "LogDatabase":
+        """
+        Open a copy of a database written by save().
+
+        Args:
+            db_path: SQLite file written by save()
+            records: The RecordStore the database was filled with (its codes are stored)
+            path: Where the copy is kept (in memory by default)
+        """
+        database = cls(path, records)
+        source = sqlite3.connect(db_path)
+        try:
+            source.backup(database._conn)
+        finally:
+            source.close()
+        database.begin(records.header)
+        database._row_count = records.end_row
+        return database
+
+    def save(self, db_path: str) -> None:
+        """Write the table & its indexes to an SQLite file; load() it with the same RecordStore."""
+        target = sqlite3.connect(db_path)
+        try:
+            with self._lock:
+                self._conn.backup(target)
+        finally:
+            target.close()
+
+    def export(self, db_path: str) -> None:
+        """Write the table with its values & messages as text, readable without the RecordStore."""
+        target = sqlite3.connect(db_path)
+        try:
+            target.execute(f"CREATE TABLE logs ({TABLE_COLUMNS.format('TEXT')}, message TEXT)")
+            with self._lock:
+                cursor = self._conn.execute("SELECT row_id, ts, host, process, pid, severity, module, "
+                                            "message(row_id) FROM logs ORDER BY row_id")
+                columns = [description[0] for description in cursor.description]
+                while rows := cursor.fetchmany(SQL_INSERT_BATCH_SIZE):
+                    target.executemany("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                       self._decoded(columns, rows))
+            for column in INDEXED_COLUMNS:
+                target.execute(f"CREATE INDEX logs_{column} ON logs ({column})")
+            target.commit()
+        finally:
+            target.close()
+
+    def begin(self, header: List[str]) -> None:
+        self.schema = RecordSchema(header)
+        if self._own_records:
+            self.records.begin(header)
+
+    def add(self, row: List[str]) -> None:
+        if self._own_records:
+            self.records.add(row)
+        schema = self.schema
+        row_id = self._row_count
+        codes = {column: self.records.code(row_id, schema.columns[column]) if schema.has(column) else None
+                 for column in CODED_COLUMNS}
+        pid = schema.value(row, 'pid').strip()
+        self._pending.append((
+            row_id,
+            schema.timestamp(row),
+            codes['host'],
+            codes['process'],
+            int(pid) if pid.isdigit() else None,
+            codes['severity'],
+            codes['module'],
+        ))
+        self._row_count += 1
+        if len(self._pending) >= SQL_INSERT_BATCH_SIZE:
+            self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            self._conn.executemany("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)", self._pending)
+        self._pending = []
+
+    def end(self) -> None:
+        self._flush()
+        # Building the indexes after the bulk load is much faster than maintaining them per insert.
+        with self._lock:
+            for column in INDEXED_COLUMNS:
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS logs_{column} ON logs ({column})")
+            self._conn.commit()
+
+    def drop_before(self, row_id: int) -> None:
+        """Delete the rows before ``row_id`` (see indexing.IncrementalLogIndex.expire)."""
+        self._flush()
+        with self._lock:
+            self._conn.execute("DELETE FROM logs WHERE row_id < ?", (row_id,))
+            self._conn.commit()
+        if self._own_records:
+            self.records.drop_before(row_id)
+
+    def _message(self, row_id: int) -> str:
+        # The SQL function message(row_id); called by SQLite with the lock held.
+        column = self.schema.columns.get('message') if self.schema is not None else None
+        if column is None:
+            return ''
+        try:
+            return self.records.field(row_id, column)
+        except IndexError:
+            return ''  # A short irregular row
+
+    def _decode(self, column: str, code: Optional[int]) -> Optional[str]:
+        if code is None:
+            return None
+        return self.records.decode(self.schema.columns[column], code) or None
+
+    def _decoded(self, columns: List[str], rows: List[tuple]) -> List[tuple]:
+        """Result rows with the coded columns turned back into text."""
+        coded = [(index, column) for index, column in enumerate(columns) if column in CODED_COLUMNS]
+        if not coded:
+            return rows
+        decoded = []
+        for row in rows:
+            row = list(row)
+            for index, column in coded:
+                row[index] = self._decode(column, row[index])
+            decoded.append(tuple(row))
+        return decoded
+
+    def _codes(self, column: str, values: List[str]) -> List[int]:
+        """Codes of the stored values of a column equal to any of ``values``, ignoring case."""
+        if not self.schema.has(column) or not self.records.columns:
+            return []
+        wanted = {value.casefold() for value in values}
+        stored = self.records.columns[self.schema.columns[column]].values
+        return [code for code, value in enumerate(stored) if value.casefold() in wanted]
+
+    def has_column(self, column: str) -> bool:
+        """True if the parsed log had a column for this role."""
+        if column in GROUP_EXPRESSIONS or column == 'ts':
+            return self.schema is not None and (self.schema.has('time') or self.schema.has('date'))
+        return self.schema is not None and self.schema.has(column)
+
+    def distinct_values(self, column: str, limit: int = 1000) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT {column} FROM logs WHERE {column} IS NOT NULL LIMIT ?", (limit,)
+            ).fetchall()
+        values = [value for value, in self._decoded([column], rows)]
+        return [value for value in values if value is not None]
+
+    def any_message_contains(self, texts: List[str]) -> bool:
+        """True if at least one message contains all of the texts (case-insensitive)."""
+        conditions = " AND ".join("message(row_id) LIKE ?" for _ in texts) or "1"
+        with self._lock:
+            row = self._conn.execute(f"SELECT 1 FROM logs WHERE {conditions} LIMIT 1",
+                                     [f"%{text}%" for text in texts]).fetchone()
+        return row is not None
+
+    def compile(self, query: StructuredQuery) -> Tuple[str, list]:
+        """Turn a StructuredQuery into parameterized SQL."""
+        conditions, params = [], []
+        for column, values in query.equals.items():
+            if column not in COLUMNS:
+                raise ValueError(f"Unknown column: {column}")
+            if column in CODED_COLUMNS:
+                values = self._codes(column, values)
+                conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+            else:
+                conditions.append(f"{column} COLLATE NOCASE IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        for text in query.message_contains:
+            conditions.append("message(row_id) LIKE ?")
+            params.append(f"%{text}%")
+        if query.last_seconds is not None:
+            conditions.append("ts >= (SELECT MAX(ts) FROM logs) - ?")
+            params.append(query.last_seconds)
+        if query.time_of_day is not None:
+            conditions.append("strftime('%H:%M:%S', ts, 'unixepoch') BETWEEN ? AND ?")
+            params.extend(query.time_of_day)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        if query.aggregate == 'list':
+            return (f"SELECT row_id, ts, host, process, severity, message(row_id) AS message FROM logs{where} "
+                    f"ORDER BY row_id LIMIT ?", params + [query.limit])
+
+        if query.group_by is None:
+            return f"SELECT COUNT(*) AS count FROM logs{where}", params
+
+        key = GROUP_EXPRESSIONS.get(query.group_by, query.group_by)
+        if query.group_by not in GROUP_EXPRESSIONS and (key not in COLUMNS or key == 'message'):
+            raise ValueError(f"Unknown group-by column: {query.group_by}")
+        return (f"SELECT {key} AS {query.group_by}, COUNT(*) AS count FROM logs{where} "
+                f"GROUP BY 1 ORDER BY count DESC, 1 LIMIT ?", params + [query.limit])
+
+    def execute(self, query: StructuredQuery) -> Tuple[List[str], List[tuple]]:
+        """
+        Run a structured query.
+
+        Returns:
+            tuple: (column names, result rows); timestamps are rendered as text
+        """
+        sql, params = self.compile(query)
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+        rows = self._decoded(columns, rows)
+        if 'ts' in columns:
+            ts_index = columns.index('ts')
+            rows = [row[:ts_index] + (format_timestamp(row[ts_index]),) + row[ts_index + 1:] for row in rows]
+        return columns, rows
@@ -0,0 +1,257 @@
+"""
+Helpers for the parsed log records written by parser.py.
+
+Every parser writes its own CSV header. RecordSchema maps those columns onto common
+roles (time, host, process, severity, module, message, pid) and turns the various
+timestamp formats into epoch seconds, so downstream stages can work with any of them.
+"""
+
+import csv
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Candidate column names per role, in order of preference.
+COLUMN_ROLES = {
+    'time': ('Timestamp',),
+    'date': ('Date',),
+    'clock': ('Time',),
+    'host': ('Hostname', 'Host'),
+    'process': ('Process',),
+    'pid': ('PID',),
+    'severity': ('Severity', 'Log Level', 'Level'),
+    'module': ('Module', 'Facility'),
+    'message': ('Message',),
+}
+
+TIMESTAMP_FORMATS = (
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S.%fZ',
+    '%Y-%m-%dT%H:%M:%S',
+    '%b %d %H:%M:%S',
+    '%m/%d/%Y %H:%M:%S',
+)
+
+# Syslog & kernel timestamps carry no year; assume the current one.
+_DEFAULT_YEAR = datetime.now().year
+_last_format = [TIMESTAMP_FORMATS[0]]
+
+
+def parse_timestamp(text: str) -> Optional[float]:
+    """
+    Convert a parsed timestamp into epoch seconds (UTC).
+
+    Args:
+        text: Timestamp as written by a parser. Bare numbers (dmesg time since boot) are
+            returned as-is, which keeps them ordered within a file.
+
+    Returns:
+        float or None if the value is not a recognised timestamp
+    """
+    text = text.strip().strip('[]')
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        pass
+
+    # Files use one format throughout, so try the last one that worked first.
+    text = ' '.join(text.split())
+    for fmt in (_last_format[0], *TIMESTAMP_FORMATS):
+        try:
+            if '%Y' in fmt:
+                parsed = datetime.strptime(text, fmt)
+            else:
+                # Add the year before parsing so that "Feb 29" is valid in leap years.
+                parsed = datetime.strptime(f"{_DEFAULT_YEAR} {text}", f"%Y {fmt}")
+        except ValueError:
+            continue
+        _last_format[0] = fmt
+        return parsed.replace(tzinfo=timezone.utc).timestamp()
+    return None
+
+
+def format_timestamp(epoch: Optional[float]) -> str:
+    if epoch is None:
+        return ''
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class RecordSchema:
+    """Column roles resolved against one parser's CSV header."""
+
+    def __init__(self, header: List[str]):
+        self.header = list(header)
+        self.columns = {}
+        for role, names in COLUMN_ROLES.items():
+            for name in names:
+                if name in self.header:
+                    self.columns[role] = self.header.index(name)
+                    break
+
+    def has(self, role: str) -> bool:
+        return role in self.columns
+
+    def value(self, row: List[str], role: str) -> str:
+        index = self.columns.get(role)
+        if index is None or index >= len(row):
+            return ''
+        return row[index]
+
+    def timestamp(self, row: List[str]) -> Optional[float]:
+        if 'time' in self.columns:
+            return parse_timestamp(self.value(row, 'time'))
+        if 'date' in self.columns:
+            return parse_timestamp(f"{self.value(row, 'date')} {self.value(row, 'clock')}")
+        return None
+
+    def group_key(self, row: List[str]) -> Tuple[str, str]:
+        return self.value(row, 'host'), self.value(row, 'process')
+
+
+def read_parsed_csv(csv_path: str) -> Tuple[RecordSchema, Iterator[List[str]]]:
+    """
+    Open a parsed CSV and return its schema and a lazy iterator over its rows.
+
+    The file stays open until the iterator is exhausted.
+    """
+    csv_file = open(csv_path, 'r', newline='')
+    reader = csv.reader(csv_file)
+    header = next(reader, [])
+
+    def rows():
+        with csv_file:
+            yield from reader
+
+    return RecordSchema(header), rows()
+
+
+class RecordObserver:
+    """
+    Consumer fed the parsed records while a parser runs.
+
+    Index builders and summaries subclass this so they are filled in the same pass
+    that writes the CSV, instead of re-reading it afterwards.
+    """
+
+    def begin(self, header: List[str]) -> None:
+        pass
+
+    def add(self, row: List[str]) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+class ParseCounts(NamedTuple):
+    """What a parser returns: records written (header excluded) and input lines read."""
+    records: int
+    lines: int
+
+
+class RecordWriter:
+    """
+    csv.writer that also forwards the header and every row to record observers.
+
+    A shared record_store.RecordStore goes first among the observers, so the indexes
+    after it find each row already stored.
+    """
+
+    def __init__(self, csv_file, observers=()):
+        self._writer = csv.writer(csv_file)
+        self.observers = list(observers)
+        self._header_seen = False
+        self._written = 0
+        self.lines_read = 0
+
+    @property
+    def rows(self) -> int:
+        """Records written, not counting the header."""
+        return max(0, self._written - 1)
+
+    @property
+    def counts(self) -> "ParseCounts":
+        return ParseCounts(self.rows, self.lines_read)
+
+    def read(self, lines: Iterable[str]) -> Iterator[str]:
+        """Iterate the parser's input, counting lines as they go by (no second pass to count them)."""
+        for line in lines:
+            self.lines_read += 1
+            yield line
+
+    def writerow(self, row) -> None:
+        self._writer.writerow(row)
+        self._written += 1
+        if not self.observers:
+            return
+        # Match what csv.writer writes: None becomes '', everything else str().
+        values = ['' if value is None else str(value) for value in row]
+        if not self._header_seen:
+            self._header_seen = True
+            for observer in self.observers:
+                observer.begin(values)
+        else:
+            for observer in self.observers:
+                observer.add(values)
+
+    def finish(self) -> None:
+        for observer in self.observers:
+            observer.end()
+
+
+def replay_csv(csv_path: str, observers) -> None:
+    """Feed an already written parsed CSV to record observers."""
+    schema, rows = read_parsed_csv(csv_path)
+    for observer in observers:
+        observer.begin(schema.header)
+    for row in rows:
+        for observer in observers:
+            observer.add(row)
+    for observer in observers:
+        observer.end()
+
+
+def _complete_lines(path: str, finished: Callable[[], bool], poll_interval: float) -> Iterator[str]:
+    while not os.path.exists(path):
+        if finished():
+            if not os.path.exists(path):
+                return
+            break
+        time.sleep(poll_interval)
+
+    with open(path, 'r', newline='') as f:
+        partial = ''
+        while True:
+            line = f.readline()
+            if line:
+                # The writer may have flushed half a line; hold it back until the rest arrives.
+                partial += line
+                if partial.endswith('\n'):
+                    yield partial
+                    partial = ''
+                continue
+            if finished():
+                # The writer is done, so everything it wrote is visible now.
+                rest = partial + f.read()
+                yield from rest.splitlines(keepends=True)
+                return
+            time.sleep(poll_interval)
+
+
+def follow_parsed_csv(csv_path: str, finished: Callable[[], bool], poll_interval: float = 0.05) -> Iterator[List[str]]:
+    """
+    Read a parsed CSV while a parser (e.g. in a worker process) is still writing it.
+
+    Args:
+        csv_path: CSV being written
+        finished: Returns True once the writer has closed the file
+        poll_interval: Seconds to wait for more output
+
+    Yields:
+        list: The header, then every row as soon as it is complete
+    """
+    return csv.reader(_complete_lines(csv_path, finished, poll_interval))
@@ -1,10 +1,15 @@
 # ------------------------------------- IMPORT STATEMENTS --------------------------------------------------------------
 
+import os
 import time
 import tempfile
 import streamlit as st
-from helper_functions import (LLM_OPTIONS, greet_user, style_header, file_parser, dynamic_header,
-                              create_vector_embeddings, clear_cache, create_chains, load_llm, validate_log_file)
+import metrics
+from config import INGEST_POLL_SECONDS
+from helper_functions import (LLM_OPTIONS, greet_user, style_header, clear_cache, create_chains, load_llm,
+                              hash_bytes, load_stored_artifacts, answer_structured_query, get_cached_answer,
+                              cache_answer, log_time_range, get_workspace, start_ingest, render_ingest_progress,
+                              finish_ingest, reset_upload, stream_answer)
 
 # ------------------------------------- STREAMLIT UI -------------------------------------------------------------------
 
@@ -33,53 +38,59 @@ uploaded_file = st.sidebar.file_uploader("Upload your Log File here: ", type=["l
 
 load_llm(session=st.session_state)
 
-if "header_rendered" not in st.session_state:
-    dynamic_header(header_text="AI Powered Log Parser")
-
-    # Ensure that this dynamic header doesn't display again,Push it to the session state.
-    st.session_state.header_rendered = True
-else:
-    st.markdown('<h1>AI Powered Log Parser</h1>', unsafe_allow_html=True)
+st.markdown('<h1>AI Powered Log Parser</h1>', unsafe_allow_html=True)
 
 st.header('', divider='violet', anchor=False)
 
-if "greet" not in st.session_state:
-    dynamic_header(header_text=greet_user(), place="sidebar")
-    st.session_state.greet = True
-
-temp_file_path = None
-if uploaded_file is not None:
-    # Create a temporary file and write the uploaded file's content to it
-    if "vectors" not in st.session_state:
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_file.write(uploaded_file.getvalue())
-            temp_file_path = temp_file.name
+st.sidebar.markdown(f'<h1>{greet_user()}</h1>', unsafe_allow_html=True)
 
-if "vectors" not in st.session_state and uploaded_file is not None:
-    is_log_file = validate_log_file(temp_file_path)
-    if is_log_file:
-        display_messages = []
 
-        file_parser(uploaded_file=uploaded_file, file_path=temp_file_path,
-                    display_messages=display_messages, session=st.session_state)
+@st.fragment(run_every=INGEST_POLL_SECONDS)
+def ingest_progress(job):
+    # Re-rendered on its own while the job runs; the whole app reruns once it is done.
+    if job.done:
+        st.rerun()
+    st.caption(f"Processing your Log file... {job.elapsed:.1f} sec.")
+    render_ingest_progress(job)
 
-        with st.spinner("Creating Vector Embeddings..."):
-            create_vector_embeddings(session=st.session_state, file_path=temp_file_path)
 
-        if "vectors" in st.session_state:
-            display_messages.append(st.success("Embeddings are ready.."))
-            create_chains(st.session_state)
-            # Remove the success_msg
-            time.sleep(1)
+upload_hash = hash_bytes(uploaded_file.getvalue()) if uploaded_file is not None else None
+if upload_hash is not None and st.session_state.get("file_hash") not in (None, upload_hash):
+    # Another file was uploaded: drop the previous one's index, or its ingest if that is still running.
+    reset_upload(st.session_state)
 
-        for message in display_messages:
-            message.empty()
-            time.sleep(1)  # Clearing all temporary informative messages.
+if "vectors" not in st.session_state and uploaded_file is not None:
+    ingest_job = st.session_state.get("ingest_job")
+    if ingest_job is not None:
+        if not ingest_job.done:
+            ingest_progress(ingest_job)
+        else:
+            finish_ingest(st.session_state)
+    elif "file_hash" in st.session_state:
+        # This upload was processed already and could not be indexed; don't start over on every rerun.
+        st.warning("Your Log file could not be processed. Please upload another file.")
     else:
-        st.warning("I am a Log Parsing Tool. Please upload only Log files.")
+        # Create a temporary file in this session's workspace and write the uploaded file's content to it
+        with tempfile.NamedTemporaryFile(delete=False, dir=get_workspace(st.session_state).path) as temp_file:
+            temp_file.write(uploaded_file.getvalue())
+            temp_file_path = temp_file.name
+
+        # The job belongs to this upload; it is dropped (see reset_upload) if the file is replaced.
+        st.session_state.file_hash = upload_hash
+        if load_stored_artifacts(session=st.session_state, file_hash=upload_hash):
+            # This exact file was processed before: reuse its parse result & FAISS index.
+            os.unlink(temp_file_path)
+            create_chains(st.session_state)
+        else:
+            # Validation, parsing & embedding run in the background; the UI polls their progress.
+            st.session_state.ingest_job = start_ingest(temp_file_path, upload_hash, get_workspace(st.session_state))
+            ingest_progress(st.session_state.ingest_job)
 
 # User Prompting Part:
 if uploaded_file is not None and "vectors" in st.session_state:
+    if time_range := log_time_range(st.session_state):
+        # Lets users phrase time-window questions ("between 10:02 and 10:05") against the right span.
+        st.sidebar.caption(f"Log time range: {time_range}")
     if user_prompt := st.chat_input("Enter your query: ", key="prompt_for_llm"):
         message_container = st.container(height=500, border=False)
         message_container.empty()
@@ -87,18 +98,44 @@ if uploaded_file is not None and "vectors" in st.session_state:
         message_container.write(user_prompt)
         start_time = time.time()
         try:
-            with st.spinner(text="Generating Response..."):
-                chain = st.session_state.retrieval_chain.pick('answer')
+            # Counting & filtering questions are answered exactly from the local SQL table.
+            structured_answer = answer_structured_query(st.session_state, user_prompt)
             message_container.subheader(":blue[Response:]")
-            message_container.write_stream(chain.stream({'input': user_prompt}))
+            if structured_answer is not None:
+                metrics.inc("chat_queries_total", source="sql")
+                message_container.markdown(structured_answer)
+                message_container.caption("Answered locally from the parsed log.")
+            else:
+                # Repeated questions on the same log are served from the answer cache.
+                cached_answer, query_embedding = get_cached_answer(st.session_state, user_prompt)
+                if cached_answer is not None:
+                    metrics.inc("chat_queries_total", source="cache")
+                    message_container.write(cached_answer)
+                    message_container.caption("Answered from cache.")
+                else:
+                    metrics.inc("chat_queries_total", source="rag")
+                    model = LLM_OPTIONS[st.session_state.selected_llm]
+                    # Retrieval + streamed LLM generation (retried & its tokens counted by stream_answer)
+                    with metrics.span("rag_answer", model=model):
+                        answer = message_container.write_stream(
+                            stream_answer(st.session_state.retrieval_chain, user_prompt, model=model))
+                    cache_answer(st.session_state, user_prompt, answer, query_embedding)
             st.sidebar.subheader("\n\n\n:green[Response Time : ]" + " " +
                                  str(round((time.time() - start_time), 2)) + " sec.")
         except Exception as e:
             message_container.empty()
             message_container.error("There was an error generating response. Please try again later." + " " + str(e))
 
+if metrics.enabled():
+    with st.sidebar.expander("Pipeline metrics"):
+        # Stage timings & counters of this app process (parse, LLM calls, embedding, retrieval, ...).
+        st.json(metrics.REGISTRY.snapshot(), expanded=False)
+        st.download_button("Download (Prometheus format)", data=metrics.REGISTRY.to_prometheus(),
+                           file_name="log_parser_metrics.prom", mime="text/plain")
+
 # This block is to remove the chains, retrievers & embeddings from the session when a user removes their log file.
 if uploaded_file is None:
     st.warning("Please upload your Log file before asking questions.")
-    if "vectors" in st.session_state:
+    # Also while an ingest is still running or after one failed, so its job & files don't linger.
+    if "file_hash" in st.session_state or "workspace" in st.session_state:
         clear_cache(session=st.session_state)
@@ -0,0 +1,239 @@
+"""
+Lightweight instrumentation of the log pipeline.
+
+Spans time a block of work (parsing, LLM calls, classifier predictions, embedding
+batches, retrieval) and counters count events (lines parsed, tokens, retries). Both
+carry labels and are kept in a process-wide registry that exports JSON and the
+Prometheus text format.
+
+When METRICS_ENABLED is off, span() returns a shared no-op object and the counter
+functions return at once, so instrumented code pays a single flag check.
+"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import METRICS_ENABLED
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_enabled = METRICS_ENABLED
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Summary:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._gauges: Dict[Tuple[str, LabelKey], float] = {}
+        self._summaries: Dict[Tuple[str, LabelKey], _Summary] = {}
+
+    def inc(self, name: str, value: float, labels: Dict[str, Any]) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, labels: Dict[str, Any]) -> None:
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name: str, value: float, labels: Dict[str, Any]) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = _Summary()
+            summary.add(value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """All metrics as plain data (JSON-serializable and picklable)."""
+        with self._lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self._counters.items())],
+                "gauges": [{"name": name, "labels": dict(labels), "value": value}
+                           for (name, labels), value in sorted(self._gauges.items())],
+                "summaries": [{"name": name, "labels": dict(labels), "count": summary.count,
+                               "sum": summary.total, "max": summary.max}
+                              for (name, labels), summary in sorted(self._summaries.items())],
+            }
+
+    def merge(self, snapshot: Dict[str, List[Dict[str, Any]]]) -> None:
+        """Add a snapshot taken in another process (e.g. a parse worker)."""
+        with self._lock:
+            for item in snapshot.get("counters", ()):
+                key = (item["name"], _label_key(item["labels"]))
+                self._counters[key] = self._counters.get(key, 0.0) + item["value"]
+            for item in snapshot.get("gauges", ()):
+                self._gauges[(item["name"], _label_key(item["labels"]))] = item["value"]
+            for item in snapshot.get("summaries", ()):
+                key = (item["name"], _label_key(item["labels"]))
+                summary = self._summaries.get(key)
+                if summary is None:
+                    summary = self._summaries[key] = _Summary()
+                summary.count += item["count"]
+                summary.total += item["sum"]
+                summary.max = max(summary.max, item["max"])
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines: List[str] = []
+        typed = set()
+
+        def sample(name: str, labels: Dict[str, str], value: float) -> str:
+            if not labels:
+                return f"{name} {value:g}"
+            rendered = ",".join(f'{label}="{_escape(text)}"' for label, text in labels.items())
+            return f"{name}{{{rendered}}} {value:g}"
+
+        def declare(name: str, kind: str) -> None:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for item in snapshot["counters"]:
+            declare(item["name"], "counter")
+            lines.append(sample(item["name"], item["labels"], item["value"]))
+        for item in snapshot["gauges"]:
+            declare(item["name"], "gauge")
+            lines.append(sample(item["name"], item["labels"], item["value"]))
+        for item in snapshot["summaries"]:
+            declare(item["name"], "summary")
+            lines.append(sample(f"{item['name']}_count", item["labels"], item["count"]))
+            lines.append(sample(f"{item['name']}_sum", item["labels"], item["sum"]))
+            declare(f"{item['name']}_max", "gauge")
+            lines.append(sample(f"{item['name']}_max", item["labels"], item["max"]))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(flag: bool) -> None:
+    global _enabled
+    _enabled = flag
+
+
+def inc(name: str, value: float = 1.0, **labels: Any) -> None:
+    if _enabled:
+        REGISTRY.inc(name, value, labels)
+
+
+def set_gauge(name: str, value: float, **labels: Any) -> None:
+    if _enabled:
+        REGISTRY.set(name, value, labels)
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    if _enabled:
+        REGISTRY.observe(name, value, labels)
+
+
+class Span:
+    """Times a block; recorded as the ``<name>_seconds`` summary, errors as ``<name>_errors_total``."""
+
+    __slots__ = ("name", "labels", "started", "finished")
+
+    def __init__(self, name: str, labels: Dict[str, Any]) -> None:
+        self.name = name
+        self.labels = labels
+        self.started = 0.0
+        self.finished: Optional[float] = None
+
+    def label(self, **labels: Any) -> None:
+        """Add labels only known inside the block (e.g. which retrieval path was taken)."""
+        self.labels.update(labels)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def __enter__(self) -> "Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.finished = time.perf_counter()
+        REGISTRY.observe(f"{self.name}_seconds", self.elapsed, self.labels)
+        if exc_type is not None:
+            REGISTRY.inc(f"{self.name}_errors_total", 1.0, self.labels)
+
+
+class _NoopSpan:
+    __slots__ = ()
+    elapsed = 0.0
+
+    def label(self, **labels: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **labels: Any):
+    return Span(name, labels) if _enabled else _NOOP_SPAN
+
+
+def record_llm_usage(message: Any, **labels: Any) -> None:
+    """Count the prompt & completion tokens reported on a LangChain chat response."""
+    if not _enabled:
+        return
+    usage = getattr(message, "usage_metadata", None) or {}
+    REGISTRY.inc("llm_input_tokens_total", float(usage.get("input_tokens", 0)), labels)
+    REGISTRY.inc("llm_output_tokens_total", float(usage.get("output_tokens", 0)), labels)
+
+
+def collect(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Tuple[Any, Optional[Dict[str, list]]]:
+    """
+    Run ``fn`` in a worker process and return its result with the metrics it recorded.
+
+    Submit this to a process pool instead of ``fn`` and merge the snapshot into the
+    parent's REGISTRY.
+    """
+    if not _enabled:
+        return fn(*args, **kwargs), None
+    REGISTRY.reset()
+    result = fn(*args, **kwargs)
+    return result, REGISTRY.snapshot()
@@ -1,17 +1,25 @@
 import re
-import csv
 from datetime import datetime
+import metrics
+from cascade import GENERIC_PARSER, LLM_PARSER, classify_log
+from classifier import LEVEL_PATTERN, TIMESTAMP_PATTERNS
+from config import CSV_OUTPUT_PATH
+from llm_classifier import get_log_sample, llm_based_parser
+from log_records import RecordWriter, replay_csv
 
 kernel_log_pattern = r'^(\w+\s+\d+\s+\d+:\d+:\d+)\s+(\w+)\s+(\w+):\s+\[([\d\s.]+)\]\s+(.*)$'
 dmesg_log_pattern = re.compile(r'(\w+)\s*:\s*(\w+)\s*:\s*\[(.*?)\]\s*(.*)')
+# parse_syslogs needs "Mon DD HH:MM:SS host process[pid]: message"
+syslog_signature_pattern = re.compile(r'^\w{3}\s+\d{1,2}\s+\d{2}:\d{2}:\d{2}\s+\S+\s+\S+\[\d+\]:?\s')
 
 
-def dmesg_parser(log_file_path, csv_file_path = "./parsed_log_data.csv"):
+def dmesg_parser(log_file_path, csv_file_path = CSV_OUTPUT_PATH, observers=()):
     with open(log_file_path, 'r') as infile, open(csv_file_path, 'w', newline='') as outfile:
-        csv_writer = csv.writer(outfile)
+        csv_writer = RecordWriter(outfile, observers)
         csv_writer.writerow(['Facility', 'Severity', 'Timestamp', 'Message'])  # CSV Header
 
-        for line in infile:
+        for line in csv_writer.read(infile):
+            parsed_entry = None
             match = dmesg_log_pattern.match(line.strip())
             if match:
                 facility, severity, timestamp, message = match.groups()
@@ -19,19 +27,23 @@ def dmesg_parser(log_file_path, csv_file_path = "./parsed_log_data.csv"):
             if parsed_entry:
                 csv_writer.writerow(parsed_entry)
 
+        csv_writer.finish()
+    return csv_writer.counts
 
-def kernel_parser(log_file_path, csv_file_path = "./parsed_log_data.csv"):
+
+def kernel_parser(log_file_path, csv_file_path = CSV_OUTPUT_PATH, observers=()):
     # Open the log file and the output CSV file
     with open(log_file_path, 'r') as log_file, open(csv_file_path, 'w', newline='') as csv_file:
-        # Create a CSV writer object
-        csv_writer = csv.writer(csv_file)
+        # Create a CSV writer object (also feeds the rows to any observers)
+        csv_writer = RecordWriter(csv_file, observers)
 
         # Write the header row
         header = ['Timestamp', 'Hostname', 'Process', 'Time_since_boot', 'Module', 'Message']
         csv_writer.writerow(header)
 
         # Parse each log line and write it to the CSV file
-        for line in log_file:
+        for line in csv_writer.read(log_file):
+            parsed_line = None
             # Define the regular expression pattern
             match = re.match(kernel_log_pattern, line.strip())
 
@@ -58,20 +70,23 @@ def kernel_parser(log_file_path, csv_file_path = "./parsed_log_data.csv"):
             if parsed_line:
                 csv_writer.writerow(parsed_line)
 
+        csv_writer.finish()
+    return csv_writer.counts
+
 
-def parse_syslogs(log_file_path, csv_file_path = "./parsed_log_data.csv"):
+def parse_syslogs(log_file_path, csv_file_path = CSV_OUTPUT_PATH, observers=()):
     # Open the log file for reading
     with open(log_file_path, 'r') as log_file:
         # Open the output CSV file for writing
         with open(csv_file_path, 'w', newline='') as csv_file:
             fieldnames = ['Date', 'Time', 'Host', 'Process', 'PID', 'Message']
-            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+            writer = RecordWriter(csv_file, observers)
 
             # Write the header row
-            writer.writeheader()
+            writer.writerow(fieldnames)
 
             # Iterate over each line in the log file
-            for line in log_file:
+            for line in writer.read(log_file):
                 parts = line.strip().split()
                 if len(parts) >= 6:
                     date_parts = parts[0:3]
@@ -88,29 +103,32 @@ def parse_syslogs(log_file_path, csv_file_path = "./parsed_log_data.csv"):
                     log_datetime = datetime.strptime(f"{log_date} {log_time}", "%b %d %H:%M:%S")
 
                     # Write the log entry to the CSV file
-                    writer.writerow({
-                        'Date': log_datetime.date().strftime("%b %d"),
-                        'Time': log_datetime.time(),
-                        'Host': host,
-                        'Process': process,
-                        'PID': pid.rstrip(']:'),  # Remove the closing bracket from the PID
-                        'Message': message
-                    })
+                    writer.writerow([
+                        log_datetime.date().strftime("%b %d"),
+                        log_datetime.time(),
+                        host,
+                        process,
+                        pid.rstrip(']:'),  # Remove the closing bracket from the PID
+                        message
+                    ])
+
+            writer.finish()
     print("Successfully parsed Sys-logs")
+    return writer.counts
 
 
-def ovs_parser(log_file_path, csv_file_path = "./parsed_log_data.csv"):
+def ovs_parser(log_file_path, csv_file_path = CSV_OUTPUT_PATH, observers=()):
     # Open the log file and the output CSV file
     with open(log_file_path, 'r') as log_file, open(csv_file_path, 'w', newline='') as csv_file:
-        # Create a CSV writer object
-        csv_writer = csv.writer(csv_file)
+        # Create a CSV writer object (also feeds the rows to any observers)
+        csv_writer = RecordWriter(csv_file, observers)
 
         # Write the header row
         header = ['Timestamp', 'Sequence No', 'Module', 'Log Level', 'Message']
         csv_writer.writerow(header)
 
         # Parse each log line and write it to the CSV file
-        for line in log_file:
+        for line in csv_writer.read(log_file):
             # Split the line into parts
             parts = line.strip().split('|')
 
@@ -130,50 +148,105 @@ def ovs_parser(log_file_path, csv_file_path = "./parsed_log_data.csv"):
             parsed_line = [formatted_timestamp, sequence_no, module, log_level, message]
             csv_writer.writerow(parsed_line)
 
+        csv_writer.finish()
+
     print("Successfully parsed OVS logs")
+    return csv_writer.counts
+
+
+def generic_parser(log_file_path, csv_file_path = CSV_OUTPUT_PATH, observers=()):
+    # Used for logs the ML classifier recognises but no regex signature matches:
+    # pull out whatever timestamp and level each line has and keep the rest as the message.
+    with open(log_file_path, 'r') as log_file, open(csv_file_path, 'w', newline='') as csv_file:
+        csv_writer = RecordWriter(csv_file, observers)
+        csv_writer.writerow(['Timestamp', 'Level', 'Message'])
+
+        for line in csv_writer.read(log_file):
+            line = line.strip()
+            if not line:
+                continue
+
+            timestamp = ''
+            for pattern in TIMESTAMP_PATTERNS:
+                timestamp_match = pattern.search(line)
+                if timestamp_match:
+                    timestamp = timestamp_match.group(0)
+                    break
+
+            level_match = LEVEL_PATTERN.search(line)
+            level = level_match.group(0).upper() if level_match else ''
+
+            csv_writer.writerow([timestamp, level, line])
+
+        csv_writer.finish()
 
+    print("Successfully parsed generic logs")
+    return csv_writer.counts
 
-def parse_log(input_file_path):
+
+# Regex tier of the classification cascade, in priority order.
+REGEX_SIGNATURES = {
+    'Kernel': lambda line: re.match(kernel_log_pattern, line) is not None,
+    'DMESG': lambda line: dmesg_log_pattern.match(line) is not None,
+    'OVS': lambda line: len(line.split('|')) == 5,
+    'Sys': lambda line: syslog_signature_pattern.match(line) is not None,
+}
+
+PARSERS = {
+    'Kernel': kernel_parser,
+    'DMESG': dmesg_parser,
+    'OVS': ovs_parser,
+    'Sys': parse_syslogs,
+    GENERIC_PARSER: generic_parser,
+}
+
+
+def classify_log_file(input_file_path, groq_api_key=None, classifier=None):
+    # Regex signatures first, then the local model, and the LLM only if both are unsure.
+    return classify_log(get_log_sample(input_file_path), REGEX_SIGNATURES, groq_api_key=groq_api_key,
+                        classifier=classifier)
+
+
+def _record_parse_metrics(parser, counts, seconds):
+    # counts is the parser's ParseCounts, counted in its read loop; the LLM parser returns none.
+    if counts is None:
+        return
+    metrics.inc('parse_lines_total', counts.lines, parser=parser)
+    metrics.inc('parse_records_total', counts.records, parser=parser)
+    metrics.inc('parse_skipped_lines_total', max(0, counts.lines - counts.records), parser=parser)
+    if seconds > 0:
+        metrics.set_gauge('parse_lines_per_second', counts.lines / seconds, parser=parser)
+
+
+def parse_log(input_file_path, csv_file_path=CSV_OUTPUT_PATH, groq_api_key=None, decision=None, observers=()):
+    # observers (log_records.RecordObserver) receive every parsed row, e.g. to build indexes while parsing.
 
     msg = "success"
 
-    # Regex-based parsing (original logic or fallback)
-    with open(input_file_path) as input_file:
-        first_line = input_file.readline()
-
-    if re.match(kernel_log_pattern, first_line.strip()):
-        type_of_log = 'Kernel'
-        print("Detected Kernel Log.")
-        try:
-            kernel_parser(input_file_path)
-        except:
-            msg = "ERR"
-
-    elif dmesg_log_pattern.match(first_line.strip()):
-        type_of_log = 'DMESG'
-        print("Detected DMESG Log.")
-        try:
-            dmesg_parser(input_file_path)
-        except:
-            msg = "ERR"
-
-    elif len(first_line.strip().split('|')) == 5:
-        type_of_log = 'OVS'
-        print("Detected OVS Logs")
-        try:
-            ovs_parser(input_file_path)
-        except:
-            msg = "ERR"
-
-    elif len(first_line.strip().split()) >= 6:
-        try:
-            parse_syslogs(input_file_path)
-            type_of_log = 'Sys'
-            print("Detected SysLog")
-        except:
-            msg = 'ERR'
-        
-        print("Not a log.")
+    if decision is None:
+        decision = classify_log_file(input_file_path, groq_api_key=groq_api_key)
+
+    if decision.log_type is None:
+        print(f"Not a log. ({decision.tier} tier, {decision.latency_ms:.1f} ms)")
         return None, None
 
+    type_of_log = decision.log_type
+    print(f"Detected {type_of_log} Log. ({decision.tier} tier, {decision.latency_ms:.1f} ms)")
+
+    try:
+        counts = None
+        with metrics.span('parse', parser=decision.parser) as parse_span:
+            if decision.parser == LLM_PARSER:
+                if not llm_based_parser(input_file_path, decision.classification, groq_api_key, csv_file_path):
+                    msg = "ERR"
+                elif observers:
+                    # The LLM parser writes its CSV directly, so feed the observers from the result.
+                    replay_csv(csv_file_path, observers)
+            else:
+                counts = PARSERS[decision.parser](input_file_path, csv_file_path, observers)
+        if metrics.enabled() and msg == "success":
+            _record_parse_metrics(decision.parser, counts, parse_span.elapsed)
+    except Exception:
+        msg = "ERR"
+
     return type_of_log, msg
@@ -0,0 +1,200 @@
+"""
+Routing of chat questions between the local SQL engine and RAG.
+
+Aggregate and filter questions ("how many ERROR lines per host in the last hour",
+"list warnings from sshd between 10:02 and 10:05") are translated into a
+StructuredQuery and answered exactly from the LogDatabase. Everything else goes to
+the retrieval chain; broad questions about the whole log are recognised by
+is_overview_question() and answered from the parse-time rollup summary.
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+from log_query import LogDatabase, StructuredQuery
+
+COUNT_PATTERN = re.compile(r"\b(how many|count|number of|how often|frequency)\b")
+LIST_VERB_PATTERN = re.compile(r"\b(list|show|display|find|give me)\b")
+LIST_PATTERN = re.compile(LIST_VERB_PATTERN.pattern + r".*\b(lines?|entries|logs?|messages?|events?|records?)\b")
+GROUP_PATTERN = re.compile(
+    r"\b(?:per|by|for each|each|grouped by)\s+(host|hostname|process|severity|level|module|facility|minute|hour)s?\b"
+)
+TOP_PATTERN = re.compile(r"\btop\s+(\d+)?\s*(host|hostname|process|severity|level|module|facility)(?:e?s)?\b")
+LAST_PATTERN = re.compile(r"\b(?:last|past)\s+(\d+)?\s*(second|sec|minute|min|hour|hr|day)s?\b")
+BETWEEN_PATTERN = re.compile(r"\bbetween\s+(\d{1,2}:\d{2}(?::\d{2})?)\s+and\s+(\d{1,2}:\d{2}(?::\d{2})?)")
+OVERVIEW_PATTERN = re.compile(
+    r"\b(overview|summary|summari[sz]e|overall|health|healthy|big picture|going (on|wrong)|what happened"
+    r"|main (issues?|problems?|errors?)|key (issues?|events?)|anything (unusual|wrong|abnormal))\b"
+)
+QUOTED_PATTERN = re.compile(r'"([^"]+)"|\'([^\']+)\'')
+WORD_PATTERN = re.compile(r"[\w.\-/]+")
+
+# Words that carry no filter meaning in an aggregate question.
+STOPWORDS = frozenset("""
+a all an and any are at between by count did do does during each entries entry events event find for from get give
+grouped happened has have how in is it last lines line list log logs many me message messages minute minutes hour
+hours day days second seconds sec min hr of on or occurred occur past per print record records show display the
+there this time times top total was were what when which with within number often frequency appear appeared
+host hosts hostname process processes severity level levels module modules facility
+""".split())
+# More unrecognised words than this and the question is not a plain filter: use RAG.
+MAX_MESSAGE_KEYWORDS = 2
+# Columns whose values are recognised in questions rather than searched for in the message.
+VALUE_COLUMNS = ('host', 'process', 'module')
+
+COLUMN_ALIASES = {'hostname': 'host', 'level': 'severity', 'facility': 'module'}
+UNIT_SECONDS = {'second': 1, 'sec': 1, 'minute': 60, 'min': 60, 'hour': 3600, 'hr': 3600, 'day': 86400}
+
+# Severity words in questions and the column values they stand for.
+SEVERITY_VALUES = {
+    'error': ['ERROR', 'ERR'],
+    'errors': ['ERROR', 'ERR'],
+    'warning': ['WARNING', 'WARN'],
+    'warnings': ['WARNING', 'WARN'],
+    'warn': ['WARNING', 'WARN'],
+    'info': ['INFO'],
+    'debug': ['DEBUG', 'DBG'],
+    'critical': ['CRITICAL', 'CRIT'],
+    'fatal': ['FATAL'],
+    'emergency': ['EMERG'],
+    'alert': ['ALERT'],
+    'notice': ['NOTICE'],
+}
+
+
+def _clock(text: str) -> str:
+    parts = text.split(':')
+    parts += ['00'] * (3 - len(parts))
+    return ':'.join(part.zfill(2) for part in parts)
+
+
+def time_filters(question: str) -> Tuple[Optional[int], Optional[Tuple[str, str]]]:
+    """
+    Extract the time window of a question.
+
+    Returns:
+        tuple: (seconds for "last N minutes", ('HH:MM:SS', 'HH:MM:SS') for "between A and B"); None if absent
+    """
+    lower = question.lower()
+    last = LAST_PATTERN.search(lower)
+    between = BETWEEN_PATTERN.search(lower)
+    last_seconds = int(last.group(1) or 1) * UNIT_SECONDS[last.group(2)] if last else None
+    time_of_day = (_clock(between.group(1)), _clock(between.group(2))) if between else None
+    return last_seconds, time_of_day
+
+
+def is_overview_question(question: str) -> bool:
+    """True for broad questions about the whole log ("what's going wrong on this host?")."""
+    return bool(OVERVIEW_PATTERN.search(question.lower()))
+
+
+def _matching_values(words: List[str], database: LogDatabase, column: str) -> List[str]:
+    if not database.has_column(column):
+        return []
+    known = {value.lower(): value for value in database.distinct_values(column)}
+    return [known[word] for word in words if word in known]
+
+
+def route_query(question: str, database: LogDatabase) -> Optional[StructuredQuery]:
+    """
+    Translate an aggregate/filter question into a StructuredQuery.
+
+    Args:
+        question: User question
+        database: LogDatabase of the uploaded log (used to recognise host/process names)
+
+    Returns:
+        StructuredQuery, or None if the question should go to RAG
+    """
+    lower = question.lower()
+    query = StructuredQuery()
+
+    group = GROUP_PATTERN.search(lower)
+    top = TOP_PATTERN.search(lower)
+    if group:
+        query.group_by = COLUMN_ALIASES.get(group.group(1), group.group(1))
+    elif top:
+        query.group_by = COLUMN_ALIASES.get(top.group(2), top.group(2))
+        if top.group(1):
+            query.limit = int(top.group(1))
+
+    if COUNT_PATTERN.search(lower) or query.group_by:
+        query.aggregate = 'count'
+    elif LIST_PATTERN.search(lower):
+        query.aggregate = 'list'
+    elif LIST_VERB_PATTERN.search(lower) and (time_filters(lower) != (None, None)
+                                              or any(word in SEVERITY_VALUES for word in WORD_PATTERN.findall(lower))):
+        # "list warnings between 10:02 and 10:05": the severity or time window says what to list.
+        query.aggregate = 'list'
+    else:
+        return None
+
+    if query.group_by and not database.has_column(query.group_by):
+        return None
+
+    # Time filters
+    query.last_seconds, query.time_of_day = time_filters(lower)
+    if (query.last_seconds or query.time_of_day) and not database.has_column('ts'):
+        return None
+
+    # Quoted text must appear in the message
+    for match in QUOTED_PATTERN.finditer(question):
+        query.message_contains.append(match.group(1) or match.group(2))
+
+    words = WORD_PATTERN.findall(QUOTED_PATTERN.sub(' ', lower))
+
+    # Severity filter: the severity column if the log has one, otherwise the message text
+    for word in words:
+        if word in SEVERITY_VALUES and query.group_by != 'severity':
+            if database.has_column('severity'):
+                query.equals.setdefault('severity', []).extend(SEVERITY_VALUES[word])
+            else:
+                query.message_contains.append(word.rstrip('s'))
+
+    # Host / process filters: words that are known values of those columns
+    recognised = set(SEVERITY_VALUES)
+    for column in ('host', 'process'):
+        if query.group_by != column:
+            values = _matching_values(words, database, column)
+            if values:
+                query.equals[column] = values
+                recognised.update(value.lower() for value in values)
+
+    # Remaining content words ("how many panics") must appear in the message.
+    keywords = [word for word in words
+                if word not in STOPWORDS and word not in recognised and not word[0].isdigit()]
+    if len(keywords) > MAX_MESSAGE_KEYWORDS:
+        return None
+    if any(_matching_values(keywords, database, column) for column in VALUE_COLUMNS):
+        # A value of a column the question does not filter on (e.g. a module) is not message text.
+        return None
+    keywords = [word[:-1] if len(word) > 3 and word.endswith('s') else word for word in keywords]
+    if keywords and not database.any_message_contains(keywords):
+        # No message has these words, so they are not the filter the user meant ("kernel panics" in a
+        # log whose lines say "Oops"); RAG interprets the question instead of answering 0.
+        return None
+    query.message_contains.extend(keywords)
+
+    if query.aggregate == 'list' and not (query.equals or query.message_contains
+                                          or query.last_seconds or query.time_of_day):
+        # An unfiltered "show me the logs" is better served by RAG.
+        return None
+    return query
+
+
+def format_result(query: StructuredQuery, columns: List[str], rows: List[tuple]) -> str:
+    """Render a structured query result as markdown."""
+    if query.aggregate == 'count' and query.group_by is None:
+        return f"**{rows[0][0]}** matching log lines."
+    if not rows:
+        return "**No matching log lines.**"
+
+    header = "| " + " | ".join(columns) + " |"
+    divider = "| " + " | ".join("---" for _ in columns) + " |"
+    body = ["| " + " | ".join("" if value is None else str(value).replace("|", "\\|") for value in row) + " |"
+            for row in rows]
+    if query.aggregate == 'count':
+        summary = f"Matching log lines by **{query.group_by}**:"
+    else:
+        summary = f"**{len(rows)}** matching log lines" + (" (first ones shown):" if len(rows) >= query.limit else ":")
+    return "\n".join([summary, "", header, divider, *body])
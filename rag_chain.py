@@ -0,0 +1,119 @@
+"""
+The retrieval-augmented answer chain.
+
+The app builds it over a session's indexes (helper_functions.create_chains) and
+llm_benchmark.py over a generated log, so both run the same retrieval, context
+compression and prompt. Nothing here needs Streamlit or API keys. The token usage of
+every answer is counted like that of the other LLM calls, and stream_answer() retries
+an answer that fails before its first token.
+"""
+
+import time
+from operator import itemgetter
+
+from langchain_classic.chains import create_retrieval_chain
+from langchain_classic.chains.combine_documents import create_stuff_documents_chain
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+import metrics
+from config import LLM_MAX_RETRIES, VECTOR_RETRIEVAL_K
+from context_compression import ContextCompressor
+from retrieval import HybridRetriever
+
+# ------------------------------------- DEFINE PROMPT TEMPLATE ---------------------------------------------------------
+prompt_template = ChatPromptTemplate.from_messages(
+    [
+        ("system", """You are an advanced AI assistant integrated with a RAG (Retrieval-Augmented Generation) system, 
+        "specialized in log analysis. Suggest next steps or further investigations when appropriate. If you don't 
+        know the answer just say that you don't know.Don't try to make up an answer based on your assumptions. 
+        
+        "Response Format: Structure your responses clearly, using sections or bullet points for complex analyses. 
+        Include the log entry which supports your answer. Include relevant log messages when explaining your 
+        findings. Clearly distinguish between information from logs, retrieved knowledge, and your own analysis. 
+        Provide the final answer to the question first in bold. Clarification and Precision: If log formats or 
+        contents are unclear, ask for clarification. If the user greets you,just greet them back & introduce yourself 
+        in short.Don't analyze data at that time. If the user asks you some questions that are not based on Logs.Then 
+        simply don't answer them.In that case tell them you are a Log analyzing agent & at that time don't analyze 
+        any data.
+        Don't answer any questions irrelevant to logs.In that case you just introduce yourself & don't analyze the log data at that time.
+        """
+         ),
+        ("user", "The Log Data is as follows : {context}. User Question : {input}")
+    ]
+)
+
+
+class _AnswerUsage(BaseCallbackHandler):
+    """Counts the tokens of a streamed answer, reported on the message once the model call ends."""
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, 'message', None)
+                if message is not None:
+                    metrics.record_llm_usage(message, purpose='answer', model=self.model)
+
+
+def build_retrieval_chain(llm, vectors, bm25_index=None, template_index=None, time_index=None, log_rollup=None):
+    """
+    Retriever, context compressor & stuff-documents prompt, linked into one chain.
+
+    Args:
+        llm: Chat model that writes the answer
+        vectors: FAISS vector store of the log's chunks (or templates)
+        bm25_index: BM25Index of the parsed records; None for unparsed uploads
+        template_index: TemplateIndex, if the vectors are one per message template
+        time_index: TimeIndex, for questions with a time window
+        log_rollup: LogRollup, summarized for overview questions
+
+    Returns:
+        Runnable taking {'input': question} and returning the retrieved 'context' & the 'answer'
+    """
+    llm = llm.with_config(callbacks=[_AnswerUsage(getattr(llm, 'model_name', ''))])
+    # Create a chain for LLM & Prompt Template to inject to LLM for inferencing
+    document_chain = create_stuff_documents_chain(llm=llm, prompt=prompt_template)
+
+    if bm25_index is not None:
+        # Parsed logs: exact identifier lookups from the inverted index, otherwise BM25 + vector fusion.
+        retriever = HybridRetriever(vectorstore=vectors, index=bm25_index, templates=template_index,
+                                    time_index=time_index, rollup=log_rollup)
+    else:
+        # Creating a retriever to fetch the top chunks related to User_Prompt by making similarity search.
+        retriever = vectors.as_retriever(search_kwargs={'k': VECTOR_RETRIEVAL_K})
+
+    # Duplicate rows, repeated headers & constant columns are dropped and the rest fit to a token budget.
+    compressor = ContextCompressor(header=bm25_index.header if bm25_index is not None else None)
+    # create_retrieval_chain hands a retriever that is not a BaseRetriever the whole input dict.
+    retriever = RunnableLambda(itemgetter("input")) | retriever | RunnableLambda(compressor.compress)
+
+    # Create a retrieval chain which links the retriever & document chain
+    return create_retrieval_chain(retriever, document_chain)
+
+
+def stream_answer(chain, question: str, model: str = '', max_retries: int = LLM_MAX_RETRIES):
+    """
+    Stream the answer of a retrieval chain to a question.
+
+    A call that fails before its first token is retried with exponential backoff and
+    counted in ``llm_retries_total``; once text was shown, a failure is raised as is.
+    Build the chain's model with ``max_retries=0`` so the client does not retry on its own.
+    """
+    answer_chain = chain.pick('answer')
+    for attempt in range(max_retries + 1):
+        streamed = False
+        try:
+            for chunk in answer_chain.stream({'input': question}):
+                streamed = True
+                yield chunk
+            return
+        except Exception:
+            if streamed or attempt == max_retries:
+                raise
+            metrics.inc('llm_retries_total', purpose='answer', model=model)
+            # Exponential backoff, typically for provider rate limits.
+            time.sleep(2 ** attempt)
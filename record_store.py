@@ -0,0 +1,338 @@
+"""
+Compact in-memory store of parsed log records, shared by the indexes over them.
+
+A parsed row as a list of Python strings costs a separate object per field, although
+hosts, processes, modules and severities repeat on almost every line. RecordStore is
+a RecordObserver that keeps the records column by column instead: categorical
+columns are dictionary-encoded (one integer code per row in a typed array), PIDs,
+sequence numbers and time since boot are stored as numbers in typed arrays, and only
+free text such as the message stays a string per row. Rows are read back through
+lightweight RecordView objects and render exactly as the parser wrote them.
+
+One store holds the rows of a parsed log for every index built over it: it is passed
+to BM25Index, TemplateIndex, LogRollup and LogDatabase, which refer to records by row
+id and to categorical values by code instead of keeping their own copies. It goes
+first among the observers, so a parser's RecordWriter (or the app's ingest job)
+has stored a row before the indexes see it.
+"""
+
+import csv
+import io
+import sys
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+from log_records import COLUMN_ROLES, RecordObserver, RecordSchema, replay_csv
+
+# Columns with few distinct values, stored as codes into a table of values. Includes every
+# column of the host/process/severity/module roles, whose codes the other indexes keep.
+CODED_ROLES = ('host', 'process', 'severity', 'module')
+CATEGORICAL_COLUMNS = frozenset({'Date', *(name for role in CODED_ROLES for name in COLUMN_ROLES[role])})
+INTEGER_COLUMNS = frozenset({'PID', 'Sequence No'})
+DECIMAL_COLUMNS = frozenset({'Time_since_boot'})
+# Numeric in some logs only (dmesg timestamps are seconds since boot); decided by the first row.
+MAYBE_DECIMAL_COLUMNS = frozenset({'Timestamp'})
+
+
+class _TextColumn:
+    __slots__ = ('values', '_last')
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._last = None
+
+    def append(self, value: str) -> None:
+        # Consecutive rows often share a value (e.g. the timestamp of a burst); share the object.
+        if value == self._last:
+            value = self._last
+        self._last = value
+        self.values.append(value)
+
+    def __getitem__(self, row_id: int) -> str:
+        return self.values[row_id]
+
+    def drop_front(self, count: int) -> None:
+        del self.values[:count]
+
+    def nbytes(self) -> int:
+        unique = {id(value): value for value in self.values}
+        return sys.getsizeof(self.values) + sum(sys.getsizeof(value) for value in unique.values())
+
+
+class _CategoricalColumn:
+    """Dictionary encoding: 2-byte codes, widened to 4 bytes past 65536 distinct values."""
+
+    __slots__ = ('codes', 'values', '_lookup')
+
+    def __init__(self):
+        self.codes = array('H')
+        self.values: List[str] = []
+        self._lookup: Dict[str, int] = {}
+
+    def append(self, value: str) -> None:
+        self.codes.append(self.intern(value))
+
+    def __getitem__(self, row_id: int) -> str:
+        return self.values[self.codes[row_id]]
+
+    def code(self, value: str) -> Optional[int]:
+        return self._lookup.get(value)
+
+    def drop_front(self, count: int) -> None:
+        # The value table is kept: codes stay valid for the indexes that hold them.
+        del self.codes[:count]
+
+    def intern(self, value: str) -> int:
+        """Code of a value, adding it to the table (without a row) if it is new."""
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self.values)
+            self.values.append(value)
+            if code > 0xFFFF and self.codes.typecode == 'H':
+                self.codes = array('I', self.codes)
+        return code
+
+    def nbytes(self) -> int:
+        return (self.codes.itemsize * len(self.codes) + sys.getsizeof(self.values)
+                + sum(sys.getsizeof(value) for value in self.values) + sys.getsizeof(self._lookup))
+
+
+class _NumberColumn:
+    """
+    Numbers in a typed array, formatted back exactly as written.
+
+    The text format (padding, decimals) is taken from the first value; values that do
+    not round-trip through it (empty, non-numeric, formatted differently) are kept
+    verbatim in a sparse exception map.
+    """
+
+    __slots__ = ('numbers', 'decimal', 'spec', 'exceptions')
+
+    def __init__(self, decimal: bool):
+        self.numbers = array('d' if decimal else 'q')
+        self.decimal = decimal
+        self.spec: Optional[str] = None
+        self.exceptions: Dict[int, str] = {}
+
+    def _infer_spec(self, value: str) -> str:
+        text = value.strip()
+        if self.decimal:
+            # Right-aligned to the first value's width: the kernel parser pads to 9 characters,
+            # and a minimum width leaves longer values unchanged.
+            decimals = len(text.partition('.')[2])
+            return f">{len(value)}.{decimals}f"
+        if value != text:
+            return f">{len(value)}d"
+        if len(text) > 1 and text[0] == '0':
+            return f"0{len(text)}d"
+        return "d"
+
+    def append(self, value: str) -> None:
+        row_id = len(self.numbers)
+        try:
+            number = float(value) if self.decimal else int(value)
+            if self.spec is None:
+                self.spec = self._infer_spec(value)
+            if format(number, self.spec) != value:
+                raise ValueError(value)
+            self.numbers.append(number)
+        except (ValueError, OverflowError):
+            self.numbers.append(0)
+            self.exceptions[row_id] = value
+
+    def __getitem__(self, row_id: int) -> str:
+        if row_id in self.exceptions:
+            return self.exceptions[row_id]
+        return format(self.numbers[row_id], self.spec)
+
+    def number(self, row_id: int):
+        """The stored number, or None if the field was not numeric."""
+        return None if row_id in self.exceptions else self.numbers[row_id]
+
+    def drop_front(self, count: int) -> None:
+        del self.numbers[:count]
+        self.exceptions = {row_id - count: value for row_id, value in self.exceptions.items() if row_id >= count}
+
+    def nbytes(self) -> int:
+        return (self.numbers.itemsize * len(self.numbers) + sys.getsizeof(self.exceptions)
+                + sum(sys.getsizeof(value) for value in self.exceptions.values()))
+
+
+def _is_decimal(value: str) -> bool:
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return '.' in value
+
+
+def _new_column(name: str, first_value: str):
+    if name in CATEGORICAL_COLUMNS:
+        return _CategoricalColumn()
+    if name in INTEGER_COLUMNS:
+        return _NumberColumn(decimal=False)
+    if name in DECIMAL_COLUMNS or (name in MAYBE_DECIMAL_COLUMNS and _is_decimal(first_value)):
+        return _NumberColumn(decimal=True)
+    return _TextColumn()
+
+
+class RecordView:
+    """One stored record; behaves like the list of field strings the parser wrote."""
+
+    __slots__ = ('store', 'row_id')
+
+    def __init__(self, store: "RecordStore", row_id: int):
+        self.store = store
+        self.row_id = row_id
+
+    def __len__(self) -> int:
+        irregular = self.store.irregular.get(self.row_id)
+        return len(self.store.header) if irregular is None else len(irregular)
+
+    def __getitem__(self, column: int) -> str:
+        return self.store.field(self.row_id, column)
+
+    def __iter__(self) -> Iterator[str]:
+        irregular = self.store.irregular.get(self.row_id)
+        if irregular is not None:
+            yield from irregular
+            return
+        position = self.row_id - self.store.first_row
+        for column in self.store.columns:
+            yield column[position]
+
+    def get(self, name: str) -> str:
+        """Field by column name ('' if the parser has no such column)."""
+        index = self.store.column_index.get(name)
+        if index is None or index >= len(self):
+            return ''
+        return self[index]
+
+    def as_list(self) -> List[str]:
+        return list(self)
+
+    def __repr__(self) -> str:
+        return f"RecordView({self.row_id}, {self.as_list()!r})"
+
+
+class RecordStore(RecordObserver):
+    """
+    Row ids count the rows added since begin(). drop_before() forgets the oldest rows
+    (see indexing.IncrementalLogIndex.expire); the remaining rows keep their ids, which
+    then run from ``first_row`` to ``end_row``.
+    """
+
+    def __init__(self):
+        self.header: List[str] = []
+        self.schema = RecordSchema([])
+        self.columns: list = []
+        self.column_index: Dict[str, int] = {}
+        self.irregular: Dict[int, List[str]] = {}  # Rows with more or fewer fields than the header, verbatim
+        self.first_row = 0
+        self._count = 0  # Rows held, from first_row on
+
+    @classmethod
+    def from_csv(cls, csv_path: str) -> "RecordStore":
+        store = cls()
+        replay_csv(csv_path, [store])
+        return store
+
+    def begin(self, header: List[str]) -> None:
+        self.header = list(header)
+        self.schema = RecordSchema(header)
+        self.columns = []  # Created with the first row, which decides the ambiguous column types
+        self.column_index = {name: index for index, name in enumerate(self.header)}
+
+    def add(self, row: List[str]) -> None:
+        if not self.columns:
+            first = list(row) + [''] * (len(self.header) - len(row))
+            self.columns = [_new_column(name, value) for name, value in zip(self.header, first)]
+        columns = self.columns
+        if len(row) != len(columns):
+            # Rare (e.g. an LLM-parsed line with an extra field); the columns get placeholders.
+            self.irregular[self.end_row] = list(row)
+            row = [''] * len(columns)
+        for column, value in zip(columns, row):
+            column.append(value)
+        self._count += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def end_row(self) -> int:
+        """Row id the next added row gets."""
+        return self.first_row + self._count
+
+    def __getitem__(self, row_id: int) -> RecordView:
+        if not self.first_row <= row_id < self.end_row:
+            raise IndexError(row_id)
+        return RecordView(self, row_id)
+
+    def __iter__(self) -> Iterator[RecordView]:
+        for row_id in range(self.first_row, self.end_row):
+            yield RecordView(self, row_id)
+
+    def drop_before(self, row_id: int) -> None:
+        """Forget the rows before ``row_id``; the others keep their row ids."""
+        count = min(row_id, self.end_row) - self.first_row
+        if count <= 0:
+            return
+        for column in self.columns:
+            column.drop_front(count)
+        self.irregular = {kept: row for kept, row in self.irregular.items() if kept >= row_id}
+        self.first_row += count
+        self._count -= count
+
+    def value(self, row_id: int, name: str) -> str:
+        return self[row_id].get(name)
+
+    def field(self, row_id: int, column: int) -> str:
+        """One field of a record, by column position."""
+        irregular = self.irregular.get(row_id)
+        if irregular is not None:
+            return irregular[column]
+        return self.columns[column][row_id - self.first_row]
+
+    def code(self, row_id: int, column: int) -> int:
+        """Code of a record's value in a categorical column; see decode()."""
+        irregular = self.irregular.get(row_id)
+        if irregular is not None:
+            # The column holds a placeholder for this row; give its real value a code.
+            return self.columns[column].intern(irregular[column] if column < len(irregular) else '')
+        return self.columns[column].codes[row_id - self.first_row]
+
+    def decode(self, column: int, code: int) -> str:
+        return self.columns[column].values[code]
+
+    def encode(self, column: int, value: str) -> Optional[int]:
+        """Code of a value in a categorical column, or None if no record has it."""
+        return self.columns[column].code(value) if self.columns else None
+
+    def intern(self, column: int, value: str) -> int:
+        """Code of a value in a categorical column, added to its table if new (see LogRollup.from_dict)."""
+        return self.columns[column].intern(value)
+
+    def message(self, row_id: int) -> str:
+        """The record's message; the whole row joined for parsers without a message column (e.g. OVS)."""
+        if not self.schema.has('message'):
+            return ' '.join(self[row_id])
+        return self.schema.value(self[row_id], 'message')
+
+    def render_rows(self, row_ids) -> List[str]:
+        """The given rows as CSV lines (without the header)."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        lines = []
+        for row_id in row_ids:
+            writer.writerow(RecordView(self, row_id))
+            lines.append(buffer.getvalue().rstrip('\r\n'))
+            buffer.seek(0)
+            buffer.truncate()
+        return lines
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the stored fields."""
+        irregular = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+                        for row in self.irregular.values())
+        return sum(column.nbytes() for column in self.columns) + irregular
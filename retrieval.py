@@ -0,0 +1,134 @@
+"""
+Hybrid retrieval over a parsed log.
+
+Queries naming specific identifiers (PIDs, error codes, interface names, ...) are
+answered from the local BM25 inverted index alone, with no query embedding. All
+other queries fuse the BM25 ranking with FAISS similarity search. When the FAISS
+index holds message templates, matched templates are expanded back to the concrete
+lines they stand for. Questions with a time window ("between 10:02 and 10:05",
+"last 15 minutes") are restricted to that window through the timestamp index.
+Overview questions ("what's going wrong on this host?") get the parse-time rollup
+summary of the whole log plus only the best retrieved document.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+import metrics
+from config import (EXACT_MATCH_LIMIT, HYBRID_RETRIEVAL_K, ROLLUP_OVERVIEW_DOCUMENTS, RRF_K, TEMPLATE_EXPANSION_LINES,
+                    TIME_WINDOW_OVERSAMPLE, VECTOR_RETRIEVAL_K)
+from query_router import is_overview_question, time_filters
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, rrf_k: int = RRF_K) -> List[Document]:
+    """
+    Merge several rankings into one with reciprocal rank fusion.
+
+    Args:
+        rankings: Ranked document lists, best first
+        k: Number of documents to return
+        rrf_k: Damping constant; larger values flatten the contribution of top ranks
+
+    Returns:
+        list: The ``k`` best documents, each at most once
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking):
+            key = document.page_content
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """Exact-token lookups from the inverted index, otherwise fused BM25 + vector ranking."""
+
+    vectorstore: Any
+    index: Any  # inverted_index.BM25Index
+    k: int = HYBRID_RETRIEVAL_K
+    vector_k: int = VECTOR_RETRIEVAL_K
+    exact_limit: int = EXACT_MATCH_LIMIT
+    templates: Any = None  # templates.TemplateIndex, if the vectors are one per template
+    expansion_lines: int = TEMPLATE_EXPANSION_LINES
+    time_index: Any = None  # time_index.TimeIndex, for questions with a time window
+    rollup: Any = None  # rollups.LogRollup, summarized for overview questions
+    overview_k: int = ROLLUP_OVERVIEW_DOCUMENTS
+
+    def _row_document(self, row_ids: List[int], retrieval: str) -> Document:
+        return Document(page_content=self.index.render_rows(row_ids),
+                        metadata={'retrieval': retrieval, 'rows': row_ids})
+
+    def _expand_template(self, document: Document, window=None) -> Document:
+        template_id = document.metadata.get('template_id')
+        if self.templates is None or template_id is None:
+            return document
+        row_ids = self.templates.row_ids(template_id)
+        if window is not None:
+            row_ids = [row_id for row_id in row_ids if row_id in window]
+        row_ids = list(row_ids[:self.expansion_lines])
+        shown = "" if len(row_ids) == self.templates.templates[template_id].count else f", {len(row_ids)} shown"
+        return Document(
+            page_content=f"{self.templates.describe(template_id)}{shown}:\n{self.index.render_rows(row_ids)}",
+            metadata={**document.metadata, 'retrieval': 'template', 'rows': row_ids},
+        )
+
+    def _time_span(self, document: Document):
+        template_id = document.metadata.get('template_id')
+        if self.templates is not None and template_id is not None:
+            # Templates embedded during ingest carry a metadata snapshot; the index is current.
+            return self.templates.time_span(template_id)
+        return document.metadata.get('start_time'), document.metadata.get('end_time')
+
+    def _time_window(self, query: str) -> Optional[Any]:
+        if self.time_index is None:
+            return None
+        window = self.time_index.window(*time_filters(query))
+        # A window outside the log matches nothing; ignore it rather than answer from no context.
+        return window if window is not None and len(window) else None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with metrics.span('retrieval') as retrieval_span:
+            documents, path = self._retrieve(query)
+            retrieval_span.label(path=path)
+        return documents
+
+    def _retrieve(self, query: str) -> Tuple[List[Document], str]:
+        window = self._time_window(query)
+        if window is not None and len(window) <= self.exact_limit:
+            # The time window alone is small enough to pass on whole.
+            return [self._row_document(window.row_ids(), 'time')], 'time'
+
+        exact_rows = self.index.exact_lookup(query, self.exact_limit)
+        if exact_rows and window is not None:
+            exact_rows = [row_id for row_id in exact_rows if row_id in window]
+        if exact_rows:
+            # Every identifier in the question was found verbatim: no embedding call needed.
+            return [self._row_document(exact_rows, 'exact')], 'exact'
+
+        if window is None and self.rollup is not None and is_overview_question(query):
+            # Counts & top messages of the whole log say more than a few chunks, in far fewer tokens.
+            documents = self._hybrid(query, window, self.overview_k) if self.overview_k else []
+            return [self.rollup.summary_document()] + documents, 'overview'
+
+        return self._hybrid(query, window, self.k), 'hybrid'
+
+    def _hybrid(self, query: str, window, k: int) -> List[Document]:
+        bm25_ranking = [self._row_document([row_id], 'bm25')
+                        for row_id, _ in self.index.search(query, k, candidates=window)]
+        if window is None:
+            vector_documents = self.vectorstore.similarity_search(query, k=self.vector_k)
+        else:
+            # Over-fetch, then keep the chunks/templates whose time span meets the window.
+            vector_documents = [
+                document for document in
+                self.vectorstore.similarity_search(query, k=self.vector_k * TIME_WINDOW_OVERSAMPLE)
+                if window.overlaps(*self._time_span(document))
+            ][:self.vector_k]
+        vector_ranking = [self._expand_template(document, window) for document in vector_documents]
+        return reciprocal_rank_fusion([bm25_ranking, vector_ranking], k)
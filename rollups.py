@@ -0,0 +1,290 @@
+"""
+Streaming rollups of parsed log records.
+
+Broad questions ("what's going wrong on this host?") cannot be answered from a few
+retrieved chunks, and pasting large parts of the log into the prompt is slow and
+expensive. LogRollup is a RecordObserver that summarizes the records in the same pass
+that writes the CSV: record counts per severity, module, process and host, each with
+its first and last occurrence and per-minute counts, plus the most frequent message
+templates. Values are counted by their code in the RecordStore the template index
+reads from, and only named when the rollup is rendered. The rollup is stored next to
+the parse output (rollup.json), restored from there with from_dict() and rendered as
+one compact summary document for overview questions. A rollup restored with its
+TemplateIndex can be fed further records and drop the oldest (drop_before()).
+"""
+
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from config import ROLLUP_BUCKET_SECONDS, ROLLUP_TOP_TEMPLATES, ROLLUP_TOP_VALUES
+from log_records import RecordObserver, RecordSchema, format_timestamp
+from templates import TemplateIndex
+
+# Columns rolled up, in the order they are summarized.
+ROLLUP_ROLES = ('severity', 'module', 'process', 'host')
+MISSING_VALUE = '-'
+
+
+class _ValueStats:
+    __slots__ = ('count', 'first_time', 'last_time', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.first_time: Optional[float] = None
+        self.last_time: Optional[float] = None
+        self.buckets: Dict[int, int] = {}  # Bucket start (epoch seconds) -> records
+
+    def add(self, timestamp: Optional[float], bucket: Optional[int]) -> None:
+        self.count += 1
+        if timestamp is None:
+            return
+        if self.first_time is None or timestamp < self.first_time:
+            self.first_time = timestamp
+        if self.last_time is None or timestamp > self.last_time:
+            self.last_time = timestamp
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def remove(self, bucket: Optional[int]) -> None:
+        """Take back one add() of a record; see LogRollup.drop_before for the times."""
+        self.count -= 1
+        left = self.buckets.pop(bucket, 0) - 1
+        if left > 0:
+            self.buckets[bucket] = left
+
+    def merged(self, other: "_ValueStats") -> "_ValueStats":
+        merged = _ValueStats()
+        merged.count = self.count + other.count
+        times = [time for time in (self.first_time, self.last_time, other.first_time, other.last_time)
+                 if time is not None]
+        if times:
+            merged.first_time, merged.last_time = min(times), max(times)
+        merged.buckets = dict(self.buckets)
+        for bucket, count in other.buckets.items():
+            merged.buckets[bucket] = merged.buckets.get(bucket, 0) + count
+        return merged
+
+    def peak(self):
+        """(bucket start, records) of the busiest bucket, or None."""
+        if not self.buckets:
+            return None
+        return max(self.buckets.items(), key=lambda item: item[1])
+
+
+class LogRollup(RecordObserver):
+    """
+    Counts per column value & time bucket and the top message templates of a parsed log.
+
+    Args:
+        templates: A TemplateIndex fed the same records (e.g. the app's); the rollup
+            reads its top templates from it instead of templating every line again,
+            and the value codes from its RecordStore. Without one the rollup keeps its own.
+        bucket_seconds: Width of the time buckets
+        top_templates: Templates kept in the stored rollup
+    """
+
+    def __init__(self, templates: Optional[TemplateIndex] = None, bucket_seconds: int = ROLLUP_BUCKET_SECONDS,
+                 top_templates: int = ROLLUP_TOP_TEMPLATES):
+        self.bucket_seconds = bucket_seconds
+        self.top_templates = top_templates
+        self.schema: Optional[RecordSchema] = None
+        self.rows = 0
+        self.first_time: Optional[float] = None
+        self.last_time: Optional[float] = None
+        # role -> value code in the RecordStore -> stats; keyed by the value itself once restored by from_dict()
+        self.values: Dict[str, Dict[object, _ValueStats]] = {}
+        self._roles: List[str] = []
+        self._own_templates = templates is None
+        self.templates = TemplateIndex(max_examples=1) if templates is None else templates
+        self._stored_templates: Optional[List[dict]] = None  # Set by from_dict()
+
+    def begin(self, header: List[str]) -> None:
+        self.schema = RecordSchema(header)
+        self._roles = [role for role in ROLLUP_ROLES if self.schema.has(role)]
+        self.values = {role: {} for role in self._roles}
+        if self._own_templates:
+            self.templates.begin(header)
+
+    def add(self, row: List[str]) -> None:
+        if self._own_templates:
+            self.templates.add(row)
+        schema = self.schema
+        records = self.templates.records
+        timestamp = schema.timestamp(row)
+        bucket = None
+        if timestamp is not None:
+            bucket = int(timestamp // self.bucket_seconds) * self.bucket_seconds
+            if self.first_time is None or timestamp < self.first_time:
+                self.first_time = timestamp
+            if self.last_time is None or timestamp > self.last_time:
+                self.last_time = timestamp
+        row_id = records.end_row - 1  # The store has this row already
+        for role in self._roles:
+            code = records.code(row_id, schema.columns[role])
+            stats = self.values[role].get(code)
+            if stats is None:
+                stats = self.values[role][code] = _ValueStats()
+            stats.add(timestamp, bucket)
+        self.rows += 1
+
+    def end(self) -> None:
+        if self._own_templates:
+            self.templates.end()
+
+    def drop_before(self, row_id: int) -> None:
+        """
+        Forget the records before ``row_id``; call it before the RecordStore drops them.
+
+        The first occurrence of a value moves to the start of its first remaining time
+        bucket; that of the log to the first remaining record.
+        """
+        records, schema = self.templates.records, self.schema
+        end = min(row_id, records.end_row)
+        for expired in range(records.first_row, end):
+            timestamp = schema.timestamp(records[expired])
+            bucket = None if timestamp is None else int(timestamp // self.bucket_seconds) * self.bucket_seconds
+            for role in self._roles:
+                values = self.values[role]
+                code = records.code(expired, schema.columns[role])
+                stats = values.get(code)
+                if stats is None:
+                    continue
+                stats.remove(bucket)
+                if not stats.count:
+                    del values[code]
+            self.rows -= 1
+        if end > records.first_row:
+            for values in self.values.values():
+                for stats in values.values():
+                    if not stats.buckets:
+                        stats.first_time = stats.last_time = None
+                    elif stats.first_time is not None:
+                        stats.first_time = max(stats.first_time, min(stats.buckets))
+            self.first_time = next((timestamp for timestamp in (schema.timestamp(records[kept])
+                                                               for kept in range(end, records.end_row))
+                                    if timestamp is not None), None)
+            if self.first_time is None:
+                self.last_time = None
+        if self._own_templates:
+            self.templates.drop_before(row_id)
+
+    def named_values(self, role: str) -> Dict[str, _ValueStats]:
+        """The stats of one role's values, keyed by the value."""
+        if self._stored_templates is not None:
+            return self.values[role]
+        records, column = self.templates.records, self.schema.columns[role]
+        named: Dict[str, _ValueStats] = {}
+        for code, stats in self.values[role].items():
+            name = records.decode(column, code).strip() or MISSING_VALUE
+            if name in named:
+                # Values that differ only in surrounding whitespace are counted together.
+                stats = named[name].merged(stats)
+            named[name] = stats
+        return named
+
+    def template_summary(self, limit: Optional[int] = None) -> List[dict]:
+        """The most frequent message templates, most frequent first."""
+        limit = self.top_templates if limit is None else limit
+        if self._stored_templates is not None:
+            return self._stored_templates[:limit]
+        templates = sorted(((template_id, template) for template_id, template in enumerate(self.templates.templates)
+                            if template.count), key=lambda item: item[1].count, reverse=True)[:limit]
+        return [{
+            'process': template.process,
+            'template': template.text,
+            'count': template.count,
+            'first_time': template.first_time,
+            'last_time': template.last_time,
+            'example': self.templates.examples(template_id)[0] if template.examples else '',
+        } for template_id, template in templates]
+
+    def to_dict(self) -> dict:
+        """JSON-serializable rollup (bucket keys become strings in JSON)."""
+        return {
+            'rows': self.rows,
+            'first_time': self.first_time,
+            'last_time': self.last_time,
+            'bucket_seconds': self.bucket_seconds,
+            'columns': {role: self.schema.header[self.schema.columns[role]] for role in self._roles},
+            'values': {role: {value: {'count': stats.count, 'first_time': stats.first_time,
+                                      'last_time': stats.last_time, 'buckets': stats.buckets}
+                              for value, stats in self.named_values(role).items()}
+                       for role in self._roles},
+            'templates': self.template_summary(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, templates: Optional[TemplateIndex] = None) -> "LogRollup":
+        """
+        A stored rollup.
+
+        Args:
+            data: Written by to_dict()
+            templates: The restored TemplateIndex the rollup was fed with; the rollup then
+                counts by code again and can be fed further records. Without it the rollup
+                is for summaries only.
+        """
+        rollup = cls(templates, bucket_seconds=data['bucket_seconds'],
+                     top_templates=len(data['templates']) if templates is None else ROLLUP_TOP_TEMPLATES)
+        if templates is not None:
+            rollup.begin(templates.records.header)
+        else:
+            rollup.schema = RecordSchema(list(data['columns'].values()))
+            rollup._roles = list(data['values'])
+            rollup._stored_templates = data['templates']
+        rollup.rows = data['rows']
+        rollup.first_time = data['first_time']
+        rollup.last_time = data['last_time']
+        for role, values in data['values'].items():
+            rollup.values[role] = {}
+            for value, item in values.items():
+                key = value
+                if templates is not None:
+                    column = rollup.schema.columns[role]
+                    name = '' if value == MISSING_VALUE else value
+                    key = templates.records.encode(column, name)
+                    if key is None:
+                        key = templates.records.intern(column, name)
+                stats = rollup.values[role][key] = _ValueStats()
+                stats.count = item['count']
+                stats.first_time = item['first_time']
+                stats.last_time = item['last_time']
+                stats.buckets = {int(bucket): count for bucket, count in item['buckets'].items()}
+        return rollup
+
+    def summary(self, top_values: int = ROLLUP_TOP_VALUES, top_templates: Optional[int] = None) -> str:
+        """Compact text overview of the whole log for the LLM."""
+        lines = [f"Log overview: {self.rows:,} records"
+                 + (f" from {format_timestamp(self.first_time)} to {format_timestamp(self.last_time)}."
+                    if self.first_time is not None else ".")]
+        per = "min" if self.bucket_seconds == 60 else f"{self.bucket_seconds} s"
+        for role in self._roles:
+            values = sorted(self.named_values(role).items(), key=lambda item: item[1].count, reverse=True)
+            name = self.schema.header[self.schema.columns[role]]
+            shown = values[:top_values]
+            title = f"{name} ({len(shown)} of {len(values)} values)" if len(values) > len(shown) else name
+            parts = []
+            for value, stats in shown:
+                part = f"{value} {stats.count:,}"
+                if stats.first_time is not None:
+                    part += f" [{format_timestamp(stats.first_time)} .. {format_timestamp(stats.last_time)}"
+                    peak = stats.peak()
+                    if peak is not None and peak[1] > 1:
+                        part += f", peak {peak[1]:,}/{per} at {format_timestamp(peak[0])}"
+                    part += "]"
+                parts.append(part)
+            lines.append(f"{title}: " + "; ".join(parts))
+
+        templates = self.template_summary(top_templates)
+        if templates:
+            lines.append("Most frequent messages (<*> = varying value):")
+            for template in templates:
+                prefix = f"{template['process']}: " if template['process'] else ""
+                when = ""
+                if template['first_time'] is not None:
+                    when = f" [{format_timestamp(template['first_time'])} .. {format_timestamp(template['last_time'])}]"
+                lines.append(f"- {template['count']:,}x {prefix}{template['template']}{when}")
+        return "\n".join(lines)
+
+    def summary_document(self, source: str = '') -> Document:
+        return Document(page_content=self.summary(), metadata={'source': source, 'retrieval': 'rollup'})
@@ -0,0 +1,227 @@
+"""
+Message templates of parsed log records.
+
+Most lines of a log are repetitions of a few messages with different numbers,
+addresses or IDs. TemplateIndex is a RecordObserver that masks those variable parts,
+groups the records by the resulting template and keeps, per template, the occurrence
+count, time range and the row ids of every occurrence, a few of them as examples
+(read back from the RecordStore shared with the other indexes). Embedding one
+document per template instead of every line gives a much smaller index and more
+diverse retrieval; matches are expanded back to concrete lines at answer time.
+"""
+
+import bisect
+import re
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+from langchain_core.documents import Document
+
+from config import TEMPLATE_EXAMPLES
+from log_records import RecordObserver, RecordSchema, format_timestamp, replay_csv
+from record_store import RecordStore
+
+WILDCARD = '<*>'
+
+# Variable parts of a message, most specific first.
+VARIABLE_PATTERNS = [
+    re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.IGNORECASE),  # UUID
+    re.compile(r"\b(?:[0-9a-f]{2}[:-]){5}[0-9a-f]{2}\b", re.IGNORECASE),  # MAC address
+    re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"),  # IPv4 address, optional port
+    re.compile(r"\b0x[0-9a-f]+\b", re.IGNORECASE),  # Hex number
+    re.compile(r"\b(?=[0-9a-f]*\d)(?=[0-9a-f]*[a-f])[0-9a-f]{6,}\b", re.IGNORECASE),  # Hex ID, hash
+    # Decimal number or dotted value, with an optional unit (1000Mbps, 12ms, 85%)
+    re.compile(r"(?<![\w.])[-+]?\d+(?:\.\d+)*(?=(?:[kmgt]i?b|[kmg]bps|[mun]?s|%)?(?![\w.]))", re.IGNORECASE),
+]
+
+
+def message_template(message: str) -> str:
+    """Replace the variable parts of a message (numbers, addresses, IDs) by a wildcard."""
+    for pattern in VARIABLE_PATTERNS:
+        message = pattern.sub(WILDCARD, message)
+    return ' '.join(message.split())
+
+
+class _Template:
+    __slots__ = ('text', 'process', 'count', 'first_time', 'last_time', 'examples', 'row_ids')
+
+    def __init__(self, text: str, process: str):
+        self.text = text
+        self.process = process
+        self.count = 0
+        self.first_time: Optional[float] = None
+        self.last_time: Optional[float] = None
+        self.examples = array('I')  # Row ids of the example lines
+        self.row_ids = array('I')
+
+
+class TemplateIndex(RecordObserver):
+    """
+    Args:
+        records: The RecordStore fed the same rows before this index (e.g. the app's);
+            without one the index keeps its own.
+        max_examples: Example lines kept per template
+    """
+
+    def __init__(self, records: Optional[RecordStore] = None, max_examples: int = TEMPLATE_EXAMPLES):
+        self.max_examples = max_examples
+        self._own_records = records is None
+        self.records = RecordStore() if records is None else records
+        self.schema: Optional[RecordSchema] = None
+        self.templates: List[_Template] = []
+        self._ids: Dict[tuple, int] = {}
+        self._row_count = 0
+
+    @classmethod
+    def from_csv(cls, csv_path: str) -> "TemplateIndex":
+        index = cls()
+        replay_csv(csv_path, [index])
+        return index
+
+    def begin(self, header: List[str]) -> None:
+        self.schema = RecordSchema(header)
+        if self._own_records:
+            self.records.begin(header)
+
+    def _key(self, row: List[str]) -> tuple:
+        """(process, template text) of a row."""
+        # Parsers without a message column (e.g. OVS) are templated on the whole row.
+        message = self.schema.value(row, 'message') if self.schema.has('message') else ' '.join(row)
+        return self.schema.value(row, 'process'), message_template(message)
+
+    def add(self, row: List[str]) -> None:
+        if self._own_records:
+            self.records.add(row)
+        schema = self.schema
+        key = self._key(row)
+        template_id = self._ids.get(key)
+        if template_id is None:
+            template_id = self._ids[key] = len(self.templates)
+            self.templates.append(_Template(key[1], key[0]))
+        template = self.templates[template_id]
+
+        template.count += 1
+        template.row_ids.append(self._row_count)
+        if len(template.examples) < self.max_examples:
+            template.examples.append(self._row_count)
+        timestamp = schema.timestamp(row)
+        if timestamp is not None:
+            if template.first_time is None or timestamp < template.first_time:
+                template.first_time = timestamp
+            if template.last_time is None or timestamp > template.last_time:
+                template.last_time = timestamp
+        self._row_count += 1
+
+    def drop_before(self, row_id: int) -> None:
+        """
+        Forget the occurrences before ``row_id`` (see indexing.IncrementalLogIndex.expire).
+
+        Templates left without occurrences keep their id but are no longer matched, so a
+        later occurrence starts a new template; first_time becomes that of the first
+        remaining occurrence.
+        """
+        for template in self.templates:
+            if not template.row_ids or template.row_ids[0] >= row_id:
+                continue
+            cut = bisect.bisect_left(template.row_ids, row_id)
+            del template.row_ids[:cut]
+            template.count -= cut
+            if not template.count:
+                del self._ids[(template.process, template.text)]
+                template.examples = array('I')
+                template.first_time = template.last_time = None
+                continue
+            template.examples = array('I', (kept for kept in template.examples if kept >= row_id))
+            if not template.examples:
+                template.examples = template.row_ids[:self.max_examples]
+            template.first_time = self.schema.timestamp(self.records[template.row_ids[0]])
+        if self._own_records:
+            self.records.drop_before(row_id)
+
+    def new_documents(self, rows: List[List[str]], source: str = '') -> List[Document]:
+        """
+        Documents of the templates that adding ``rows`` would create, with the ids add() will
+        give them, so new templates can be embedded before their rows are added.
+
+        The page content is that of document(); the metadata has no counts or time range yet.
+        """
+        documents = []
+        seen = set()
+        for row in rows:
+            key = self._key(row)
+            if key in self._ids or key in seen:
+                continue
+            seen.add(key)
+            process, text = key
+            prefix = f"{process}: " if process else ""
+            message = self.schema.value(row, 'message') if self.schema.has('message') else ' '.join(row)
+            documents.append(Document(
+                page_content=f"{prefix}{text}\nExample: {message}",
+                metadata={
+                    'source': source,
+                    'template_id': len(self.templates) + len(documents),
+                    'process': process,
+                    'examples': [message],
+                },
+            ))
+        return documents
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def row_ids(self, template_id: int) -> array:
+        return self.templates[template_id].row_ids
+
+    def examples(self, template_id: int) -> List[str]:
+        """The example messages of a template."""
+        return [self.records.message(row_id) for row_id in self.templates[template_id].examples]
+
+    def describe(self, template_id: int) -> str:
+        """One-line summary of a template: text, occurrence count & time range."""
+        template = self.templates[template_id]
+        prefix = f"{template.process}: " if template.process else ""
+        when = ""
+        if template.first_time is not None:
+            when = f" between {format_timestamp(template.first_time)} and {format_timestamp(template.last_time)}"
+        return f"{prefix}{template.text} (occurred {template.count} times{when})"
+
+    def documents(self, source: str = '') -> Iterator[Document]:
+        """
+        One document per template, to be embedded instead of the individual lines.
+
+        The page content is the template with its first example line; counts and time
+        ranges go into the metadata, so they do not change what is embedded.
+        """
+        for template_id, template in enumerate(self.templates):
+            if template.count:
+                yield self.document(template_id, source)
+
+    def document(self, template_id: int, source: str = '') -> Document:
+        """
+        The document of one template.
+
+        Its page content is fixed when the template is first seen, so it can be embedded
+        while later records are still being added; the metadata is a snapshot, and
+        TemplateIndex itself has the current counts & time range.
+        """
+        template = self.templates[template_id]
+        prefix = f"{template.process}: " if template.process else ""
+        examples = self.examples(template_id)
+        return Document(
+            page_content=f"{prefix}{template.text}\nExample: {examples[0]}",
+            metadata={
+                'source': source,
+                'template_id': template_id,
+                'process': template.process,
+                'count': template.count,
+                'start_time': template.first_time,
+                'end_time': template.last_time,
+                'start': format_timestamp(template.first_time),
+                'end': format_timestamp(template.last_time),
+                'examples': examples,
+            },
+        )
+
+    def time_span(self, template_id: int):
+        template = self.templates[template_id]
+        return template.first_time, template.last_time
@@ -0,0 +1,156 @@
+"""
+Sorted timestamp index over parsed log records.
+
+TimeIndex is a RecordObserver that keeps the epoch timestamp of every record in a
+typed array, sorted together with the row offsets. Time-range questions ("between
+10:02 and 10:05", "in the last 15 minutes") are answered by binary search, and the
+matching row offsets are returned as zero-copy memoryview slices of that array.
+"""
+
+import bisect
+import math
+from array import array
+from typing import Iterator, List, Optional, Tuple
+
+from log_records import RecordObserver, RecordSchema, replay_csv
+
+DAY_SECONDS = 86400
+
+
+def clock_seconds(clock: str) -> int:
+    """'HH:MM[:SS]' -> seconds since midnight."""
+    parts = [int(part) for part in clock.split(':')]
+    parts += [0] * (3 - len(parts))
+    return parts[0] * 3600 + parts[1] * 60 + parts[2]
+
+
+class TimeWindow:
+    """Rows of a TimeIndex inside one or more time ranges."""
+
+    def __init__(self, index: "TimeIndex", ranges: List[Tuple[float, float]], slices: List[memoryview]):
+        self.index = index
+        self.ranges = ranges
+        self.slices = slices
+
+    def __len__(self) -> int:
+        return sum(len(rows) for rows in self.slices)
+
+    def __iter__(self) -> Iterator[int]:
+        for rows in self.slices:
+            yield from rows
+
+    def __contains__(self, row_id: int) -> bool:
+        # NaN (row without a timestamp) compares false against every range.
+        timestamp = self.index.time_of(row_id)
+        return any(start <= timestamp <= end for start, end in self.ranges)
+
+    def overlaps(self, start: Optional[float], end: Optional[float]) -> bool:
+        """True if a [start, end] time span (e.g. of a chunk) intersects the window."""
+        if start is None or end is None:
+            return False
+        return any(start <= range_end and range_start <= end for range_start, range_end in self.ranges)
+
+    def row_ids(self) -> List[int]:
+        """Row offsets in file order."""
+        return sorted(self)
+
+
+class TimeIndex(RecordObserver):
+    def __init__(self):
+        self.schema: Optional[RecordSchema] = None
+        self.timestamps = array('d')  # Sorted ascending once end() has run
+        self.offsets = array('I')  # Row offset of each entry of self.timestamps
+        self.row_times = array('d')  # Timestamp per row offset from first_row on, NaN if the row has none
+        self.first_row = 0  # Raised by drop_before()
+        self._sorted = True
+
+    @classmethod
+    def from_csv(cls, csv_path: str) -> "TimeIndex":
+        index = cls()
+        replay_csv(csv_path, [index])
+        return index
+
+    def begin(self, header: List[str]) -> None:
+        self.schema = RecordSchema(header)
+
+    def add(self, row: List[str]) -> None:
+        timestamp = self.schema.timestamp(row)
+        row_id = self.first_row + len(self.row_times)
+        if timestamp is None:
+            self.row_times.append(math.nan)
+            return
+        self.row_times.append(timestamp)
+        if self.timestamps and timestamp < self.timestamps[-1]:
+            self._sorted = False
+        self.timestamps.append(timestamp)
+        self.offsets.append(row_id)
+
+    def end(self) -> None:
+        # Logs are almost always written in time order; sort only when they are not.
+        if self._sorted:
+            return
+        order = sorted(range(len(self.timestamps)), key=self.timestamps.__getitem__)
+        self.timestamps = array('d', (self.timestamps[i] for i in order))
+        self.offsets = array('I', (self.offsets[i] for i in order))
+        self._sorted = True
+
+    def drop_before(self, row_id: int) -> None:
+        """Forget the rows before ``row_id`` (see indexing.IncrementalLogIndex.expire)."""
+        count = min(row_id - self.first_row, len(self.row_times))
+        if count <= 0:
+            return
+        del self.row_times[:count]
+        self.first_row += count
+        kept = [i for i, offset in enumerate(self.offsets) if offset >= self.first_row]
+        self.timestamps = array('d', (self.timestamps[i] for i in kept))
+        self.offsets = array('I', (self.offsets[i] for i in kept))
+
+    def time_of(self, row_id: int) -> float:
+        """Timestamp of a row, NaN if it has none."""
+        return self.row_times[row_id - self.first_row]
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def bounds(self) -> Optional[Tuple[float, float]]:
+        """(first, last) timestamp of the log, or None if it has no timestamps."""
+        if not self.timestamps:
+            return None
+        return self.timestamps[0], self.timestamps[-1]
+
+    def slice(self, start: Optional[float] = None, end: Optional[float] = None) -> memoryview:
+        """Row offsets with start <= timestamp <= end, in time order, without copying."""
+        low = 0 if start is None else bisect.bisect_left(self.timestamps, start)
+        high = len(self.timestamps) if end is None else bisect.bisect_right(self.timestamps, end)
+        return memoryview(self.offsets)[low:max(low, high)]
+
+    def window(self, last_seconds: Optional[float] = None,
+               time_of_day: Optional[Tuple[str, str]] = None) -> Optional[TimeWindow]:
+        """
+        Select the rows of a relative and/or time-of-day window.
+
+        Args:
+            last_seconds: Only the last N seconds before the newest record
+            time_of_day: ('HH:MM[:SS]', 'HH:MM[:SS]') inclusive, on every day the log covers
+
+        Returns:
+            TimeWindow, or None if no window was given or the log has no timestamps
+        """
+        bounds = self.bounds()
+        if bounds is None or (last_seconds is None and time_of_day is None):
+            return None
+        first, last = bounds
+        ranges = [(first if last_seconds is None else last - last_seconds, last)]
+
+        if time_of_day is not None:
+            start_offset, end_offset = (clock_seconds(clock) for clock in time_of_day)
+            lower, upper = ranges[0]
+            ranges = []
+            day = math.floor(lower / DAY_SECONDS) * DAY_SECONDS
+            while day <= upper:
+                start, end = max(lower, day + start_offset), min(upper, day + end_offset)
+                if start <= end:
+                    ranges.append((start, end))
+                day += DAY_SECONDS
+
+        return TimeWindow(self, ranges, [self.slice(start, end) for start, end in ranges])
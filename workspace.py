@@ -0,0 +1,179 @@
+"""
+Per-session workspaces and the shared parse worker pool.
+
+Every app session gets its own directory for the files it produces (uploads, parsed
+CSV), so concurrent users never overwrite or delete each other's output. Parse jobs
+of all sessions run in one bounded process pool; jobs are queued per session and
+dispatched round-robin, so one user uploading many files cannot starve the others.
+"""
+
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional
+
+from config import PARSE_POOL_WORKERS, WORKSPACE_MAX_AGE_SECONDS, WORKSPACE_ROOT
+
+PARSED_CSV_FILE = "parsed_log_data.csv"
+DATABASE_FILE = "log.sqlite3"
+
+
+class Workspace:
+    def __init__(self, owner: str, root: str = WORKSPACE_ROOT):
+        self.owner = owner
+        self.path = Path(root) / owner
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def create(cls, root: str = WORKSPACE_ROOT) -> "Workspace":
+        """New workspace with a unique owner id; abandoned workspaces are swept first."""
+        prune_workspaces(root)
+        return cls(uuid.uuid4().hex, root)
+
+    @property
+    def parsed_csv_path(self) -> str:
+        return str(self.path / PARSED_CSV_FILE)
+
+    @property
+    def database_path(self) -> str:
+        return str(self.path / DATABASE_FILE)
+
+    def touch(self) -> None:
+        # Keeps an active session's workspace from being pruned as abandoned.
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            self.path.mkdir(parents=True, exist_ok=True)
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def prune_workspaces(root: str = WORKSPACE_ROOT, max_age: float = WORKSPACE_MAX_AGE_SECONDS) -> None:
+    """Remove workspaces of sessions that ended without cleaning up (e.g. a closed browser tab)."""
+    root = Path(root)
+    if not root.is_dir():
+        return
+    cutoff = time.time() - max_age
+    for path in root.iterdir():
+        try:
+            if path.is_dir() and path.stat().st_mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except FileNotFoundError:
+            continue
+
+
+class FairWorkerPool:
+    """
+    Bounded process pool shared by all sessions.
+
+    At most ``max_workers`` jobs run at once. Waiting jobs are kept in one FIFO queue
+    per owner, and owners take turns, so every session gets a fair share of workers
+    no matter how many jobs another one has queued. Workers are spawned, not forked:
+    the app process runs Streamlit's threads, and forking a threaded process can
+    leave locks held in the child.
+    """
+
+    def __init__(self, max_workers: int = PARSE_POOL_WORKERS):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queues: "OrderedDict[str, Deque[tuple]]" = OrderedDict()
+        self._running = 0
+        self._running_per_owner: Dict[str, int] = {}
+        self._idle_callbacks: Dict[str, List[Callable[[], None]]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, owner: str, fn, *args, **kwargs) -> Future:
+        """Queue ``fn(*args, **kwargs)`` for a worker process on behalf of ``owner``."""
+        future = Future()
+        with self._lock:
+            self._queues.setdefault(owner, deque()).append((future, fn, args, kwargs))
+        self._dispatch()
+        return future
+
+    def pending(self, owner: str) -> int:
+        with self._lock:
+            return len(self._queues.get(owner, ()))
+
+    def cancel(self, owner: str) -> None:
+        """Cancel the owner's jobs that have not started yet."""
+        with self._lock:
+            queue = self._queues.pop(owner, deque())
+            callbacks = self._pop_idle_callbacks(owner)
+        for future, _, _, _ in queue:
+            future.cancel()
+        for callback in callbacks:
+            callback()
+
+    def when_idle(self, owner: str, callback: Callable[[], None]) -> None:
+        """Call ``callback`` once none of the owner's jobs is queued or running; right away if none is."""
+        with self._lock:
+            if self._running_per_owner.get(owner) or self._queues.get(owner):
+                self._idle_callbacks.setdefault(owner, []).append(callback)
+                return
+        callback()
+
+    def _pop_idle_callbacks(self, owner: str) -> List[Callable[[], None]]:
+        # Called with the lock held.
+        if self._running_per_owner.get(owner) or self._queues.get(owner):
+            return []
+        return self._idle_callbacks.pop(owner, [])
+
+    def _dispatch(self) -> None:
+        jobs = []
+        with self._lock:
+            while self._running < self.max_workers and self._queues:
+                # Round robin: take the first owner's oldest job, then move the owner to the back.
+                owner, queue = self._queues.popitem(last=False)
+                job = queue.popleft()
+                if queue:
+                    self._queues[owner] = queue
+                if not job[0].set_running_or_notify_cancel():
+                    continue
+                self._running += 1
+                self._running_per_owner[owner] = self._running_per_owner.get(owner, 0) + 1
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                         mp_context=multiprocessing.get_context("spawn"))
+                jobs.append((self._executor, owner, job))
+
+        # Submitted outside the lock: a job that finishes at once runs its callback right away.
+        for executor, owner, (future, fn, args, kwargs) in jobs:
+            try:
+                inner = executor.submit(fn, *args, **kwargs)
+            except Exception as e:
+                self._finished(executor, owner, future, error=e)
+                continue
+            inner.add_done_callback(lambda inner, executor=executor, owner=owner, future=future:
+                                    self._finished(executor, owner, future, inner))
+
+    def _finished(self, executor: ProcessPoolExecutor, owner: str, future: Future, inner: Optional[Future] = None,
+                  error: Optional[BaseException] = None) -> None:
+        if inner is not None:
+            error = inner.exception()
+        broken = False
+        with self._lock:
+            self._running -= 1
+            self._running_per_owner[owner] -= 1
+            if not self._running_per_owner[owner]:
+                del self._running_per_owner[owner]
+            callbacks = self._pop_idle_callbacks(owner)
+            if isinstance(error, BrokenProcessPool) and self._executor is executor:
+                # A worker died (e.g. out of memory); start a fresh pool for the next jobs.
+                self._executor, broken = None, True
+        if broken:
+            executor.shutdown(wait=False)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(inner.result())
+        for callback in callbacks:
+            callback()
+        self._dispatch()